@@ -21,6 +21,16 @@ from abc import abstractmethod
 from typing import Callable
 import numpy as np
 
+#Complex dtypes of state vectors and operators by precision
+PRECISIONS = { "double": np.complex128, "single": np.complex64, "complex128": np.complex128, "complex64": np.complex64 }
+
+def precision_dtype(precision = "double") -> np.dtype:
+    """Returns complex dtype of the precision, such as "single", "double" or np.complex64."""
+    name = precision if isinstance(precision, str) else np.dtype(precision).name
+    if name not in PRECISIONS:
+        raise KeyError("Error: precision %s not found." %precision)
+    return np.dtype(PRECISIONS[name])
+
 class FactoryBase(metaclass=ABCMeta):
     """Base class for all self registering factory classes"""
 
@@ -48,9 +58,20 @@ class FactoryBase(metaclass=ABCMeta):
 
 class OperatorBase(metaclass=ABCMeta):
     """Base class for all types of operators, for example: U3, CU, CCU, etc."""
+
+    #Single qubit operators are classified for specialized application on the state vector
+    GENERAL = 0
+    DIAGONAL = 1 #e.g. Z, S, T and phase rotations, applied as elementwise phase multiply
+    PERMUTATION = 2 #e.g. X and Y, applied as amplitude exchange
+    specialize = True #Setting it to False applies all operators as general operators, e.g. for benchmarks
+    _tolerance = 1e-12 #Entries smaller than tolerance are treated as zero
     
     def __init__(self, **kwargs):
-        """ Constructor: stores theta, phi and lambda parameters which are later used for creating U3 operator """
+        """
+        Constructor: stores theta, phi and lambda parameters which are later used for creating U3 operator,
+        and precision of the operator (default: "double").
+        """
+        self._dtype = precision_dtype(kwargs.get('precision', "double"))
         self._theta = kwargs.get('theta', None)
         self._phi = kwargs.get('phi', None)
         self._lambda = kwargs.get('lambda', None)
@@ -67,21 +88,152 @@ class OperatorBase(metaclass=ABCMeta):
         """Method for returning operator matrix."""
         pass
 
+    @abstractmethod
+    def qubits(self, **kwargs):
+        """Method for returning the target qubits and control qubits of the operation as (targets, controls)."""
+        pass
+
+    def block(self):
+        """Method for returning the operator acting on the target qubits only, i.e. without identities and projectors."""
+        return self._get_operator()
+
+    def apply(self, vector, total_qubits: int, **kwargs):
+        """
+        Method for applying the operator directly on the state vector without building the operator matrix.
+        Result is same as np.dot(vector, self.matrix(total_qubits, **kwargs)).
+        """
+        targets, controls = self.qubits(**kwargs)
+        return self._apply_operator(vector, total_qubits, self.block(), targets, controls)
+
     def _get_operator(self):
-        """Protected method which creates the U3 operator based on theta, phi anf lambda parameters."""
+        """
+        Protected method which creates the U3 operator based on theta, phi anf lambda parameters.
+        Parameters can also be arrays of same length, in that case stacked operators of shape (batch, 2, 2) are created.
+        """
+        theta, phi, lamda = np.broadcast_arrays(self._theta, self._phi, self._lambda)
         operator = np.array([
-            [np.cos(self._theta/2), (-1) * np.exp(complex(0,self._lambda)) * np.sin(self._theta/2)],
-            [np.exp(complex(0,self._phi)) * np.sin(self._theta/2), np.exp(complex(0,self._lambda + self._phi)) *  np.cos(self._theta/2)]
-            ])
-        return operator
+            [np.cos(theta/2), (-1) * np.exp(1j * lamda) * np.sin(theta/2)],
+            [np.exp(1j * phi) * np.sin(theta/2), np.exp(1j * (lamda + phi)) *  np.cos(theta/2)]
+            ], dtype=complex) #Computed in double precision and rounded once
+        return np.moveaxis(operator, (0, 1), (-2, -1)).astype(self._dtype)
+
+    @staticmethod
+    def _apply_operator(vector, total_qubits: int, operator, targets, controls = ()):
+        """
+        Protected method which applies the operator on target qubits of the state vector in O(2^n).
+
+        State vector is reshaped to a tensor with one axis per qubit (big endian encoding, qubit 0 is the first axis),
+        the amplitudes whose control qubits are all |1> are selected as a view and the operator is contracted
+        with the target axes. Like np.dot(vector, matrix), the operator is contracted with its row index.
+
+        A batch of state vectors of shape (batch, 2^n) is operated together, either with one operator
+        or with stacked operators of shape (batch, 2^k, 2^k).
+        """
+        psi = np.array(vector, dtype=np.result_type(vector, operator, np.complex64)) #Single precision is kept
+        return OperatorBase._apply_operator_in_place(psi, total_qubits, operator, targets, controls)
+
+    @staticmethod
+    def _classify(operator) -> int:
+        """Protected method which classifies single qubit operator as DIAGONAL, PERMUTATION or GENERAL operator."""
+        if not OperatorBase.specialize or operator.shape != (2, 2):
+            return OperatorBase.GENERAL
+        if abs(operator[0, 1]) <= OperatorBase._tolerance and abs(operator[1, 0]) <= OperatorBase._tolerance:
+            return OperatorBase.DIAGONAL
+        if abs(operator[0, 0]) <= OperatorBase._tolerance and abs(operator[1, 1]) <= OperatorBase._tolerance:
+            return OperatorBase.PERMUTATION
+        return OperatorBase.GENERAL
+
+    @staticmethod
+    def _apply_operator_in_place(psi, total_qubits: int, operator, targets, controls = (), kind: int = None, scratch = None):
+        """
+        Protected method which applies the operator like _apply_operator, but updates complex state vector psi in place.
+        Single qubit operators are dispatched by their kind (classified if not mentioned): diagonal operators multiply
+        the affected amplitudes by phases and permutation operators exchange the amplitudes without arithmetic
+        when the coefficients are 1. With scratch buffer of the shape of psi, single qubit operators allocate no temporary arrays.
+        """
+        batch_shape = psi.shape[:-1]
+        tensor = psi.reshape(batch_shape + (2,) * total_qubits)
+
+        #Selecting amplitudes with all control qubits set to |1>
+        index = [slice(None)] * (len(batch_shape) + total_qubits)
+        for control in controls:
+            index[len(batch_shape) + control] = 1
+        sub_tensor = tensor[tuple(index)]
+        scratch_tensor = None
+        if scratch is not None and scratch.shape == psi.shape:
+            scratch_tensor = scratch.reshape(tensor.shape)[tuple(index)] #Same view of the scratch buffer
+
+        #Axes of target qubits in the selected view
+        axes = [len(batch_shape) + target - sum(control < target for control in controls) for target in targets]
+
+        if len(axes) == 1:
+            lower = (slice(None),) * axes[0] + (0, Ellipsis) #Ellipsis keeps views also when no other axes are left
+            upper = (slice(None),) * axes[0] + (1, Ellipsis)
+
+            if kind is None:
+                kind = OperatorBase._classify(operator)
+            if kind == OperatorBase.DIAGONAL:
+                if abs(operator[0, 0] - 1) > OperatorBase._tolerance:
+                    sub_tensor[lower] *= operator[0, 0]
+                if abs(operator[1, 1] - 1) > OperatorBase._tolerance:
+                    sub_tensor[upper] *= operator[1, 1]
+                return psi
+            if kind == OperatorBase.PERMUTATION:
+                if scratch_tensor is None:
+                    amplitudes_0 = sub_tensor[lower].copy()
+                else:
+                    amplitudes_0 = scratch_tensor[lower]
+                    amplitudes_0[...] = sub_tensor[lower]
+                sub_tensor[lower] = sub_tensor[upper]
+                sub_tensor[upper] = amplitudes_0
+                if abs(operator[1, 0] - 1) > OperatorBase._tolerance:
+                    sub_tensor[lower] *= operator[1, 0]
+                if abs(operator[0, 1] - 1) > OperatorBase._tolerance:
+                    sub_tensor[upper] *= operator[0, 1]
+                return psi
+
+            if scratch_tensor is not None and operator.ndim == 2:
+                #Halves of the scratch view hold the products, hence no temporary arrays are allocated
+                amplitudes_0, amplitudes_1 = sub_tensor[lower], sub_tensor[upper]
+                updated_0, product = scratch_tensor[lower], scratch_tensor[upper]
+                np.multiply(amplitudes_0, operator[0, 0], out=updated_0)
+                np.multiply(amplitudes_1, operator[1, 0], out=product)
+                updated_0 += product
+                np.multiply(amplitudes_0, operator[0, 1], out=product)
+                amplitudes_1 *= operator[1, 1]
+                amplitudes_1 += product
+                amplitudes_0[...] = updated_0
+                return psi
+
+            amplitudes_0 = sub_tensor[lower].copy()
+            amplitudes_1 = sub_tensor[upper]
+
+            #Stacked operators are broadcasted over the qubit axes of each state vector
+            coefficients = operator.reshape(operator.shape[:-2] + (1,) * (amplitudes_1.ndim - operator.ndim + 2) + (4,))
+            sub_tensor[lower] = amplitudes_0 * coefficients[..., 0] + amplitudes_1 * coefficients[..., 2]
+            sub_tensor[upper] = amplitudes_0 * coefficients[..., 1] + amplitudes_1 * coefficients[..., 3]
+        else:
+            moved = np.moveaxis(sub_tensor, axes, range(-len(axes), 0))
+            product = np.matmul(moved.reshape(batch_shape + (-1, 2**len(axes))), operator)
+            moved[...] = product.reshape(moved.shape)
+
+        return psi
 
 
 
 class StateBase(metaclass=ABCMeta):
     """Base class for all types of states, for example: classical, quantum, etc."""
 
+    in_place = False #True if calculators may update the state vector returned by get_vector in place
+
     def __init__(self, **kwargs):
-        """ Constructor """
+        """ Constructor: stores precision of the amplitudes, "single" for complex64 or "double" for complex128 (default) """
+        self._dtype = precision_dtype(kwargs.get('precision', "double"))
+
+    @property
+    def dtype(self) -> np.dtype:
+        """Complex dtype of the amplitudes"""
+        return self._dtype
 
     @abstractmethod
     def set_to_ground_state(self, num_qubits: int):
@@ -103,6 +255,13 @@ class StateBase(metaclass=ABCMeta):
         """Method that returns the probability of each element in the state vector."""
         pass
 
+    def get_spare_vector(self):
+        """
+        Method that returns preallocated state vector which calculators may overwrite, either as scratch buffer
+        or as output of an operation which is then passed to update_vector, or None if the state has no spare vector.
+        """
+        return None
+
 
 
 class CalculatorBase(metaclass=ABCMeta):
@@ -113,19 +272,163 @@ class CalculatorBase(metaclass=ABCMeta):
           and a optimized version can be written for them.
     """
 
+    max_counts_qubits = 30 #Counts of all outcomes are allocated only up to this number of qubits
+
     def __init__(self, **kwargs):
-        """ Constructor """
+        """
+        Constructor: stores optional seed which is later used for creating measurement strategy,
+        and precision of the operators (default: "double").
+        """
+        self._seed = kwargs.get('seed', None)
+        self._precision = kwargs.get('precision', "double")
+        self._dtype = precision_dtype(self._precision)
+        self._profiler = None
+        #Independent random streams of sampling subsets of qubits and of measurements, both spawned from the seed
+        sampling_seed, self._measurement_seed = np.random.SeedSequence(self._seed).spawn(2)
+        self._random = np.random.default_rng(sampling_seed) #Random generator for sampling subsets of qubits
+
+    def set_profiler(self, profiler):
+        """
+        Method that sets the profiler such as instrumentation collector, or None for no profiling.
+        Calculators call profiler.mark(phase, matrix_shape) at the end of each phase of calculation.
+        """
+        self._profiler = profiler
 
     @abstractmethod
     def calculate_state(self, state: StateBase, total_qubits: int, **operation):
         """Method that calculates the state based on operation matrix and updates the state accordingly."""
         pass
 
+    def calculate_program(self, state: StateBase, total_qubits: int, program):
+        """
+        Method that calculates the state for all operations of the program.
+        By default operations are calculated one by one, calculators can execute groups of operations together.
+        """
+        for operation in program:
+            self.calculate_state(state, total_qubits, **operation)
+        return state
+
+    def calculate_tape(self, state: StateBase, tape):
+        """
+        Method that calculates the state for all instructions of a compiled instruction tape.
+        By default operations of the tape are calculated one by one, calculators can execute the tape directly.
+        """
+        for operation in tape.operations:
+            self.calculate_state(state, tape.total_qubits, **operation)
+        return state
+
     @abstractmethod
-    def measure_state(self, state: StateBase, num_shots: int, total_qubits: int):
-        """Method that measures the state for mentioned number of times and returns the result."""
+    def measure_state(self, state: StateBase, num_shots: int, total_qubits: int, output: str = "dict"):
+        """
+        Method that measures the state for mentioned number of times and returns the result.
+
+        output: "dict" for {bitstring: count}, "counts" for array of counts indexed by outcome
+                or "outcomes" for array of integer outcome of each shot.
+        """
         pass
 
+    def expectation_value(self, state: StateBase, observable, total_qubits: int, qubits = None) -> float:
+        """
+        Method that returns exact expectation value of Pauli observable, without sampling.
+
+        observable: Pauli string with one of I, X, Y or Z per qubit, e.g. "XZI", or weighted sum of
+                    Pauli strings, e.g. { "XX": 0.5, "ZZ": 0.5 }. Letters refer to mentioned qubits (default: all qubits).
+
+        By default, the state vector is reshaped to a tensor with one axis per qubit and Pauli operators flip and sign
+        the axes of their qubits, calculators of other kind of states can override it.
+        """
+        if isinstance(observable, dict):
+            return sum(coefficient * self.expectation_value(state, pauli, total_qubits, qubits)
+                       for pauli, coefficient in observable.items())
+
+        psi = np.asarray(state.get_vector()).reshape((2,) * total_qubits)
+        operated = psi
+        for qubit, pauli in self._parse_pauli(observable, total_qubits, qubits).items():
+            if pauli in "XY":
+                operated = np.flip(operated, qubit) #Amplitudes of |0> and |1> are exchanged
+            if pauli in "YZ":
+                #Z signs |1> and Y gives -i and i after exchanging the amplitudes
+                signs = np.array([1, -1] if pauli == "Z" else [-1j, 1j])
+                operated = operated * signs.reshape((2,) + (1,) * (total_qubits - 1 - qubit))
+        return float(np.real(np.vdot(psi, operated)))
+
+    def marginal_probabilities(self, state: StateBase, qubits, total_qubits: int):
+        """
+        Method that returns exact probabilities of outcomes of mentioned qubits, e.g. for qubits [2, 0] outcome 1 is
+        qubit 2 in |0> and qubit 0 in |1>. Probabilities of the state vector are reshaped and summed over other qubits.
+        """
+        qubits = self._check_qubits(qubits, total_qubits)
+        probabilities = (np.absolute(np.asarray(state.get_vector())) ** 2).reshape((2,) * total_qubits)
+        others = tuple(qubit for qubit in range(total_qubits) if qubit not in qubits)
+        marginal = probabilities.sum(axis=others)
+        marginal = np.transpose(marginal, np.argsort(np.argsort(qubits))).reshape(-1) #Axes in the mentioned order
+        return marginal / marginal.sum() #Normalizing so that values add upto 1.
+
+    def measure_qubits(self, state: StateBase, qubits, num_shots: int, total_qubits: int, output: str = "dict"):
+        """Method that samples outcomes of mentioned qubits only, from their marginal probabilities (see measure_state for output)."""
+        marginal = self.marginal_probabilities(state, qubits, total_qubits)
+        outcomes = np.searchsorted(np.cumsum(marginal), self._random.random(num_shots) * marginal.sum(), side="right")
+        return self._format_measurements(np.minimum(outcomes, marginal.size - 1), len(qubits), output)
+
+    def _parse_pauli(self, pauli: str, total_qubits: int, qubits = None) -> dict:
+        """Protected method which returns Pauli operators other than I of the Pauli string by qubit."""
+        qubits = list(range(total_qubits)) if qubits is None else self._check_qubits(qubits, total_qubits)
+        if len(pauli) != len(qubits):
+            raise KeyError("Error: pauli %s not found for %s qubits." %(pauli, len(qubits)))
+
+        paulis = {}
+        for qubit, letter in zip(qubits, pauli.upper()):
+            if letter not in "IXYZ":
+                raise KeyError("Error: pauli %s not found." %letter)
+            if letter != "I":
+                paulis[qubit] = letter
+        return paulis
+
+    def _check_qubits(self, qubits, total_qubits: int):
+        """Protected method which checks that mentioned qubits are distinct qubits of the state."""
+        qubits = list(qubits)
+        for qubit in qubits:
+            if not 0 <= qubit < total_qubits:
+                raise KeyError("Error: qubit %s not found." %qubit)
+        if len(set(qubits)) != len(qubits):
+            raise KeyError("Error: qubits %s are not distinct." %qubits)
+        return qubits
+
+    def _format_measurements(self, outcomes, total_qubits: int, output: str):
+        """Protected method which converts integer outcomes of shots to the mentioned output format."""
+        if output == "outcomes":
+            return outcomes
+
+        if output == "counts":
+            if total_qubits > self.max_counts_qubits:
+                raise KeyError("Error: output counts is limited to %s qubits, use output dict for %s qubits."
+                               %(self.max_counts_qubits, total_qubits))
+            return np.bincount(outcomes, minlength=2**total_qubits)
+        if output == "dict":
+            #Bitstrings are formatted only for the outcomes which occurred
+            occurred, counts = np.unique(outcomes, return_counts=True)
+            return {np.binary_repr(outcome, total_qubits): int(count) for outcome, count in zip(occurred, counts)}
+
+        raise KeyError("Error: output %s not found." %output)
+
+    def _format_bits(self, bits, total_qubits: int, output: str):
+        """
+        Protected method which converts outcome bits of shots, of shape (num_shots, n) with qubit 0 as the most significant bit,
+        to the mentioned output format. Outcomes of 63 or more qubits do not fit in integers and are bitstrings instead.
+        """
+        if total_qubits < 63:
+            outcomes = bits.astype(np.int64) @ (1 << np.arange(total_qubits - 1, -1, -1, dtype=np.int64))
+            return self._format_measurements(outcomes, total_qubits, output)
+
+        bitstrings = np.array(["".join(row) for row in np.where(bits, "1", "0")])
+        if output == "outcomes":
+            return bitstrings
+        if output == "dict":
+            occurred, counts = np.unique(bitstrings, return_counts=True)
+            return {str(outcome): int(count) for outcome, count in zip(occurred, counts)}
+
+        raise KeyError("Error: output %s not found for %s qubits." %(output, total_qubits))
+
 
 class MeasurementBase(metaclass=ABCMeta):
     """Base class for all types of measurement strategies, for example: classical/simulated measurement strategy, 
@@ -139,6 +442,10 @@ class MeasurementBase(metaclass=ABCMeta):
         """Method that measures the final state of the circuit and returns the result."""
         pass
 
+    def sample(self, final_state: StateBase, total_qubits: int, num_shots: int):
+        """Method that measures the final state for mentioned number of times and returns integer outcome of each shot."""
+        return np.array([int(self.measure_state(final_state, total_qubits), 2) for i in range(num_shots)], dtype=np.int64)
+
 
 
 class CircuitBase(metaclass=ABCMeta):
@@ -148,7 +455,7 @@ class CircuitBase(metaclass=ABCMeta):
         """ Constructor """
 
     @abstractmethod
-    def initialize(self, num_qubits: int):
+    def initialize(self, num_qubits: int, **kwargs):
         """Method that returns the ground state with mentioned number of qubits."""
         pass
 
@@ -168,6 +475,6 @@ class CircuitBase(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def measure(self, final_state: StateBase, num_shots : int):
+    def measure(self, final_state: StateBase, num_shots : int, output: str = "dict"):
         """Method that returns the result of multi-shot measurement of the final state."""
         pass
\ No newline at end of file
@@ -0,0 +1,346 @@
+"""
+This module contains benchmark suite of the simulation circuit. It benchmarks gate application, measurement,
+operator construction, end-to-end circuits (GHZ, QFT, random and Clifford layered circuits) and concurrent execution
+of many small circuits by a thread pool over number of qubits and circuit depth for every registered calculator,
+and records wall time, peak memory, throughput in gates/sec and number of passes over the state vector to a JSON file. Two result files can be compared for catching regressions.
+
+For example: running the suite and comparing it with previous results from command line.
+
+python Benchmark.py run --output current.json --qubits 2 12
+python Benchmark.py run --output blocked.json --qubits 20 24 --calculators Tensor Blocked --benchmarks circuit --depths 16
+python Benchmark.py compare baseline.json current.json --threshold 0.1
+
+or from python:
+
+from Benchmark import BenchmarkSuite
+
+suite = BenchmarkSuite(calculators=["Numpy", "Tensor"], qubits=range(2, 11))
+BenchmarkSuite.save(suite.run(), "current.json")
+
+"""
+
+from Factory import *
+from Entities import *
+from Sparse import *
+from Parallel import *
+from Mapped import *
+from Blocked import *
+from Stabilizer import *
+from MPS import *
+from Dictionary import *
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import datetime
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+
+"""Circuits"""
+
+
+def h_gate(target: int):
+    """Returns H gate operation"""
+    return { "gate": "U3", "params": { "theta": np.pi / 2, "phi": 0, "lambda": np.pi }, "target": target }
+
+
+def cx_gate(control: int, target: int):
+    """Returns CX gate operation"""
+    return { "gate": "CU", "params": { "theta": np.pi, "phi": 0, "lambda": np.pi }, "control": control, "target": target }
+
+
+def ghz_circuit(num_qubits: int, depth: int = 1):
+    """Returns program which prepares GHZ state, repeated depth times"""
+    program = []
+    for layer in range(depth):
+        program.append(h_gate(0))
+        program.extend(cx_gate(i, i + 1) for i in range(num_qubits - 1))
+    return program
+
+
+def qft_circuit(num_qubits: int, depth: int = 1):
+    """Returns program of quantum Fourier transform with controlled phase gates and final swaps, repeated depth times"""
+    program = []
+    for layer in range(depth):
+        for target in range(num_qubits):
+            program.append(h_gate(target))
+            for control in range(target + 1, num_qubits):
+                angle = np.pi / 2**(control - target)
+                program.append({ "gate": "CU", "params": { "theta": 0, "phi": 0, "lambda": angle }, "control": control, "target": target })
+        for i in range(num_qubits // 2):
+            j = num_qubits - 1 - i
+            program.extend([cx_gate(i, j), cx_gate(j, i), cx_gate(i, j)])
+    return program
+
+
+def random_circuit(num_qubits: int, depth: int = 1, seed: int = 0):
+    """Returns program with depth layers of random U3 gates on all qubits followed by CX gates on random pairs"""
+    random_generator = np.random.default_rng(seed)
+    program = []
+    for layer in range(depth):
+        for target in range(num_qubits):
+            theta, phi, lamda = random_generator.uniform(0, 2 * np.pi, 3)
+            program.append({ "gate": "U3", "params": { "theta": theta, "phi": phi, "lambda": lamda }, "target": target })
+        qubits = random_generator.permutation(num_qubits)
+        program.extend(cx_gate(int(qubits[i]), int(qubits[i + 1])) for i in range(0, num_qubits - 1, 2))
+    return program
+
+
+def clifford_circuit(num_qubits: int, depth: int = 1, seed: int = 0):
+    """Returns program with depth layers of random H, S, Z or X gates on all qubits followed by CX or CZ gates on random pairs"""
+    random_generator = np.random.default_rng(seed)
+    single_qubit_params = [{ "theta": np.pi / 2, "phi": 0, "lambda": np.pi }, #h gate
+                           { "theta": 0, "phi": 0, "lambda": np.pi / 2 }, #s gate
+                           { "theta": 0, "phi": 0, "lambda": np.pi }, #z gate
+                           { "theta": np.pi, "phi": 0, "lambda": np.pi }] #x gate
+    two_qubit_params = [{ "theta": np.pi, "phi": 0, "lambda": np.pi }, #cx gate
+                        { "theta": 0, "phi": 0, "lambda": np.pi }] #cz gate
+    program = []
+    for layer in range(depth):
+        for target in range(num_qubits):
+            params = single_qubit_params[random_generator.integers(len(single_qubit_params))]
+            program.append({ "gate": "U3", "params": params, "target": target })
+        qubits = random_generator.permutation(num_qubits)
+        for i in range(0, num_qubits - 1, 2):
+            params = two_qubit_params[random_generator.integers(len(two_qubit_params))]
+            program.append({ "gate": "CU", "params": params, "control": int(qubits[i]), "target": int(qubits[i + 1]) })
+    return program
+
+
+"""Suite"""
+
+
+class BenchmarkSuite(object):
+    """
+    This class runs the benchmarks for mentioned calculators, number of qubits and depths.
+    Calculators are names of registered calculators or (name, parameters) pairs, all registered calculators by default.
+    Benchmarks can be limited to some of "gate", "operator", "measurement", "circuit" and "concurrent", and circuits to some of
+    "ghz", "qft", "random" and "clifford".
+    Calculators which build dense 2^n x 2^n operators are only benchmarked up to max_dense_qubits.
+    Concurrent benchmark runs random circuit on concurrent_circuits states with a pool of threads sharing one calculator,
+    up to max_concurrent_qubits and only for calculators of classical states.
+    Calculators of Clifford circuits, i.e. Stabilizer calculator, are only benchmarked on Clifford programs.
+    """
+
+    circuits = { "ghz": ghz_circuit, "qft": qft_circuit, "random": random_circuit, "clifford": clifford_circuit }
+    state_types = { "Parallel": "Shared", "Streaming": "Mapped", "Stabilizer": "Stabilizer",
+                    "MPS": "MPS", "Dictionary": "Dictionary" } #Default state type is Classical
+    dense_calculators = ["Numpy"]
+    clifford_calculators = ["Stabilizer"]
+
+    def __init__(self, calculators = None, qubits = range(2, 11), depths = (1, 4), num_shots: int = 1000,
+                 repeats: int = 3, max_dense_qubits: int = 10, verbose: bool = True,
+                 benchmarks = ("gate", "operator", "measurement", "circuit", "concurrent"), circuit_names = None,
+                 threads: int = 4, concurrent_circuits: int = 64, max_concurrent_qubits: int = 10):
+        """ Constructor """
+        if calculators is None:
+            calculators = sorted(Calculators._products)
+        self.__calculators = [(calculator, {}) if isinstance(calculator, str) else calculator for calculator in calculators]
+        self.__qubits = list(qubits)
+        self.__depths = list(depths)
+        self.__num_shots = num_shots
+        self.__repeats = repeats
+        self.__max_dense_qubits = max_dense_qubits
+        self.__verbose = verbose
+        self.__benchmarks = list(benchmarks)
+        self.__circuit_names = list(self.circuits) if circuit_names is None else list(circuit_names)
+        self.__threads = threads
+        self.__concurrent_circuits = concurrent_circuits
+        self.__max_concurrent_qubits = max_concurrent_qubits
+        self.__clifford_checker = Calculators.create("Stabilizer")
+
+    def run(self):
+        """Runs all benchmarks and returns list of results"""
+        results = []
+        for calculator_type, parameters in self.__calculators:
+            for num_qubits in self.__qubits:
+                if calculator_type in self.dense_calculators and num_qubits > self.__max_dense_qubits:
+                    continue
+
+                cases = [("gate", "U3", 1, [h_gate(i) for i in range(num_qubits)]),
+                         ("gate", "CU", 1, [cx_gate(i, (i + 1) % num_qubits) for i in range(num_qubits)]),
+                         ("operator", "matrix" if calculator_type in self.dense_calculators else "block", 1,
+                          [h_gate(i) for i in range(num_qubits)] + [cx_gate(i, (i + 1) % num_qubits) for i in range(num_qubits)]),
+                         ("measurement", "ghz", 1, ghz_circuit(num_qubits))]
+                for depth in self.__depths:
+                    cases.extend(("circuit", name, depth, self.circuits[name](num_qubits, depth)) for name in self.__circuit_names)
+                    if calculator_type not in self.state_types and num_qubits <= self.__max_concurrent_qubits:
+                        cases.append(("concurrent", "random", depth, random_circuit(num_qubits, depth)))
+
+                for benchmark, name, depth, program in cases:
+                    if benchmark not in self.__benchmarks:
+                        continue
+                    if calculator_type in self.clifford_calculators and not self.__clifford_checker.is_clifford(program):
+                        continue
+                    result = self.run_case(benchmark, name, calculator_type, parameters, num_qubits, depth, program)
+                    results.append(result)
+                    if self.__verbose:
+                        print("%-12s %-8s %-24s qubits: %3d depth: %3d time: %10.6f s memory: %10.3f MiB gates/sec: %12.1f passes: %s" %
+                              (benchmark, name, result["calculator"], num_qubits, depth, result["wall_time"],
+                               result["peak_memory"] / 1024**2, result["gates_per_second"], result["passes"]))
+        return results
+
+    def run_case(self, benchmark: str, name: str, calculator_type: str, parameters: dict, num_qubits: int, depth: int, program):
+        """Runs one benchmark and returns its result with best wall time of the repeats and peak memory of a traced run"""
+        calculator = Calculators.create(calculator_type, seed=0, **parameters)
+        state_type = self.state_types.get(calculator_type, "Classical")
+
+        wall_time = min(self.__timed_run(benchmark, name, calculator, state_type, num_qubits, program) for i in range(self.__repeats))
+
+        #Passes over the state vector, calculators which execute groups of operations together count them
+        passes = None
+        if benchmark in ("gate", "circuit"):
+            passes = getattr(calculator, "passes", len(program))
+
+        tracemalloc.start()
+        self.__timed_run(benchmark, name, calculator, state_type, num_qubits, program)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        if hasattr(calculator, "close"):
+            calculator.close()
+
+        label = calculator_type
+        if parameters:
+            label += "(%s)" % ", ".join("%s=%s" % item for item in sorted(parameters.items()))
+
+        gates = len(program) * (self.__concurrent_circuits if benchmark == "concurrent" else 1)
+        return { "benchmark": benchmark, "name": name, "calculator": label, "qubits": num_qubits, "depth": depth,
+                 "gates": gates, "passes": passes, "wall_time": wall_time, "peak_memory": peak_memory,
+                 "gates_per_second": gates / wall_time if wall_time > 0 else float("inf") }
+
+    def __timed_run(self, benchmark: str, name: str, calculator: CalculatorBase, state_type: str, num_qubits: int, program):
+        """Returns wall time of one run of the benchmark, preparation of the state is not timed"""
+        state = States.create(state_type)
+        state.set_to_ground_state(num_qubits)
+
+        if benchmark == "concurrent":
+            states = [States.create(state_type) for i in range(self.__concurrent_circuits)]
+            for concurrent_state in states:
+                concurrent_state.set_to_ground_state(num_qubits)
+            executor = ThreadPoolExecutor(self.__threads)
+
+            def run_circuit(concurrent_state):
+                for operation in program:
+                    calculator.calculate_state(concurrent_state, num_qubits, **operation)
+
+        if benchmark == "measurement":
+            for operation in program:
+                calculator.calculate_state(state, num_qubits, **operation)
+
+        cache_bytes = Operators.cache_info()["max_bytes"]
+        Operators.configure_cache(0) #Operator matrices are rebuilt in every run
+
+        start_time = time.perf_counter()
+        if benchmark == "measurement":
+            calculator.measure_state(state, self.__num_shots, num_qubits)
+        elif benchmark == "operator" and name == "matrix":
+            for operation in program:
+                Operators.create_matrix(num_qubits, **operation)
+        elif benchmark == "operator":
+            for operation in program:
+                Operators.create(operation["gate"], **operation["params"]).block()
+        elif benchmark == "concurrent":
+            list(executor.map(run_circuit, states))
+        else:
+            calculator.calculate_program(state, num_qubits, program)
+        wall_time = time.perf_counter() - start_time
+
+        Operators.configure_cache(cache_bytes)
+        if benchmark == "concurrent":
+            executor.shutdown()
+
+        if hasattr(state, "close"):
+            state.close()
+        return wall_time
+
+    @staticmethod
+    def save(results, path: str):
+        """Saves results with platform details to a JSON file"""
+        document = { "created": datetime.datetime.now().isoformat(), "python": platform.python_version(),
+                     "numpy": np.__version__, "platform": platform.platform(), "results": results }
+        with open(path, "w") as file:
+            json.dump(document, file, indent=1)
+
+    @staticmethod
+    def load(path: str):
+        """Returns results from a JSON file"""
+        with open(path) as file:
+            return json.load(file)["results"]
+
+    @staticmethod
+    def compare(baseline, current, threshold: float = 0.1):
+        """
+        Returns comparison of the results which exist in both lists, with ratio of current to baseline wall time and
+        peak memory. Result is a regression if either ratio is bigger than 1 + threshold.
+        """
+        def key(result):
+            return (result["benchmark"], result["name"], result["calculator"], result["qubits"], result["depth"])
+
+        baseline = { key(result): result for result in baseline }
+        comparison = []
+        for result in current:
+            previous = baseline.get(key(result), None)
+            if previous is None:
+                continue
+            time_ratio = result["wall_time"] / previous["wall_time"] if previous["wall_time"] > 0 else 1.0
+            memory_ratio = result["peak_memory"] / previous["peak_memory"] if previous["peak_memory"] > 0 else 1.0
+            comparison.append(dict(zip(("benchmark", "name", "calculator", "qubits", "depth"), key(result)),
+                                   time_ratio=time_ratio, memory_ratio=memory_ratio,
+                                   regression=time_ratio > 1 + threshold or memory_ratio > 1 + threshold))
+        return comparison
+
+
+"""Command line"""
+
+
+def main(arguments = None):
+    """Runs the suite or compares two result files, returns exit code 1 if any regression is found"""
+    parser = argparse.ArgumentParser(description="Benchmark suite of Brahmand simulator")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and save results")
+    run_parser.add_argument("--output", default="benchmark.json")
+    run_parser.add_argument("--calculators", nargs="+", default=None)
+    run_parser.add_argument("--qubits", nargs=2, type=int, default=[2, 10], metavar=("MIN", "MAX"))
+    run_parser.add_argument("--depths", nargs="+", type=int, default=[1, 4])
+    run_parser.add_argument("--shots", type=int, default=1000)
+    run_parser.add_argument("--repeats", type=int, default=3)
+    run_parser.add_argument("--max-dense-qubits", type=int, default=10)
+    run_parser.add_argument("--benchmarks", nargs="+", default=["gate", "operator", "measurement", "circuit", "concurrent"])
+    run_parser.add_argument("--circuits", nargs="+", default=None)
+    run_parser.add_argument("--threads", type=int, default=4)
+    run_parser.add_argument("--concurrent-circuits", type=int, default=64)
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+
+    arguments = parser.parse_args(arguments)
+
+    if arguments.command == "run":
+        suite = BenchmarkSuite(arguments.calculators, range(arguments.qubits[0], arguments.qubits[1] + 1), arguments.depths,
+                               arguments.shots, arguments.repeats, arguments.max_dense_qubits, True,
+                               arguments.benchmarks, arguments.circuits, arguments.threads, arguments.concurrent_circuits)
+        BenchmarkSuite.save(suite.run(), arguments.output)
+        return 0
+
+    comparison = BenchmarkSuite.compare(BenchmarkSuite.load(arguments.baseline), BenchmarkSuite.load(arguments.current),
+                                        arguments.threshold)
+    for result in comparison:
+        print("%-12s %-8s %-24s qubits: %3d depth: %3d time: %6.2fx memory: %6.2fx %s" %
+              (result["benchmark"], result["name"], result["calculator"], result["qubits"], result["depth"],
+               result["time_ratio"], result["memory_ratio"], "REGRESSION" if result["regression"] else ""))
+
+    regressions = sum(result["regression"] for result in comparison)
+    print("regressions: %s of %s" % (regressions, len(comparison)))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+This module contains blocked calculation strategy for deep circuits on large state vectors.
+State vector is treated as rows of blocks of amplitudes of the low-order (fused) qubits. Consecutive operations on the
+fused qubits are fused into one block matrix, which is applied to all blocks at once by one matrix product,
+hence each group of operations costs one pass over the state vector instead of one pass per operation.
+Operations on high-order qubits are brought to the fused qubits by occasional qubit reordering steps,
+which also cost one pass each.
+
+For example: 25 qubits with blocks of 5 fused qubits.
+
+from Factory import *
+from Entities import *
+from Blocked import *
+from Circuit import Circuit
+
+simulator = Circuit("Classical", "Blocked", fused_qubits=5)
+final_state = simulator.run(simulator.initialize(25), my_circuit)
+
+"""
+
+from Base import *
+from Factory import *
+from Entities import TensorCalculator
+from Compiler import InstructionTape
+import bisect
+import numpy as np
+
+
+"""Calculation Strategies"""
+
+
+@Calculators.register("Blocked")
+class BlockedCalculator(TensorCalculator):
+    """
+    This class calculates programs and instruction tapes block by block. Qubits n-k to n-1 are the local qubits of blocks
+    of 2^k amplitudes (big endian encoding), i.e. rows of the state vector reshaped to (2^(n-k), 2^k), other qubits are fixed
+    within a block. Consecutive operations on local qubits are fused into one 2^k x 2^k matrix which is applied to all blocks
+    by one matrix product. Operations controlled by other qubits are applied in one vectorized call to the blocks whose
+    index has the control bits set. Operations targeting other qubits trigger reordering, which brings the qubits of as many
+    next operations as fit in a block to local qubits, in place of the local qubits whose next use is farthest,
+    and the original order of the qubits is restored after the program. Single operations are calculated like Tensor calculator.
+
+    Parameters: fused_qubits i.e. k, from 1 to max_fused_qubits (default: 4, more qubits fuse more operations but cost more
+    per product). Number of passes over the state vector of the last program is kept in passes.
+    """
+
+    max_fused_qubits = 6 #Block matrices are at most 2^6 x 2^6
+
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self.__fused_qubits = kwargs.get('fused_qubits', 4)
+        if not 1 <= self.__fused_qubits <= self.max_fused_qubits:
+            raise KeyError("Error: fused_qubits %s is not between 1 and %s." %(self.__fused_qubits, self.max_fused_qubits))
+        self.passes = 0
+
+    def calculate_program(self, state: StateBase, total_qubits: int, program):
+        if not state.in_place:
+            return super().calculate_program(state, total_qubits, program)
+        return self.calculate_tape(state, InstructionTape(program, total_qubits, self._precision))
+
+    def calculate_tape(self, state: StateBase, tape):
+        local_qubits = self.__fused_qubits
+        if not state.in_place or tape.total_qubits <= local_qubits:
+            self.passes = len(tape)
+            return super().calculate_tape(state, tape)
+
+        total_qubits = tape.total_qubits
+        num_global = total_qubits - local_qubits #Qubits fixed within a block
+        instructions = self.__instructions(tape)
+
+        #Operation indices using each qubit, for finding the qubit whose next use is farthest
+        uses = [[] for qubit in range(total_qubits)]
+        for index, (matrix, kind, targets, controls) in enumerate(instructions):
+            for qubit in list(targets) + list(controls):
+                uses[qubit].append(index)
+
+        positions = list(range(total_qubits)) #Axis of each qubit in the state vector
+        group = []
+        self.passes = 0
+
+        for index, (matrix, kind, targets, controls) in enumerate(instructions):
+            if len(targets) > local_qubits:
+                #Operation does not fit in a block, hence it is applied on the whole state vector
+                self.__apply_group(state, total_qubits, local_qubits, group)
+                group = []
+                OperatorBase._apply_operator_in_place(state.get_vector(), total_qubits, matrix,
+                                                      [positions[target] for target in targets],
+                                                      [positions[control] for control in controls], kind)
+                self.passes += 1
+                continue
+
+            if any(positions[target] < num_global for target in targets):
+                self.__apply_group(state, total_qubits, local_qubits, group)
+                group = []
+                self.__reorder(state, total_qubits, positions, self.__swaps(instructions, positions, uses, index, num_global))
+
+            local_targets = [positions[target] - num_global for target in targets]
+            local_controls = [positions[control] - num_global for control in controls if positions[control] >= num_global]
+            global_mask = 0 #Block index bits of the control qubits which are fixed within a block
+            for control in controls:
+                if positions[control] < num_global:
+                    global_mask |= 1 << (num_global - 1 - positions[control])
+            group.append((matrix, kind, local_targets, local_controls, global_mask))
+
+        self.__apply_group(state, total_qubits, local_qubits, group)
+        if positions != list(range(total_qubits)):
+            self.__reorder(state, total_qubits, positions, [])
+        return state
+
+    def __instructions(self, tape):
+        """Returns matrix, kind, targets and controls of each instruction of the tape"""
+        instructions = []
+        control_offsets = tape.control_offsets.tolist()
+        controls = tape.controls.tolist()
+        for index, opcode in enumerate(tape.opcodes.tolist()):
+            operation_controls = controls[control_offsets[index]:control_offsets[index + 1]]
+            if opcode == InstructionTape.GENERAL:
+                instructions.append((tape.general_matrices[index], None, tape.general_targets[index], operation_controls))
+            else:
+                instructions.append((tape.matrices[index], int(tape.kinds[index]), [int(tape.targets[index])], operation_controls))
+        return instructions
+
+    def __swaps(self, instructions, positions, uses, index: int, num_global: int):
+        """
+        Returns pairs of qubits to swap, which bring the target and control qubits of the next operations to local qubits,
+        as many as fit in a block, in place of the local qubits which are not needed by them and are used farthest.
+        Targets of the first operation are always brought, its controls may stay outside.
+        """
+        wanted = []
+        for matrix, kind, targets, controls in instructions[index:]:
+            new_qubits = [qubit for qubit in list(targets) + list(controls) if qubit not in wanted]
+            if len(wanted) + len(new_qubits) > len(positions) - num_global:
+                if not wanted:
+                    wanted = list(targets)
+                break
+            wanted.extend(new_qubits)
+
+        def next_use(qubit):
+            later = bisect.bisect_left(uses[qubit], index)
+            return uses[qubit][later] if later < len(uses[qubit]) else float("inf")
+
+        incoming = [qubit for qubit in wanted if positions[qubit] < num_global]
+        outgoing = sorted((qubit for qubit, position in enumerate(positions) if position >= num_global and qubit not in wanted),
+                          key=next_use, reverse=True)
+        return list(zip(incoming, outgoing))
+
+    def __reorder(self, state: StateBase, total_qubits: int, positions, swaps):
+        """Swaps positions of the pairs of qubits, or restores original order of the qubits without swaps, in one pass"""
+        new_positions = list(positions)
+        for qubit, other in swaps:
+            new_positions[qubit], new_positions[other] = positions[other], positions[qubit]
+        if not swaps:
+            new_positions = list(range(total_qubits))
+
+        #Axis of new state vector at each position is the axis of the same qubit in current state vector
+        axes = [0] * total_qubits
+        for qubit in range(total_qubits):
+            axes[new_positions[qubit]] = positions[qubit]
+
+        psi = state.get_vector()
+        spare = state.get_spare_vector()
+        if spare is None:
+            spare = np.empty_like(psi)
+        spare.reshape((2,) * total_qubits)[...] = psi.reshape((2,) * total_qubits).transpose(axes)
+        state.update_vector(spare)
+        positions[:] = new_positions
+        self.passes += 1
+
+    def __apply_group(self, state: StateBase, total_qubits: int, local_qubits: int, group):
+        """
+        Applies group of operations on local qubits to all blocks of the state vector. Consecutive operations whose control
+        qubits are all local are fused into one block matrix, by applying them on the rows of the identity matrix.
+        Other operations are applied to the view of the blocks whose control bits are set, i.e. the state vector reshaped
+        to (2, ..., 2, 2^k) with one axis per block index bit, where index 1 is selected on the axes of the control bits.
+        """
+        num_global = total_qubits - local_qubits
+        fused = None
+        for entry in group + [None]:
+            if entry is not None and entry[4] == 0:
+                matrix, kind, targets, controls, global_mask = entry
+                if fused is None:
+                    fused = np.identity(2**local_qubits, dtype=state.get_vector().dtype)
+                OperatorBase._apply_operator_in_place(fused, local_qubits, matrix, targets, controls, kind)
+                continue
+
+            if fused is not None:
+                self.__apply_block_matrix(state, fused)
+                fused = None
+            if entry is None:
+                break
+
+            matrix, kind, targets, controls, global_mask = entry
+            blocks = state.get_vector().reshape((2,) * num_global + (2**local_qubits,))
+            index = tuple(1 if global_mask >> (num_global - 1 - axis) & 1 else slice(None) for axis in range(num_global))
+            OperatorBase._apply_operator_in_place(blocks[index], local_qubits, matrix, targets, controls, kind)
+            self.passes += 1
+
+    def __apply_block_matrix(self, state: StateBase, matrix):
+        """Multiplies all blocks of the state vector by the block matrix in one product, writing the spare vector if the state has one"""
+        psi = state.get_vector()
+        blocks = psi.reshape(-1, matrix.shape[0])
+        spare = state.get_spare_vector()
+        if spare is not None and spare.dtype == np.result_type(psi, matrix):
+            np.matmul(blocks, matrix, out=spare.reshape(blocks.shape))
+            state.update_vector(spare) #Spare vector is swapped in
+        else:
+            blocks[...] = np.matmul(blocks, matrix)
+        self.passes += 1
@@ -0,0 +1,260 @@
+"""
+This module contains caches which are used by factories and circuits for reusing expensive results
+such as operator matrices.
+
+For example: operator matrices are cached by 'Operators' factory.
+
+from Factory import *
+
+Operators.configure_cache(256 * 1024**2) #256 MiB budget
+matrix = Operators.create_matrix(3, gate="U3", params={ "theta": 1.5708, "phi": 0, "lambda": -3.1415 }, target=0)
+print(Operators.cache_info())
+
+Results of simulations can be cached on disk and shared by processes, e.g. regression runs of same programs.
+
+simulator = Circuit("Classical", "Tensor", seed=7, result_cache=DiskCache("/tmp/brahmand", 1024**3))
+final_state, measurements = simulator.simulate(20, my_circuit, 1000) #Second run loads the results from the cache
+
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: #Windows
+    fcntl = None
+    import msvcrt
+
+class LRUCache(object):
+    """
+    This class defines a least recently used cache which is bounded by memory budget in bytes.
+    Least recently used entries are evicted when the budget is exceeded and entries bigger than the budget are not stored.
+    """
+
+    def __init__(self, max_bytes: int):
+        """ Constructor """
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__max_bytes = max_bytes
+        self.__bytes = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    def get(self, key):
+        """Returns cached value for the key or None and marks the entry as most recently used"""
+        with self.__lock:
+            entry = self.__entries.get(key, None)
+            if entry is None:
+                self.__misses += 1
+                return None
+
+            self.__hits += 1
+            self.__entries.move_to_end(key)
+            return entry[0]
+
+    def __contains__(self, key) -> bool:
+        """Checks whether the key is cached, without marking the entry as used"""
+        with self.__lock:
+            return key in self.__entries
+
+    def put(self, key, value, nbytes: int = None):
+        """Stores the value for the key, size of value is taken from nbytes attribute if it is not mentioned"""
+        if nbytes is None:
+            nbytes = value.nbytes
+        if nbytes > self.__max_bytes:
+            return
+
+        with self.__lock:
+            if key in self.__entries:
+                self.__bytes -= self.__entries.pop(key)[1]
+            self.__entries[key] = (value, nbytes)
+            self.__bytes += nbytes
+
+            while self.__bytes > self.__max_bytes:
+                evicted_key, (evicted_value, evicted_bytes) = self.__entries.popitem(last=False)
+                self.__bytes -= evicted_bytes
+                self.__evictions += 1
+
+    def clear(self):
+        """Removes all entries and resets the counters"""
+        with self.__lock:
+            self.__entries.clear()
+            self.__bytes = 0
+            self.__hits = 0
+            self.__misses = 0
+            self.__evictions = 0
+
+    def info(self):
+        """Returns counters and memory usage of the cache"""
+        with self.__lock:
+            return { "hits": self.__hits, "misses": self.__misses, "evictions": self.__evictions,
+                     "entries": len(self.__entries), "bytes": self.__bytes, "max_bytes": self.__max_bytes }
+
+    @staticmethod
+    def hashable(value):
+        """Converts value such as operation parameters to a hashable key"""
+        if isinstance(value, dict):
+            return tuple(sorted((key, LRUCache.hashable(item)) for key, item in value.items()))
+        if isinstance(value, (list, tuple)):
+            return tuple(LRUCache.hashable(item) for item in value)
+        if isinstance(value, np.ndarray):
+            return (value.shape, value.dtype.str, value.tobytes())
+        return value
+
+
+class DiskCache(object):
+    """
+    This class defines a persistent cache in a directory, which can be shared by processes. Arrays such as state vectors
+    are stored in .npy files and are memory-mapped when they are loaded, dictionaries such as counts are stored in .json files.
+    Least recently used entries, by modification time of their files, are evicted when the size of the entries exceeds
+    the budget in bytes. Entries are written to temporary files and renamed, so readers never see partial entries,
+    and writes and evictions hold an exclusive lock on the lock file of the directory.
+    """
+
+    __extensions = (".npy", ".json")
+
+    def __init__(self, directory: str, max_bytes: int = 1024**3):
+        """ Constructor: creates the directory if it does not exist """
+        self.__directory = directory
+        self.__max_bytes = max_bytes
+        self.__lock = threading.Lock() #Counters of this process
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def directory(self) -> str:
+        """Directory of the cache"""
+        return self.__directory
+
+    @staticmethod
+    def content_hash(*parts) -> str:
+        """Returns SHA-256 hash of the parts such as program, number of qubits, state type, calculator type and precision"""
+        content = repr(LRUCache.hashable(list(parts)))
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def get(self, key: str):
+        """Returns memory-mapped read-only array or dictionary cached for the key or None, and marks the entry as most recently used"""
+        for extension in self.__extensions:
+            path = os.path.join(self.__directory, key + extension)
+            try:
+                if extension == ".npy":
+                    value = np.load(path, mmap_mode="r")
+                else:
+                    with open(path) as file:
+                        value = json.load(file)
+                os.utime(path) #Recency of the entry
+            except (FileNotFoundError, ValueError): #Missing, evicted or being replaced by another process
+                continue
+            with self.__lock:
+                self.__hits += 1
+            return value
+
+        with self.__lock:
+            self.__misses += 1
+        return None
+
+    def put(self, key: str, value):
+        """Stores array or dictionary for the key and evicts least recently used entries of all processes if the budget is exceeded"""
+        if isinstance(value, np.ndarray):
+            extension = ".npy"
+        elif isinstance(value, dict):
+            extension = ".json"
+        else:
+            raise TypeError("Error: value of type %s is not supported." %type(value).__name__)
+
+        descriptor, temporary = tempfile.mkstemp(suffix=".tmp", dir=self.__directory)
+        with os.fdopen(descriptor, "wb" if extension == ".npy" else "w") as file:
+            if extension == ".npy":
+                np.save(file, value)
+            else:
+                json.dump(value, file)
+        if os.path.getsize(temporary) > self.__max_bytes:
+            os.remove(temporary)
+            return
+
+        with self.__locked():
+            try:
+                os.replace(temporary, os.path.join(self.__directory, key + extension))
+            except OSError: #Entry is open by another process on Windows, hence it is kept
+                os.remove(temporary)
+                return
+            self.__evict(key + extension)
+
+    def clear(self):
+        """Removes all entries and resets the counters"""
+        with self.__locked():
+            for name, size, modified in self.__entries():
+                try:
+                    os.remove(os.path.join(self.__directory, name))
+                except OSError: #Removed by another process, or open by another process on Windows
+                    pass
+        with self.__lock:
+            self.__hits = 0
+            self.__misses = 0
+            self.__evictions = 0
+
+    def info(self):
+        """Returns counters of this process and memory usage of the cache"""
+        entries = self.__entries()
+        with self.__lock:
+            return { "hits": self.__hits, "misses": self.__misses, "evictions": self.__evictions, "entries": len(entries),
+                     "bytes": sum(size for name, size, modified in entries), "max_bytes": self.__max_bytes }
+
+    def __entries(self):
+        """Returns name, size and modification time of the files of all entries"""
+        entries = []
+        for entry in os.scandir(self.__directory):
+            if entry.name.endswith(self.__extensions):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.name, stat.st_size, stat.st_mtime_ns))
+        return entries
+
+    def __evict(self, kept: str):
+        """Removes least recently used entries other than the kept entry until the size is within the budget"""
+        entries = sorted(self.__entries(), key=lambda entry: entry[2])
+        total = sum(size for name, size, modified in entries)
+        for name, size, modified in entries:
+            if total <= self.__max_bytes:
+                break
+            if name == kept:
+                continue
+            try:
+                os.remove(os.path.join(self.__directory, name))
+            except FileNotFoundError: #Removed by another process
+                pass
+            except OSError: #Open by another process on Windows, hence it is kept
+                continue
+            total -= size
+            with self.__lock:
+                self.__evictions += 1
+
+    @contextmanager
+    def __locked(self):
+        """Holds exclusive lock on the lock file of the directory, which is shared by processes"""
+        with open(os.path.join(self.__directory, ".lock"), "a+") as file:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+                else:
+                    file.seek(0)
+                    msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -29,28 +29,110 @@ simulator.measure(final_state, 1000)
 
 from Factory import *
 from Base import *
+from Compiler import GateFusion
+from Compiler import InstructionTape
+from Compiler import CircuitUnitary
+from Cache import LRUCache
+from Cache import DiskCache
+from Streaming import JsonLinesProgram
+from Stabilizer import StabilizerState
+from Stabilizer import StabilizerCalculator
+import itertools
+import threading
+import numpy as np
 
 class Circuit(CircuitBase):
     """
     This class is a classical simulator of a quantum circuit.
+    Clifford programs are routed to the stabilizer engine only by simulate, whereas initialize, run and measure
+    use the state and calculator types the circuit is constructed with.
+
+    Circuit can be driven from a thread pool, each thread running its own states: number of qubits set by
+    initialize, simulate or sweep is kept per thread, and states and caches are not shared between runs.
     """
 
-    def __init__(self, state_type: str, calculator_type: str):
-        """ Constructor """
+    _unitaries = LRUCache(256 * 1024**2) #Unitaries of whole programs by content hash, default memory budget of 256 MiB
+    max_unitary_qubits = 11 #Unitaries are built only up to this number of qubits
+    gate_cost = 50 #Cost of applying one gate on one amplitude, relative to one multiply-add of unitary product
+    stream_chunk = 4096 #Operations of streamed programs which are executed together
+
+    def __init__(self, state_type: str, calculator_type: str, **kwargs):
+        """
+        Constructor: extra parameters such as seed are passed to the calculator.
+        clifford_tolerance is the tolerance on the angles for routing Clifford programs to stabilizer engine (default: 1e-6).
+        precision is "single" (complex64) or "double" (complex128, default) for states and operators of the circuit.
+        verbose prints states and results to the console (default: True), errors are always printed.
+        result_cache is a DiskCache for final state vectors of simulate, and their measurements when seed is mentioned.
+        """
+        self.__verbose = kwargs.get('verbose', True)
+        self.__result_cache = kwargs.pop('result_cache', None)
+        self.__seed = kwargs.get('seed', None)
+        self.__calculator_type = calculator_type
+        self.__precision = precision_dtype(kwargs.get('precision', "double")).name
+        kwargs['precision'] = self.__precision
         self.__state_type = state_type
-        self.__calculator = Calculators.create(calculator_type)
-        self.__total_qubits = 2 #Default number qubits
-        
-        
+        self.__calculator = Calculators.create(calculator_type, **kwargs)
+        if isinstance(self.__calculator, StabilizerCalculator):
+            self.__stabilizer = self.__calculator
+        else:
+            self.__stabilizer = Calculators.create("Stabilizer", tolerance=kwargs.get('clifford_tolerance', 1e-6),
+                                                   seed=kwargs.get('seed', None))
+        self.__local = threading.local() #Number of qubits set by each thread
+        self.__default_qubits = 2 #Default number qubits, last set by any thread
+        self.__total_qubits = 2
+        self.__pre_hooks = [] #Callbacks called before each operation
+        self.__post_hooks = [] #Callbacks called after each operation
+
+
+    @property
+    def __total_qubits(self) -> int:
+        """Number of qubits set by current thread, otherwise last set by any thread e.g. for states initialized by main thread"""
+        return getattr(self.__local, "total_qubits", self.__default_qubits)
+
+
+    @__total_qubits.setter
+    def __total_qubits(self, num_qubits: int):
+        self.__local.total_qubits = num_qubits
+        self.__default_qubits = num_qubits
+
+
+    def add_hook(self, pre = None, post = None):
+        """
+        Adds callbacks called as callback(index, operation, state) before and/or after each operation.
+        Measurement is reported as operation { "gate": "measure", "shots": num_shots } with index None.
+        """
+        if pre is not None:
+            self.__pre_hooks.append(pre)
+        if post is not None:
+            self.__post_hooks.append(post)
+
+
+    def clear_hooks(self):
+        """Removes all callbacks and the profiler of the calculator"""
+        self.__pre_hooks = []
+        self.__post_hooks = []
+        self.__calculator.set_profiler(None)
+        self.__stabilizer.set_profiler(None)
+
 
-    def initialize(self, num_qubits: int):
+    def instrument(self, collector):
+        """Attaches collector such as Instrumentation.Collector as callbacks and as profiler of the calculator, returns collector"""
+        self.add_hook(collector.pre_operation, collector.post_operation)
+        self.__calculator.set_profiler(collector)
+        self.__stabilizer.set_profiler(collector)
+        return collector
+
+
+    def initialize(self, num_qubits: int, **kwargs):
        try:
             self.__total_qubits = num_qubits
-            state = States.create(self.__state_type)
+            kwargs.setdefault('precision', self.__precision)
+            state = States.create(self.__state_type, **kwargs) #Extra parameters such as path are passed to the state
 
             state.set_to_ground_state(num_qubits)
                    
-            print("initial state: %s" %state.get_vector())
+            if self.__verbose:
+                print("initial state: %s" %state.get_vector())
                    
             return state
 
@@ -58,17 +140,76 @@ class Circuit(CircuitBase):
             print(e)
 
 
-    def run(self, initial_state: StateBase, program):
+    def run(self, initial_state: StateBase, program, checkpoint = None):
+        """
+        Returns the state after executing program on the initial state. Program is a list of operations, any iterable
+        of operations such as generator or Streaming.JsonLinesProgram, an instruction tape or a unitary.
+        Operations of other iterables than lists are executed in chunks of stream_chunk operations, so that they are not held in memory.
+
+        With Streaming.Checkpoint, state vector and number of executed operations are saved periodically. Existing checkpoint
+        is restored to the state and its operations are skipped, hence interrupted run resumes by running it again.
+        With every_seconds, checkpoint is checked after each operation, so it is not delayed by the rest of the chunk.
+        Checkpoint is removed when the run completes.
+        """
         try:
             if initial_state is None:
                 raise TypeError("Error: initial_state is of NoneType.")
             if program is None:
                 raise TypeError("Error: program is of NoneType.")
                     
-            #Iterated over each program line and updates the state
-            for operation in program:
-                self.__calculator.calculate_state(initial_state, self.__total_qubits, **operation)
+            calculator = self.__select_calculator(initial_state)
+
+            if isinstance(program, CircuitUnitary):
+                if program.total_qubits != self.__total_qubits:
+                    raise TypeError("Error: unitary is built for %s qubits." %program.total_qubits)
+                initial_state.update_vector(program.apply(initial_state.get_vector())) #Hooks are not called for unitary
+                return initial_state
+
+            if isinstance(program, InstructionTape):
+                if program.total_qubits != self.__total_qubits:
+                    raise TypeError("Error: tape is compiled for %s qubits." %program.total_qubits)
+                if not self.__pre_hooks and not self.__post_hooks and checkpoint is None:
+                    return calculator.calculate_tape(initial_state, program)
+                program = program.operations
+
+            offset = 0 #Number of executed operations
+            if checkpoint is not None:
+                offset = checkpoint.restore(initial_state, self.__total_qubits)
+
+            if isinstance(program, JsonLinesProgram):
+                operations = program.operations(offset) #Skipped lines are not parsed
+            elif isinstance(program, (list, tuple)):
+                operations = program[offset:]
+            else:
+                operations = itertools.islice(program, offset, None)
+
+            if checkpoint is None and isinstance(operations, (list, tuple)):
+                self.__calculate(calculator, initial_state, operations, offset)
+                return initial_state
+
+            operations = iter(operations)
+            since_checkpoint = 0
+            while True:
+                chunk_size = self.stream_chunk
+                if checkpoint is not None and checkpoint.every_operations is not None:
+                    chunk_size = min(chunk_size, checkpoint.every_operations - since_checkpoint)
+                chunk = list(itertools.islice(operations, chunk_size))
+                if not chunk:
+                    break
 
+                parts = [chunk]
+                if checkpoint is not None and checkpoint.every_seconds is not None:
+                    parts = [chunk[index:index + 1] for index in range(len(chunk))] #Time is checked after each operation
+                for part in parts:
+                    self.__calculate(calculator, initial_state, part, offset)
+                    offset += len(part)
+                    since_checkpoint += len(part)
+                    if checkpoint is not None and checkpoint.is_due(since_checkpoint):
+                        checkpoint.save(initial_state, self.__total_qubits, offset)
+                        since_checkpoint = 0
+
+            if checkpoint is not None:
+                checkpoint.clear()
             return initial_state
 
         except KeyError as e:
@@ -77,17 +218,266 @@ class Circuit(CircuitBase):
             print(e)
 
 
-    def measure(self, final_state: StateBase, num_shots : int):
+    def __calculate(self, calculator: CalculatorBase, state: StateBase, program, offset: int):
+        """Executes list of operations on the state, hooks are called with index of each operation in the whole program"""
+        if not self.__pre_hooks and not self.__post_hooks:
+            calculator.calculate_program(state, self.__total_qubits, program)
+            return
+
+        #Iterated over each program line and updates the state
+        for index, operation in enumerate(program, offset):
+            for hook in self.__pre_hooks:
+                hook(index, operation, state)
+            calculator.calculate_state(state, self.__total_qubits, **operation)
+            for hook in self.__post_hooks:
+                hook(index, operation, state)
+
+
+    def run_many(self, initial_states, program, mode: str = "auto"):
+        """
+        Returns final states after executing the program on each of the initial states.
+
+        mode: "unitary" applies cached unitary of the whole program on all state vectors stacked as a matrix in one product,
+              "gates" executes the program gate by gate on each state, "auto" decides by the number of qubits and states.
+        """
+        try:
+            if initial_states is None:
+                raise TypeError("Error: initial_states is of NoneType.")
+            if program is None:
+                raise TypeError("Error: program is of NoneType.")
+
+            initial_states = list(initial_states)
+            program = list(program)
+            if mode == "auto":
+                mode = "unitary" if self.__prefer_unitary(initial_states, program) else "gates"
+
+            if mode == "gates":
+                return [self.run(initial_state, program) for initial_state in initial_states]
+            if mode != "unitary":
+                raise KeyError("Error: mode %s not found." %mode)
+
+            unitary = self.unitary(program)
+            vectors = unitary.apply(np.array([initial_state.get_vector() for initial_state in initial_states]))
+            for initial_state, vector in zip(initial_states, vectors):
+                initial_state.update_vector(vector)
+            return initial_states
+
+        except KeyError as e:
+            print(e)
+        except TypeError as e:
+            print(e)
+
+
+    def unitary(self, program):
+        """Returns unitary of the program for current number of qubits, which is cached by content hash and can be passed to run."""
+        try:
+            if program is None:
+                raise TypeError("Error: program is of NoneType.")
+
+            key = CircuitUnitary.content_hash(program, self.__total_qubits, self.__precision)
+            unitary = self._unitaries.get(key)
+            if unitary is None:
+                unitary = CircuitUnitary(program, self.__total_qubits, self.__precision)
+                self._unitaries.put(key, unitary)
+            return unitary
+
+        except KeyError as e:
+            print(e)
+        except TypeError as e:
+            print(e)
+
+
+    @classmethod
+    def configure_unitary_cache(cls, max_bytes: int):
+        """Replaces the unitary cache with an empty cache of mentioned memory budget in bytes"""
+        cls._unitaries = LRUCache(max_bytes)
+
+
+    @classmethod
+    def unitary_cache_info(cls) -> dict:
+        """Returns hits, misses, evictions and memory usage of the unitary cache"""
+        return cls._unitaries.info()
+
+
+    def simulate(self, num_qubits: int, program, num_shots: int = None, output: str = "dict", **kwargs):
+        """
+        Returns final state and measurements after executing program on the ground state with mentioned number of qubits.
+        Measurements are None if num_shots is not mentioned.
+
+        Programs whose operations are all Clifford operations, e.g. U3 and CU gates with angles of multiples of pi/2
+        within clifford_tolerance, are routed to the stabilizer engine automatically, which runs in polynomial time
+        and memory. Other programs are executed with the state and calculator of the circuit.
+        Routed programs return a "Stabilizer" state, hence extra state parameters such as path are not used, and its
+        get_vector returns the stabilizer generators as Pauli strings, to_vector gives amplitudes for small number of qubits.
+
+        With result_cache, state vectors are looked up by content hash of program, number of qubits, state type, calculator type
+        and precision: cached state vector is returned memory-mapped in a "Cached" state without running the program or hooks.
+        Measurements are cached as well when seed is mentioned, so that they are same as the measurements of the first run.
+        """
+        try:
+            if program is None:
+                raise TypeError("Error: program is of NoneType.")
+
+            program = list(program)
+            state_type = self.__state_type
+            if self.__stabilizer.is_clifford(program):
+                state_type = "Stabilizer"
+                kwargs = {} #Parameters of other state types do not apply to stabilizer state
+            kwargs.setdefault('precision', self.__precision)
+
+            self.__total_qubits = num_qubits
+            key = None
+            final_state = None
+            if self.__result_cache is not None and state_type != "Stabilizer":
+                key = DiskCache.content_hash(program, num_qubits, state_type, self.__calculator_type,
+                                             precision_dtype(kwargs['precision']).name)
+                final_state = self.__load_state(key, num_qubits, kwargs['precision'])
+
+            if final_state is None:
+                state = States.create(state_type, **kwargs) #Extra parameters such as path are passed to the state
+                state.set_to_ground_state(num_qubits)
+                final_state = self.run(state, program)
+                if key is not None and final_state is not None and isinstance(final_state.get_vector(), np.ndarray):
+                    self.__result_cache.put(key, final_state.get_vector())
+
+            measurements = None
+            if num_shots is not None and final_state is not None:
+                measurements_key = None
+                if key is not None and self.__seed is not None:
+                    measurements_key = DiskCache.content_hash(key, num_shots, output, self.__seed)
+                    measurements = self.__result_cache.get(measurements_key)
+                if measurements is None:
+                    measurements = self.measure(final_state, num_shots, output)
+                    if measurements_key is not None and isinstance(measurements, (dict, np.ndarray)):
+                        self.__result_cache.put(measurements_key, measurements)
+
+            return final_state, measurements
+
+        except KeyError as e:
+            print(e)
+        except TypeError as e:
+            print(e)
+
+
+    def __load_state(self, key: str, num_qubits: int, precision):
+        """Returns "Cached" state with the memory-mapped state vector of the key, or None if it is not in the result cache"""
+        vector = self.__result_cache.get(key)
+        if not isinstance(vector, np.ndarray) or vector.size != 2**num_qubits:
+            return None
+        state = States.create("Cached", precision=precision)
+        state.update_vector(vector)
+        return state
+
+
+    def sweep(self, num_qubits: int, program, bindings, num_shots: int = None, output: str = "dict"):
+        """
+        Returns final state vectors of shape (batch, 2^n) and measurements of each binding, after executing program
+        for all parameter bindings together. Measurements are None if num_shots is not mentioned.
+
+        Parameters of the program are referred by name, for example:
+
+        my_rx_circuit = [
+        { "gate": "U3", "params": { "theta": "angle", "phi": -1.5708, "lambda": 1.5708 }, "target": 0 } #rx gate
+        ]
+
+        bindings can be list of dictionaries, e.g. [{ "angle": 0.1 }, { "angle": 0.2 }] or
+        dictionary of arrays, e.g. { "angle": np.linspace(0, 3.1415, 100) }.
+        Calculators without batches of state vectors, such as Stabilizer and MPS, are not supported.
+        """
+        try:
+            if program is None:
+                raise TypeError("Error: program is of NoneType.")
+            if bindings is None:
+                raise TypeError("Error: bindings is of NoneType.")
+            if len(bindings) == 0:
+                raise KeyError("Error: bindings not found.")
+            if not hasattr(self.__calculator, "calculate_batch"):
+                raise TypeError("Error: sweep is not supported by %s." %type(self.__calculator).__name__)
+
+            if isinstance(bindings, dict):
+                bindings = { name: np.asarray(values) for name, values in bindings.items() }
+            else:
+                bindings = { name: np.array([binding[name] for binding in bindings]) for name in bindings[0] }
+            batch = len(next(iter(bindings.values())))
+
+            self.__total_qubits = num_qubits
+            vectors = np.zeros((batch, 2**num_qubits), dtype=self.__precision)
+            vectors[:, 0] = 1 #Ground state
+
+            #Iterated over each program line and updates all state vectors together
+            for operation in program:
+                params = {}
+                for key, value in operation["params"].items():
+                    if isinstance(value, str):
+                        if value not in bindings:
+                            raise KeyError("Error: %s not found in bindings." %value)
+                        value = bindings[value]
+                    params[key] = value
+                vectors = self.__calculator.calculate_batch(vectors, num_qubits, **dict(operation, params=params))
+
+            measurements = None
+            if num_shots is not None:
+                measurements = self.__calculator.measure_batch(vectors, num_shots, num_qubits, output)
+
+            return vectors, measurements
+
+        except KeyError as e:
+            print(e)
+        except TypeError as e:
+            print(e)
+
+
+    def compile(self, program, tolerance: float = 1e-8):
+        """Returns program with fused operations, which gives the same final state as the original program within tolerance."""
+        try:
+            if program is None:
+                raise TypeError("Error: program is of NoneType.")
+
+            fusion = GateFusion(tolerance)
+            fused_program = fusion.compile(program)
+
+            if self.__verbose:
+                print("removed operations: %s" %fusion.removed_operations)
+
+            return fused_program
+
+        except KeyError as e:
+            print(e)
+        except TypeError as e:
+            print(e)
+
+
+    def compile_tape(self, program):
+        """Returns instruction tape of the program for current number of qubits, which can be passed to run many times."""
+        try:
+            if program is None:
+                raise TypeError("Error: program is of NoneType.")
+
+            return InstructionTape(program, self.__total_qubits, self.__precision)
+
+        except KeyError as e:
+            print(e)
+        except TypeError as e:
+            print(e)
+
+
+    def measure(self, final_state: StateBase, num_shots : int, output: str = "dict"):
         try:
             if final_state is None:
                 raise TypeError("Error: final_state is of NoneType.")
             if num_shots is None:
                 raise TypeError("Error: num_shots is of NoneType.")
 
-            measurements = self.__calculator.measure_state(final_state, num_shots, self.__total_qubits)
+            operation = { "gate": "measure", "shots": num_shots }
+            for hook in self.__pre_hooks:
+                hook(None, operation, final_state)
+            measurements = self.__select_calculator(final_state).measure_state(final_state, num_shots, self.__total_qubits, output)
+            for hook in self.__post_hooks:
+                hook(None, operation, final_state)
             
-            print("final state: %s" %final_state.get_vector())
-            print("results: %s" %measurements)
+            if self.__verbose:
+                print("final state: %s" %final_state.get_vector())
+                print("results: %s" %measurements)
                     
             return measurements
 
@@ -95,3 +485,89 @@ class Circuit(CircuitBase):
             print(e)
         except TypeError as e:
             print(e)
+
+
+    def expectation(self, final_state: StateBase, observable, qubits = None):
+        """
+        Returns exact expectation value of Pauli observable without sampling, e.g. "XZI" (one Pauli per qubit)
+        or weighted sum of Pauli strings { "XX": 0.5, "ZZ": 0.5 }, letters refer to mentioned qubits (default: all qubits).
+        """
+        try:
+            if final_state is None:
+                raise TypeError("Error: final_state is of NoneType.")
+            if observable is None:
+                raise TypeError("Error: observable is of NoneType.")
+
+            return self.__select_calculator(final_state).expectation_value(final_state, observable, self.__total_qubits, qubits)
+
+        except KeyError as e:
+            print(e)
+        except TypeError as e:
+            print(e)
+
+
+    def marginal(self, final_state: StateBase, qubits):
+        """Returns exact probabilities of outcomes of mentioned qubits (big endian encoding in the mentioned order) without sampling."""
+        try:
+            if final_state is None:
+                raise TypeError("Error: final_state is of NoneType.")
+            if qubits is None:
+                raise TypeError("Error: qubits is of NoneType.")
+
+            return self.__select_calculator(final_state).marginal_probabilities(final_state, qubits, self.__total_qubits)
+
+        except KeyError as e:
+            print(e)
+        except TypeError as e:
+            print(e)
+
+
+    def measure_qubits(self, final_state: StateBase, qubits, num_shots: int, output: str = "dict"):
+        """Returns the result of multi-shot measurement of mentioned qubits only, sampled from their marginal probabilities."""
+        try:
+            if final_state is None:
+                raise TypeError("Error: final_state is of NoneType.")
+            if qubits is None:
+                raise TypeError("Error: qubits is of NoneType.")
+            if num_shots is None:
+                raise TypeError("Error: num_shots is of NoneType.")
+
+            measurements = self.__select_calculator(final_state).measure_qubits(final_state, qubits, num_shots,
+                                                                                self.__total_qubits, output)
+
+            if self.__verbose:
+                print("results: %s" %measurements)
+
+            return measurements
+
+        except KeyError as e:
+            print(e)
+        except TypeError as e:
+            print(e)
+
+
+    def __prefer_unitary(self, initial_states, program) -> bool:
+        """
+        Decides whether applying unitary costs less than gate by gate execution for the states. For b states of n qubits
+        and g gates, gates cost gate_cost.g.2^n.b and unitary costs 4^n.b, plus building it (gates on 2^n states) if not cached.
+        """
+        n = self.__total_qubits
+        if n > self.max_unitary_qubits or not initial_states:
+            return False
+        for initial_state in initial_states:
+            vector = initial_state.get_vector()
+            if not isinstance(vector, np.ndarray) or vector.shape != (2**n,): #Unitary is applied only on state vectors
+                return False
+
+        gates_cost = self.gate_cost * len(program) * 2**n * len(initial_states)
+        unitary_cost = 4**n * len(initial_states)
+        if CircuitUnitary.content_hash(program, n, self.__precision) not in self._unitaries:
+            unitary_cost += self.gate_cost * len(program) * 4**n
+        return unitary_cost < gates_cost
+
+
+    def __select_calculator(self, state: StateBase):
+        """Returns calculator of the state, stabilizer states are calculated by stabilizer engine"""
+        if isinstance(state, StabilizerState):
+            return self.__stabilizer
+        return self.__calculator
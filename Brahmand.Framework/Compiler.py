@@ -0,0 +1,295 @@
+"""
+This module contains compilation passes which transform a circuit program before it is executed.
+Compiled programs are plain programs, hence they can be executed by any calculator.
+
+For example: fusing the operations of swap circuit into single operation.
+
+from Factory import *
+from Entities import *
+from Compiler import GateFusion
+
+fusion = GateFusion()
+fused_program = fusion.compile(my_swap_circuit)
+print("removed operations: %s" %fusion.removed_operations)
+
+Program can also be compiled to an instruction tape, which is validated once and reused for many runs.
+
+tape = InstructionTape(fused_program, 8)
+final_state = simulator.run(simulator.initialize(8), tape)
+
+For small number of qubits, unitary of the whole program can be built once and applied on many states in one product.
+
+unitary = CircuitUnitary(my_swap_circuit, 8)
+final_vectors = unitary.apply(initial_vectors)
+
+"""
+
+from Factory import *
+from Base import *
+from Cache import LRUCache
+import hashlib
+import numpy as np
+
+class FusedOperation(object):
+    """This class holds the matrix of fused operations acting on mentioned qubits (big endian encoding)."""
+
+    __slots__ = ["qubits", "matrix", "operations"]
+
+    def __init__(self, qubits, matrix, operations):
+        """ Constructor """
+        self.qubits = qubits
+        self.matrix = matrix
+        self.operations = operations
+
+    def append(self, matrix, operations):
+        """Fuses operations which are executed after the fused operations"""
+        self.matrix = np.dot(self.matrix, matrix) #Row vector convention i.e. psi.A.B
+        self.operations.extend(operations)
+
+    def to_operation(self):
+        """Returns the original operation if nothing was fused, otherwise a Matrix operation"""
+        if len(self.operations) == 1:
+            return self.operations[0]
+        if len(self.qubits) == 1:
+            return { "gate": "Matrix", "params": { "matrix": self.matrix }, "target": self.qubits[0] }
+        return { "gate": "Matrix", "params": { "matrix": self.matrix }, "targets": list(self.qubits) }
+
+
+class GateFusion(object):
+    """
+    This class defines gate fusion compilation pass:
+    - consecutive single qubit operations on same target are merged into one 2x2 matrix,
+    - single qubit operations are folded into neighbouring two qubit operations on same qubits as one 4x4 matrix,
+    - consecutive two qubit operations on same qubits are merged into one 4x4 matrix,
+    - operations which cancel to identity (within tolerance) are dropped.
+    Operations acting on disjoint qubits commute, hence fusion looks past them.
+    """
+
+    __I = np.identity(2) #Identity matrix
+
+    def __init__(self, tolerance: float = 1e-8):
+        """ Constructor """
+        self.__tolerance = tolerance
+        self.removed_operations = 0
+
+    def compile(self, program):
+        """Returns fused program and updates the number of removed operations"""
+        self.__fused = [] #Fused operations in order of execution
+        self.__pending = {} #Single qubit operations which are not yet fused, by qubit
+        self.__open = {} #Two qubit operations which can still absorb later operations, by qubit
+
+        program = list(program)
+        for operation in program:
+            operator = Operators.create(operation["gate"], **operation["params"])
+            targets, controls = operator.qubits(**operation)
+            qubits = list(targets) + list(controls)
+
+            if len(qubits) == 1:
+                self.__add_single_qubit_operation(qubits[0], operator.block(), operation)
+            elif len(qubits) == 2:
+                self.__add_two_qubit_operation(operator, targets, controls, operation)
+            else:
+                for qubit in qubits:
+                    self.__flush(qubit)
+                    self.__open.pop(qubit, None)
+                self.__fused.append(FusedOperation(sorted(qubits), None, [operation]))
+
+        for qubit in list(self.__pending):
+            self.__flush(qubit)
+
+        fused_program = []
+        for fused_operation in self.__fused:
+            if fused_operation.matrix is not None and self.__is_identity(fused_operation.matrix):
+                continue
+            fused_program.append(fused_operation.to_operation())
+
+        self.removed_operations = len(program) - len(fused_program)
+        return fused_program
+
+    def __add_single_qubit_operation(self, qubit: int, matrix, operation):
+        """Merges single qubit operation with pending operation on the same qubit"""
+        if qubit in self.__pending:
+            self.__pending[qubit].append(matrix, [operation])
+        else:
+            self.__pending[qubit] = FusedOperation([qubit], matrix, [operation])
+
+    def __add_two_qubit_operation(self, operator: OperatorBase, targets, controls, operation):
+        """Folds pending single qubit operations into two qubit operation and merges it with open operation on the same qubits"""
+        pair = sorted(list(targets) + list(controls))
+        local = {qubit: i for i, qubit in enumerate(pair)}
+
+        #4x4 matrix of the operation on its own qubits, rows of the matrix are the operated basis states
+        matrix = np.array([OperatorBase._apply_operator(row, 2, operator.block(),
+                                                        [local[target] for target in targets],
+                                                        [local[control] for control in controls])
+                           for row in np.identity(4)])
+
+        #Preceding single qubit operations
+        operations = []
+        front = []
+        for qubit in pair:
+            pending = self.__pending.pop(qubit, None)
+            front.append(self.__I if pending is None else pending.matrix)
+            operations.extend([] if pending is None else pending.operations)
+        matrix = np.dot(np.kron(front[0], front[1]), matrix)
+        operations.append(operation)
+
+        index = self.__open.get(pair[0], None)
+        if index is not None and self.__open.get(pair[1], None) == index:
+            self.__fused[index].append(matrix, operations)
+            return
+
+        self.__fused.append(FusedOperation(pair, matrix, operations))
+        self.__open[pair[0]] = self.__open[pair[1]] = len(self.__fused) - 1
+
+    def __flush(self, qubit: int):
+        """Folds pending single qubit operation into open two qubit operation on the same qubit or emits it"""
+        pending = self.__pending.pop(qubit, None)
+        if pending is None:
+            return
+
+        index = self.__open.get(qubit, None)
+        if index is None:
+            self.__fused.append(pending)
+            return
+
+        fused_operation = self.__fused[index]
+        if fused_operation.qubits[0] == qubit:
+            matrix = np.kron(pending.matrix, self.__I)
+        else:
+            matrix = np.kron(self.__I, pending.matrix)
+        fused_operation.append(matrix, pending.operations)
+
+    def __is_identity(self, matrix):
+        """Checks whether matrix is identity within tolerance"""
+        return np.allclose(matrix, np.identity(matrix.shape[0]), rtol=0, atol=self.__tolerance)
+
+
+class InstructionTape(object):
+    """
+    This class defines a program compiled for mentioned number of qubits into contiguous arrays of opcodes,
+    qubit indices and precomputed operators, so that operation dictionaries are neither interpreted nor
+    validated again while the tape is executed. Missing or invalid qubits are reported at compile time.
+    Operators are stored with the complex dtype of the precision (default: "double").
+    """
+
+    SINGLE = 0 #Single target qubit without control qubits, operator is in matrices
+    CONTROLLED = 1 #Single target qubit with control qubits, operator is in matrices
+    GENERAL = 2 #Multiple target qubits, operator is in general_matrices
+
+    __slots__ = ["total_qubits", "dtype", "operations", "opcodes", "kinds", "targets", "control_offsets", "controls",
+                 "matrices", "general_matrices", "general_targets"]
+
+    def __init__(self, program, total_qubits: int, precision = "double"):
+        """ Constructor: compiles the program """
+        self.total_qubits = total_qubits
+        self.dtype = precision_dtype(precision)
+        self.operations = list(program)
+
+        opcodes = []
+        kinds = [] #Diagonal, permutation or general operator
+        targets = []
+        control_offsets = [0]
+        controls = []
+        matrices = []
+        self.general_matrices = {}
+        self.general_targets = {}
+
+        for index, operation in enumerate(self.operations):
+            if "gate" not in operation:
+                raise KeyError("Error: gate not found in operation %s." %index)
+            if "params" not in operation:
+                raise KeyError("Error: params not found in operation %s." %index)
+
+            operator = Operators.create(operation["gate"], **operation["params"])
+            operation_targets, operation_controls = operator.qubits(**operation)
+
+            qubits = list(operation_targets) + list(operation_controls)
+            for qubit in qubits:
+                if not 0 <= qubit < total_qubits:
+                    raise KeyError("Error: qubit %s of operation %s not found." %(qubit, index))
+            if len(set(qubits)) != len(qubits):
+                raise KeyError("Error: qubits of operation %s are not distinct." %index)
+
+            block = np.asarray(operator.block(), dtype=self.dtype)
+            if len(operation_targets) == 1:
+                opcodes.append(self.CONTROLLED if operation_controls else self.SINGLE)
+                kinds.append(OperatorBase._classify(block))
+                matrices.append(block)
+            else:
+                opcodes.append(self.GENERAL)
+                kinds.append(OperatorBase.GENERAL)
+                matrices.append(np.identity(2, dtype=self.dtype))
+                self.general_matrices[index] = block
+                self.general_targets[index] = list(operation_targets)
+
+            targets.append(operation_targets[0])
+            controls.extend(operation_controls)
+            control_offsets.append(len(controls))
+
+        self.opcodes = np.array(opcodes, dtype=np.int8)
+        self.kinds = np.array(kinds, dtype=np.int8)
+        self.targets = np.array(targets, dtype=np.int64)
+        self.control_offsets = np.array(control_offsets, dtype=np.int64)
+        self.controls = np.array(controls, dtype=np.int64)
+        self.matrices = np.array(matrices, dtype=self.dtype).reshape(-1, 2, 2)
+
+    def __len__(self):
+        """Number of instructions"""
+        return len(self.opcodes)
+
+    def execute(self, psi, scratch = None):
+        """Executes all instructions on the complex state vector psi in place and returns it, scratch buffer of the shape of psi is optional"""
+        total_qubits = self.total_qubits
+        opcodes = self.opcodes.tolist()
+        kinds = self.kinds.tolist()
+        targets = self.targets.tolist()
+        control_offsets = self.control_offsets.tolist()
+        controls = self.controls.tolist()
+
+        for index, opcode in enumerate(opcodes):
+            if opcode == self.GENERAL:
+                OperatorBase._apply_operator_in_place(psi, total_qubits, self.general_matrices[index],
+                                                      self.general_targets[index],
+                                                      controls[control_offsets[index]:control_offsets[index + 1]])
+            else:
+                OperatorBase._apply_operator_in_place(psi, total_qubits, self.matrices[index], [targets[index]],
+                                                      controls[control_offsets[index]:control_offsets[index + 1]],
+                                                      kinds[index], scratch)
+        return psi
+
+
+class CircuitUnitary(object):
+    """
+    This class defines the unitary of a whole program for mentioned number of qubits, which is built once
+    by executing the instruction tape of the program on all basis states, i.e. rows of the identity matrix.
+    Like np.dot(state, matrix), final state vector is psi.U and key is the content hash of the program.
+    Unitary has the complex dtype of the precision (default: "double").
+    """
+
+    __slots__ = ["total_qubits", "key", "matrix"]
+
+    def __init__(self, program, total_qubits: int, precision = "double"):
+        """ Constructor: builds the unitary """
+        program = list(program)
+        self.total_qubits = total_qubits
+        self.key = self.content_hash(program, total_qubits, precision)
+
+        tape = InstructionTape(program, total_qubits, precision)
+        self.matrix = tape.execute(np.identity(2**total_qubits, dtype=tape.dtype))
+        self.matrix.setflags(write=False)
+
+    @staticmethod
+    def content_hash(program, total_qubits: int, precision = "double") -> str:
+        """Returns SHA-256 hash of the operations of the program, number of qubits and precision"""
+        content = repr((total_qubits, precision_dtype(precision).name, LRUCache.hashable(list(program))))
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the unitary in bytes"""
+        return self.matrix.nbytes
+
+    def apply(self, vectors):
+        """Returns final state vector, or final state vectors of shape (batch, 2^n) for stacked state vectors, in one product"""
+        return np.dot(vectors, self.matrix)
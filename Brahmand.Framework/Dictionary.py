@@ -0,0 +1,226 @@
+"""
+This module contains dictionary state and calculation strategy for circuits which stay in few basis states,
+such as classical reversible circuits. Only the non-zero amplitudes are stored, keyed by basis index,
+hence each operation costs time proportional to the number of non-zero amplitudes instead of 2^n.
+The state switches to a dense state vector automatically when the fill ratio passes the threshold.
+
+For example: swap circuit on 48 qubits.
+
+from Factory import *
+from Entities import *
+from Dictionary import *
+from Circuit import Circuit
+
+simulator = Circuit("Dictionary", "Dictionary", fill_threshold=0.25)
+final_state = simulator.run(simulator.initialize(48), my_swap_circuit)
+
+"""
+
+from Base import *
+from Factory import *
+from Entities import TensorCalculator
+import numpy as np
+
+
+"""States"""
+
+
+@States.register("Dictionary")
+class DictionaryState(StateBase):
+    """
+    This class defines classical state with 'n' (up to 62) number of qubits, which stores the non-zero amplitudes
+    as sorted basis indices (big endian encoding) and their amplitudes, until it is switched to dense state vector.
+    """
+
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self.__num_qubits = 0
+        self.indices = np.zeros(0, dtype=np.int64) #Sorted basis indices of non-zero amplitudes
+        self.amplitudes = np.zeros(0, dtype=self._dtype)
+        self.dense = None #Dense state vector after switching
+
+    @property
+    def num_qubits(self) -> int:
+        """Number of qubits"""
+        return self.__num_qubits
+
+    @property
+    def fill_ratio(self) -> float:
+        """Ratio of non-zero amplitudes to 2^n"""
+        if self.dense is not None:
+            return 1.0
+        return self.indices.size / 2**self.__num_qubits
+
+    def set_to_ground_state(self, num_qubits: int):
+        self.__num_qubits = num_qubits
+        self.indices = np.zeros(1, dtype=np.int64)
+        self.amplitudes = np.ones(1, dtype=self._dtype)
+        self.dense = None
+
+    def get_vector(self):
+        """Returns dense state vector after switching, otherwise dictionary of non-zero amplitudes by basis index."""
+        if self.dense is not None:
+            return self.dense
+        return dict(zip(self.indices.tolist(), self.amplitudes.tolist()))
+
+    def update_vector(self, state):
+        """Updates the state with dense state vector or dictionary of amplitudes by basis index, dense state stays dense."""
+        if isinstance(state, dict):
+            indices = np.array(sorted(state), dtype=np.int64)
+            self.indices = indices
+            self.amplitudes = np.array([state[index] for index in indices.tolist()], dtype=self._dtype)
+            self.dense = None
+            return
+
+        self.__num_qubits = int(np.log2(len(state)))
+        if self.dense is not None:
+            self.dense = np.asarray(state, dtype=self._dtype)
+            return
+        self.indices = np.flatnonzero(state).astype(np.int64)
+        self.amplitudes = np.asarray(state, dtype=self._dtype)[self.indices]
+
+    def get_probability_vector(self):
+        probabilities = np.absolute(self.to_vector()) ** 2
+        probabilities = probabilities / probabilities.sum() #Normalizing so that values add upto 1.
+        return probabilities
+
+    def densify(self):
+        """Switches to dense state vector"""
+        if self.dense is None:
+            self.dense = self.to_vector()
+            self.indices = np.zeros(0, dtype=np.int64)
+            self.amplitudes = np.zeros(0, dtype=self._dtype)
+
+    def to_vector(self):
+        """Returns dense state vector, only for small number of qubits."""
+        if self.dense is not None:
+            return self.dense
+        psi = np.zeros(2**self.__num_qubits, dtype=self._dtype)
+        psi[self.indices] = self.amplitudes
+        return psi
+
+
+"""Calculation Strategies"""
+
+
+@Calculators.register("Dictionary")
+class DictionaryCalculator(TensorCalculator):
+    """
+    This class calculates dictionary state by operating only on its non-zero amplitudes: each amplitude is spread
+    to the basis states which differ in the target qubits, the amplitudes of same basis state are summed and
+    zeros are dropped. States are switched to dense state vector when their fill ratio passes the threshold,
+    dense states are calculated like Tensor calculator.
+
+    Parameters: fill_threshold i.e. fill ratio for switching to dense state vector (default: 0.125).
+    """
+
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self.__fill_threshold = kwargs.get('fill_threshold', 0.125)
+
+    def calculate_state(self, state: StateBase, total_qubits: int, **operation):
+        if not isinstance(state, DictionaryState) or state.dense is not None:
+            return super().calculate_state(state, total_qubits, **operation)
+
+        operator = self._get_operator(operation) #Get operator
+        targets, controls = operator.qubits(**operation)
+        block = np.asarray(operator.block())
+        if self._profiler is not None:
+            self._profiler.mark("operator", block.shape)
+
+        #Amplitudes whose control qubits are all |1> are operated, others are kept as they are
+        control_mask = 0
+        for control in controls:
+            control_mask |= 1 << (total_qubits - 1 - control)
+        operated = (state.indices & control_mask) == control_mask
+        indices = state.indices[operated]
+        amplitudes = state.amplitudes[operated]
+
+        #Local index of each amplitude on the target qubits and its basis index without target bits
+        target_bits = [1 << (total_qubits - 1 - target) for target in targets]
+        local = np.zeros(indices.size, dtype=np.int64)
+        for bit in target_bits:
+            local = (local << 1) | ((indices & bit) != 0)
+        base = indices & ~sum(target_bits)
+
+        #Like np.dot(state, matrix), amplitude of local index i is spread to local index j with block[i, j]
+        spread_indices = [state.indices[~operated]]
+        spread_amplitudes = [state.amplitudes[~operated]]
+        for j in range(block.shape[1]):
+            bits = sum(bit for k, bit in enumerate(target_bits) if (j >> (len(targets) - 1 - k)) & 1)
+            spread_indices.append(base | bits)
+            spread_amplitudes.append(amplitudes * block[local, j])
+
+        #Amplitudes of same basis state are summed, np.unique also sorts the indices
+        indices, inverse = np.unique(np.concatenate(spread_indices), return_inverse=True)
+        spread_amplitudes = np.concatenate(spread_amplitudes)
+        amplitudes = (np.bincount(inverse, weights=spread_amplitudes.real, minlength=indices.size) +
+                      1j * np.bincount(inverse, weights=spread_amplitudes.imag, minlength=indices.size))
+        non_zero = np.absolute(amplitudes) > OperatorBase._tolerance
+        state.indices = indices[non_zero]
+        state.amplitudes = amplitudes[non_zero].astype(state.dtype) #Sums are accumulated in double precision
+
+        if state.fill_ratio > self.__fill_threshold:
+            state.densify()
+        if self._profiler is not None:
+            self._profiler.mark("apply")
+        return state
+
+    def calculate_tape(self, state: StateBase, tape):
+        if not isinstance(state, DictionaryState) or state.dense is not None:
+            return super().calculate_tape(state, tape)
+        for operation in tape.operations:
+            self.calculate_state(state, tape.total_qubits, **operation)
+        return state
+
+    def measure_state(self, state: StateBase, num_shots: int, total_qubits: int, output: str = "dict"):
+        if not isinstance(state, DictionaryState) or state.dense is not None:
+            return super().measure_state(state, num_shots, total_qubits, output)
+
+        #Shots are drawn from the non-zero amplitudes only
+        positions = self._measuring_unit.sample_probabilities(np.absolute(state.amplitudes[np.newaxis]) ** 2, num_shots)[0]
+        outcomes = state.indices[positions]
+        if self._profiler is not None:
+            self._profiler.mark("sample")
+
+        measurements = self._format_measurements(outcomes, total_qubits, output)
+        if self._profiler is not None:
+            self._profiler.mark("format")
+        return measurements
+
+    def expectation_value(self, state: StateBase, observable, total_qubits: int, qubits = None) -> float:
+        """Returns exact expectation value of Pauli observable from the non-zero amplitudes"""
+        if not isinstance(state, DictionaryState) or state.dense is not None or isinstance(observable, dict):
+            return super().expectation_value(state, observable, total_qubits, qubits)
+
+        #Pauli operator maps basis state k to phase(k) |k ^ x_mask>
+        x_mask = 0
+        phases = np.ones(state.indices.size, dtype=complex)
+        for qubit, pauli in self._parse_pauli(observable, total_qubits, qubits).items():
+            bits = (state.indices >> (total_qubits - 1 - qubit)) & 1
+            if pauli in "XY":
+                x_mask |= 1 << (total_qubits - 1 - qubit)
+            if pauli == "Z":
+                phases *= 1 - 2 * bits
+            if pauli == "Y":
+                phases *= 1j * (1 - 2 * bits) #Y|0> = i|1> and Y|1> = -i|0>
+
+        #Overlap with the amplitudes of mapped basis states which are non-zero
+        mapped = state.indices ^ x_mask
+        positions = np.minimum(np.searchsorted(state.indices, mapped), state.indices.size - 1)
+        found = state.indices[positions] == mapped
+        return float(np.real(np.sum(np.conj(state.amplitudes[positions[found]]) * phases[found] * state.amplitudes[found])))
+
+    def marginal_probabilities(self, state: StateBase, qubits, total_qubits: int):
+        """Returns exact probabilities of outcomes of mentioned qubits from the non-zero amplitudes"""
+        if not isinstance(state, DictionaryState) or state.dense is not None:
+            return super().marginal_probabilities(state, qubits, total_qubits)
+
+        qubits = self._check_qubits(qubits, total_qubits)
+        outcomes = np.zeros(state.indices.size, dtype=np.int64)
+        for qubit in qubits:
+            outcomes = (outcomes << 1) | ((state.indices >> (total_qubits - 1 - qubit)) & 1)
+        marginal = np.bincount(outcomes, weights=np.absolute(state.amplitudes) ** 2, minlength=2**len(qubits))
+        return marginal / marginal.sum() #Normalizing so that values add upto 1.
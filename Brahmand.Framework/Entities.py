@@ -33,6 +33,19 @@ class U(OperatorBase):
         super().__init__(**kwargs)
         self.__operator = super()._get_operator()
 
+    def qubits(self, **kwargs):
+        """Returns target and control qubits"""
+
+        target_qubit = kwargs.get('target', None)
+        if target_qubit is None:
+            raise KeyError("Error: target not found.")
+
+        return [target_qubit], []
+
+    def block(self):
+        """Returns U3 operator"""
+        return self.__operator
+
     def matrix(self, total_qubits: int, **kwargs):
         """Returns operator matrix with big endian encoding"""
         
@@ -76,6 +89,23 @@ class CU(OperatorBase):
         super().__init__(**kwargs)
         self.__operator = super()._get_operator()
 
+    def qubits(self, **kwargs):
+        """Returns target and control qubits"""
+
+        control_qubit = kwargs.get('control', None) # control qubit
+        target_qubit = kwargs.get('target', None) # target qubit
+
+        if control_qubit is None:
+            raise KeyError("Error: control not found.")
+        if target_qubit is None:
+            raise KeyError("Error: target not found.")
+
+        return [target_qubit], [control_qubit]
+
+    def block(self):
+        """Returns U3 operator applied on target qubit when control qubit is |1>"""
+        return self.__operator
+
     def matrix(self, total_qubits: int, **kwargs):
         """Returns operator matrix with big endian encoding"""
 
@@ -118,6 +148,123 @@ class CU(OperatorBase):
         return matrix
 
 
+@Operators.register("MCU")
+class MCU(OperatorBase):
+    """
+    This class defines the most generic multi-controlled quantum gate, which applies U3 operator on target qubit
+    only when all control qubits are |1>. It accepts theta, phi and lambda parameters and list of control qubits.
+    Different operators such as Toffoli (CCX), CCZ, multi-controlled X, etc can be created using this class.
+
+    Operator is applied only on the amplitudes whose control bits are all set, hence the cost grows with
+    the number of affected amplitudes instead of adding projector Kronecker products.
+    """
+
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self.__operator = super()._get_operator()
+
+    def qubits(self, **kwargs):
+        """Returns target and control qubits"""
+
+        control_qubits = kwargs.get('controls', None) # control qubits
+        target_qubit = kwargs.get('target', None) # target qubit
+
+        if control_qubits is None:
+            raise KeyError("Error: controls not found.")
+        if target_qubit is None:
+            raise KeyError("Error: target not found.")
+
+        return [target_qubit], list(control_qubits)
+
+    def block(self):
+        """Returns U3 operator applied on target qubit when all control qubits are |1>"""
+        return self.__operator
+
+    def matrix(self, total_qubits: int, **kwargs):
+        """Returns operator matrix with big endian encoding"""
+
+        targets, controls = self.qubits(**kwargs)
+        target_bit = 1 << (total_qubits - 1 - targets[0])
+
+        #Index mask selects the rows whose control bits are all set and target bit is not set
+        control_mask = 0
+        for control in controls:
+            control_mask |= 1 << (total_qubits - 1 - control)
+        indices = np.arange(2**total_qubits)
+        lower = indices[((indices & control_mask) == control_mask) & ((indices & target_bit) == 0)]
+        upper = lower | target_bit
+
+        matrix = np.identity(2**total_qubits, dtype=self._dtype)
+        matrix[lower, lower] = self.__operator[0, 0]
+        matrix[lower, upper] = self.__operator[0, 1]
+        matrix[upper, lower] = self.__operator[1, 0]
+        matrix[upper, upper] = self.__operator[1, 1]
+        return matrix
+
+
+@Operators.register("CCU")
+class CCU(MCU):
+    """
+    This class defines the most generic two control qubits quantum gate (CCU).
+    Different operators such as CCX (Toffoli), CCZ, etc can be created using this class.
+    """
+
+    def qubits(self, **kwargs):
+        """Returns target and control qubits"""
+
+        targets, controls = super().qubits(**kwargs)
+        if len(controls) != 2:
+            raise KeyError("Error: two controls not found.")
+
+        return targets, controls
+
+
+@Operators.register("Matrix")
+class MatrixOperator(OperatorBase):
+    """
+    This class defines an operator from an explicit matrix acting on one or more target qubits.
+    It is mainly used for operations fused by the compiler, for example:
+    { "gate": "Matrix", "params": { "matrix": [[0, 1], [1, 0]] }, "target": 0 }
+    { "gate": "Matrix", "params": { "matrix": cx_matrix }, "targets": [0, 1] }
+    """
+
+    def __init__(self, **kwargs):
+        """ Constructor: stores the matrix instead of theta, phi and lambda parameters, in its own dtype unless precision is mentioned """
+        matrix = kwargs.get('matrix', None)
+        if matrix is None:
+            raise KeyError("Error: matrix not found.")
+        precision = kwargs.get('precision', None)
+        self.__operator = np.asarray(matrix) if precision is None else np.asarray(matrix, dtype=precision_dtype(precision))
+
+    def qubits(self, **kwargs):
+        """Returns target and control qubits"""
+
+        target_qubits = kwargs.get('targets', None)
+        if target_qubits is None and kwargs.get('target', None) is not None:
+            target_qubits = [kwargs['target']]
+        if target_qubits is None:
+            raise KeyError("Error: target not found.")
+
+        return list(target_qubits), []
+
+    def block(self):
+        """Returns matrix acting on target qubits"""
+        return self.__operator
+
+    def matrix(self, total_qubits: int, **kwargs):
+        """Returns operator matrix with big endian encoding"""
+
+        target_qubits = self.qubits(**kwargs)[0]
+        other_qubits = [i for i in range(total_qubits) if i not in target_qubits]
+
+        #Operator on target qubits followed by identity on other qubits, then axes are reordered to big endian encoding
+        matrix = np.kron(self.__operator, np.identity(2**len(other_qubits)))
+        order = np.argsort(target_qubits + other_qubits)
+        matrix = matrix.reshape((2,) * (2 * total_qubits)).transpose(list(order) + [total_qubits + i for i in order])
+        return matrix.reshape(2**total_qubits, 2**total_qubits)
+
+
 """States"""
 
 
@@ -125,31 +272,81 @@ class CU(OperatorBase):
 class ClassicalState(StateBase):
     """
     This class defines generic classical state with 'n' number of qubits.
+    Amplitudes are stored in the dtype of its precision, e.g. complex64 for "single" precision.
+
+    Each state owns two preallocated buffers: the current state vector, which calculators update in place,
+    and a spare state vector, which calculators write to and which is swapped with the current one by update_vector.
+    Other vectors are copied into the current buffer, hence operations do not allocate new state vectors.
     """
 
-    __groundState = np.array([1, 0])
-    __state = np.array([])
-    __qubits = {}
+    in_place = True
+
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self.__state = np.zeros(0, dtype=self._dtype) #Current state vector
+        self.__spare = np.zeros(0, dtype=self._dtype) #Spare state vector, allocated when it is first needed
 
     def set_to_ground_state(self, num_qubits: int):
-        self.__qubits.clear()
-        for i in range(num_qubits):
-            self.__qubits[i] = self.__groundState
-            if i == 0:
-                self.__state = self.__qubits[i]
-            else:
-                self.__state = np.kron(self.__state, self.__qubits[i])
+        if self.__state.size != 2**num_qubits:
+            self.__state = np.zeros(2**num_qubits, dtype=self._dtype)
+        self.__state[:] = 0
+        self.__state[0] = 1
 
     def get_vector(self):
+        """Returns the current state vector, which is updated in place by later operations, copy it for keeping."""
         return self.__state
 
     def update_vector(self, state):
-        self.__state = state
+        if state is self.__state:
+            return #Updated in place
+        if state is self.__spare:
+            self.__state, self.__spare = self.__spare, self.__state #Swapping the buffers
+            return
+        if self.__state.size != len(state):
+            self.__state = np.zeros(len(state), dtype=self._dtype)
+        np.copyto(self.__state, state) #Converted only if it is in other dtype
+
+    def get_spare_vector(self):
+        if self.__spare.size != self.__state.size:
+            self.__spare = np.zeros_like(self.__state)
+        return self.__spare
 
     def get_probability_vector(self):
-        #This can be improved or optimized.
-        probabilities = np.absolute(self.__state) 
-        probabilities /= probabilities.sum() #Normalizing so that values add upto 1.
+        probabilities = np.absolute(self.__state) ** 2
+        probabilities = probabilities / probabilities.sum() #Normalizing so that values add upto 1.
+        return probabilities
+
+
+@States.register("Cached")
+class CachedState(StateBase):
+    """
+    This class defines classical state which keeps the state vector as it is given, e.g. read-only state vector
+    memory-mapped from the result cache, hence amplitudes are loaded lazily when they are read.
+    Calculators do not update it in place, later operations replace the state vector.
+    """
+
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self.__state = np.zeros(0, dtype=self._dtype)
+
+    def set_to_ground_state(self, num_qubits: int):
+        self.__state = np.zeros(2**num_qubits, dtype=self._dtype)
+        self.__state[0] = 1
+
+    def get_vector(self):
+        return self.__state
+
+    def update_vector(self, state):
+        if isinstance(state, np.ndarray) and state.dtype == self._dtype:
+            self.__state = state #Kept without copying
+        else:
+            self.__state = np.asarray(state, dtype=self._dtype)
+
+    def get_probability_vector(self):
+        probabilities = np.absolute(self.__state) ** 2
+        probabilities = probabilities / probabilities.sum() #Normalizing so that values add upto 1.
         return probabilities
 
 
@@ -159,33 +356,95 @@ class ClassicalState(StateBase):
 @Calculators.register("Numpy")
 class NumpyCalculator(CalculatorBase):
 
-    def calculate_state(self, state: StateBase, total_qubits: int, **operation):
-        operator = self.__get_operator(operation) #Get operator
-        operator_matrix = operator.matrix(total_qubits, **operation) #Calculate operator matrix
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self._measuring_unit = Measurements.create("Simulated", seed=self._measurement_seed)
 
-        psi = np.dot(state.get_vector(), operator_matrix) #Operate on state
+    def calculate_state(self, state: StateBase, total_qubits: int, **operation):
+        operator_matrix = Operators.create_matrix(total_qubits, self._precision, **operation) #Get cached or calculate operator matrix
+        if self._profiler is not None:
+            self._profiler.mark("operator", operator_matrix.shape)
+
+        psi = state.get_vector()
+        spare = state.get_spare_vector() #Written instead of allocating new state vector
+        if spare is not None and spare.dtype == np.result_type(psi, operator_matrix):
+            psi = np.dot(psi, operator_matrix, out=spare) #Operate on state
+        else:
+            psi = np.dot(psi, operator_matrix) #Operate on state
         state.update_vector(psi) #Update state
+        if self._profiler is not None:
+            self._profiler.mark("apply")
 
         return state
 
-    def measure_state(self, state: StateBase, num_shots: int, total_qubits: int):
-        measuring_unit = Measurements.create("Simulated")
-        measurements = {}
-                    
-        #Taking 'num_shots' shots of measurement
-        for i in range(num_shots):
-            measurement = measuring_unit.measure_state(state, total_qubits)
-            if measurement not in measurements:
-                measurements[measurement] = 1
-            else:
-                measurements[measurement] += 1
+    def measure_state(self, state: StateBase, num_shots: int, total_qubits: int, output: str = "dict"):
+        #Taking 'num_shots' shots of measurement in a single draw
+        outcomes = self._measuring_unit.sample(state, total_qubits, num_shots)
+        if self._profiler is not None:
+            self._profiler.mark("sample")
 
+        measurements = self._format_measurements(outcomes, total_qubits, output)
+        if self._profiler is not None:
+            self._profiler.mark("format")
         return measurements
 
-    def __get_operator(self, operation):
-        operator = Operators.create(operation["gate"],  **operation["params"])
+    def calculate_batch(self, vectors, total_qubits: int, **operation):
+        """
+        Calculates a batch of state vectors of shape (batch, 2^n) together. Parameters of the operation
+        can be arrays of length batch, in that case each state vector is operated with its own operator.
+        """
+        operator = self._get_operator(operation) #Get operator with stacked matrices
+        return operator.apply(vectors, total_qubits, **operation)
+
+    def measure_batch(self, vectors, num_shots: int, total_qubits: int, output: str = "dict"):
+        """Measures each state vector of the batch for mentioned number of times and returns list of results."""
+        probabilities = np.absolute(vectors) ** 2
+        outcomes = self._measuring_unit.sample_probabilities(probabilities, num_shots)
+        if output == "outcomes":
+            return outcomes
+        return [self._format_measurements(row, total_qubits, output) for row in outcomes]
+
+    def _get_operator(self, operation):
+        operator = Operators.create(operation["gate"], precision=self._precision, **operation["params"])
         return operator
 
+
+@Calculators.register("Tensor")
+class TensorCalculator(NumpyCalculator):
+    """
+    This class applies operators directly on the state vector, without building 2^n x 2^n operator matrices.
+    State vector is treated as a tensor with one axis per qubit, hence each operation costs O(2^n) instead of O(4^n).
+    """
+
+    def calculate_state(self, state: StateBase, total_qubits: int, **operation):
+        operator = self._get_operator(operation) #Get operator
+        if self._profiler is not None:
+            self._profiler.mark("operator", operator.block().shape)
+
+        psi = state.get_vector()
+        if state.in_place:
+            #Spare vector of the state is the scratch buffer, hence no state vectors are allocated
+            targets, controls = operator.qubits(**operation)
+            OperatorBase._apply_operator_in_place(psi, total_qubits, operator.block(), targets, controls,
+                                                  scratch=state.get_spare_vector())
+        else:
+            psi = operator.apply(psi, total_qubits, **operation) #Operate on state
+        state.update_vector(psi) #Update state
+        if self._profiler is not None:
+            self._profiler.mark("apply")
+
+        return state
+
+    def calculate_tape(self, state: StateBase, tape):
+        if state.in_place:
+            state.update_vector(tape.execute(state.get_vector(), state.get_spare_vector()))
+            return state
+        vector = state.get_vector()
+        psi = np.array(vector, dtype=np.result_type(vector, np.complex64)) #Single copy for all instructions, in precision of the state
+        state.update_vector(tape.execute(psi))
+        return state
+
 """Measurement Strategies"""
 
 
@@ -193,14 +452,61 @@ class NumpyCalculator(CalculatorBase):
 class SimulatedMeasurements(MeasurementBase):
     """
     This class simulates quantum measurement.
+    Optional seed parameter makes the measurements reproducible.
     """
 
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self.__random = random.default_rng(kwargs.get('seed', None))
+
     def measure_state(self, final_state: StateBase, total_qubits: int):
         # Note: This logic can be improved by modelling the quantum measurement using operation-sum representation.
-        # Not sure how random.choice works, but it is suffice for now.
-        sampleSpace = []
-        for i in range(2**total_qubits):
-            sampleSpace.append("%s" % np.binary_repr(i, total_qubits))
-        measurement = random.choice(sampleSpace, p=final_state.get_probability_vector())
-        return measurement
+        measurement = self.sample(final_state, total_qubits, 1)[0]
+        return np.binary_repr(measurement, total_qubits)
+
+    def sample(self, final_state: StateBase, total_qubits: int, num_shots: int):
+        probabilities = final_state.get_probability_vector() #Computed once for all shots
+        return self.sample_probabilities(probabilities[np.newaxis], num_shots)[0]
+
+    def sample_probabilities(self, probabilities, num_shots: int):
+        """
+        Returns integer outcomes of shape (batch, num_shots) for probabilities of shape (batch, 2^n).
+        Shots of all rows are drawn together by inverse transform sampling on the cumulative probabilities,
+        which are accumulated in double precision also for single precision probabilities.
+        """
+        cumulative = np.cumsum(probabilities, axis=-1, dtype=np.float64)
+        cumulative /= cumulative[..., -1:] #Normalizing so that each row ends at 1
+
+        #Offsetting each row by its index makes the rows searchable as one sorted array
+        rows = np.arange(cumulative.shape[0])[:, np.newaxis]
+        draws = self.__random.random((cumulative.shape[0], num_shots)) + rows
+        outcomes = np.searchsorted((cumulative + rows).ravel(), draws.ravel(), side='right').reshape(draws.shape)
+        return np.minimum(outcomes - rows * cumulative.shape[1], cumulative.shape[1] - 1)
+
+    def sample_blocks(self, probability_blocks, num_shots: int):
+        """
+        Returns integer outcomes of shots for unnormalized probabilities given in consecutive blocks,
+        without holding all probabilities in memory. probability_blocks returns an iterator over the blocks
+        and it is called twice: first pass sums each block and second pass samples the shots falling in each block.
+        """
+        masses = np.array([block.sum(dtype=np.float64) for block in probability_blocks()])
+        cumulative_masses = np.cumsum(masses)
+
+        #Sorted draws are split between blocks by the cumulative mass
+        draws = np.sort(self.__random.random(num_shots)) * cumulative_masses[-1]
+        draw_blocks = np.minimum(np.searchsorted(cumulative_masses, draws, side='right'), masses.size - 1)
+        bounds = np.searchsorted(draw_blocks, np.arange(masses.size + 1))
+
+        outcomes = np.empty(num_shots, dtype=np.int64)
+        offset = 0
+        for index, block in enumerate(probability_blocks()):
+            first, last = bounds[index], bounds[index + 1]
+            if last > first:
+                cumulative = np.cumsum(block, dtype=np.float64)
+                local_draws = draws[first:last] - (cumulative_masses[index] - masses[index])
+                outcomes[first:last] = offset + np.minimum(np.searchsorted(cumulative, local_draws, side='right'), block.size - 1)
+            offset += block.size
+
+        return self.__random.permutation(outcomes) #Shots are independent of each other, hence not sorted
 
@@ -8,10 +8,12 @@ For reference: https://medium.com/@geoffreykoh/implementing-the-factory-pattern-
 
 from typing import Callable
 from Base import *
+from Cache import LRUCache
 
 class Operators(FactoryBase):
-    """Factory for operators"""
+    """Factory for operators. Operator matrices are cached, so repeated operations cost a lookup instead of a rebuild."""
     _products = {}
+    _cache = LRUCache(128 * 1024**2) #Default memory budget of 128 MiB
 
     @classmethod
     def register(cls, name: str) -> Callable:
@@ -27,6 +29,33 @@ class Operators(FactoryBase):
         """Class method for creating instance of operator based on name parameter"""
         return cls._inner_create(name, **kwargs)
 
+    @classmethod
+    def create_matrix(cls, total_qubits: int, precision = "double", **operation):
+        """
+        Class method for creating operator matrix of the operation such as
+        { "gate": "U3", "params": { "theta": 1.5708, "phi": 0, "lambda": -3.1415 }, "target": 0 }.
+        Matrix is cached with key (gate, params, qubits, total_qubits, precision) and returned matrix is read-only.
+        """
+        dtype = precision_dtype(precision)
+        key = (total_qubits, dtype.name, LRUCache.hashable(operation))
+        matrix = cls._cache.get(key)
+        if matrix is None:
+            matrix = cls.create(operation["gate"], precision=precision, **operation["params"]).matrix(total_qubits, **operation)
+            matrix = matrix.astype(dtype, copy=False) #Identities and projectors are not complex
+            matrix.setflags(write=False)
+            cls._cache.put(key, matrix)
+        return matrix
+
+    @classmethod
+    def configure_cache(cls, max_bytes: int):
+        """Class method for replacing the operator matrix cache with an empty cache of mentioned memory budget in bytes"""
+        cls._cache = LRUCache(max_bytes)
+
+    @classmethod
+    def cache_info(cls) -> dict:
+        """Class method for returning hits, misses, evictions and memory usage of the operator matrix cache"""
+        return cls._cache.info()
+
 
 class States(FactoryBase):
     """Factory for states. States could be classical or quantum, etc."""
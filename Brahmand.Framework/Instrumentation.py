@@ -0,0 +1,129 @@
+"""
+This module contains built-in collector for instrumentation of the circuit. Collector is attached to circuit
+as pre/post-operation callbacks and as profiler of the calculator, which marks phases of each operation
+such as building the operator and applying it on the state.
+
+For example: finding where the time of swap circuit goes.
+
+from Factory import *
+from Entities import *
+from Circuit import Circuit
+from Instrumentation import Collector
+
+simulator = Circuit("Classical", "Numpy")
+collector = simulator.instrument(Collector(trace_memory=True))
+
+final_state = simulator.run(simulator.initialize(8), my_swap_circuit)
+simulator.measure(final_state, 1000)
+
+print(collector.report())
+collector.save_trace("swap_circuit.trace.json") #Can be opened with chrome://tracing or Perfetto
+
+"""
+
+import json
+import time
+import tracemalloc
+
+
+class Collector(object):
+    """
+    This class collects timings of operations and of their phases, matrix sizes, bytes allocated and measurement time.
+    Bytes allocated are traced with tracemalloc only when trace_memory is set, as tracing slows down the execution.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        """ Constructor """
+        self.__trace_memory = trace_memory
+        self.__records = []
+        self.__origin = time.perf_counter()
+        self.__start = None
+        self.__last_mark = None
+        self.__phases = None
+        self.__matrix_shape = None
+        self.__memory_before = 0
+
+    def pre_operation(self, index: int, operation: dict, state):
+        """Callback which starts recording of the operation"""
+        if self.__trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self.__memory_before = tracemalloc.get_traced_memory()[0]
+
+        self.__phases = {}
+        self.__matrix_shape = None
+        self.__start = self.__last_mark = time.perf_counter()
+
+    def mark(self, phase: str, matrix_shape = None):
+        """Called by the calculator at the end of each phase of the operation such as "operator" or "apply" """
+        now = time.perf_counter()
+        if self.__last_mark is None:
+            return
+        self.__phases[phase] = self.__phases.get(phase, 0.0) + now - self.__last_mark
+        self.__last_mark = now
+        if matrix_shape is not None:
+            self.__matrix_shape = tuple(matrix_shape)
+
+    def post_operation(self, index: int, operation: dict, state):
+        """Callback which finishes recording of the operation"""
+        end = time.perf_counter()
+
+        bytes_allocated = None
+        if self.__trace_memory:
+            bytes_allocated = tracemalloc.get_traced_memory()[1] - self.__memory_before
+
+        self.__records.append({ "index": index, "gate": operation.get("gate", None),
+                                "start": self.__start - self.__origin, "time": end - self.__start,
+                                "phases": self.__phases, "matrix_shape": self.__matrix_shape,
+                                "bytes_allocated": bytes_allocated })
+        self.__start = self.__last_mark = None
+
+    def clear(self):
+        """Removes all records"""
+        self.__records = []
+        self.__origin = time.perf_counter()
+
+    @property
+    def records(self):
+        """Records of all operations in order of execution, measurements are recorded with gate "measure" """
+        return self.__records
+
+    def report(self) -> dict:
+        """Returns timings, phases, matrix sizes and bytes allocated aggregated per gate type"""
+        report = {}
+        for record in self.__records:
+            gate = report.setdefault(record["gate"], { "count": 0, "time": 0.0, "phases": {}, "matrix_shapes": [],
+                                                       "bytes_allocated": 0, "max_bytes_allocated": 0 })
+            gate["count"] += 1
+            gate["time"] += record["time"]
+            for phase, phase_time in record["phases"].items():
+                gate["phases"][phase] = gate["phases"].get(phase, 0.0) + phase_time
+            if record["matrix_shape"] is not None and list(record["matrix_shape"]) not in gate["matrix_shapes"]:
+                gate["matrix_shapes"].append(list(record["matrix_shape"]))
+            if record["bytes_allocated"] is not None:
+                gate["bytes_allocated"] += record["bytes_allocated"]
+                gate["max_bytes_allocated"] = max(gate["max_bytes_allocated"], record["bytes_allocated"])
+
+        for gate in report.values():
+            gate["mean_time"] = gate["time"] / gate["count"]
+        return report
+
+    def save_report(self, path: str):
+        """Saves the aggregated report and all records to a JSON file"""
+        with open(path, "w") as file:
+            json.dump({ "report": self.report(), "records": self.__records }, file, indent=1)
+
+    def save_trace(self, path: str):
+        """Saves the records in trace event format, phases are nested under their operation"""
+        events = []
+        for record in self.__records:
+            start = record["start"] * 1e6
+            events.append({ "name": record["gate"], "ph": "X", "ts": start, "dur": record["time"] * 1e6, "pid": 0, "tid": 0,
+                            "args": { "index": record["index"], "matrix_shape": record["matrix_shape"],
+                                      "bytes_allocated": record["bytes_allocated"] } })
+            for phase, phase_time in record["phases"].items():
+                events.append({ "name": phase, "ph": "X", "ts": start, "dur": phase_time * 1e6, "pid": 0, "tid": 0 })
+                start += phase_time * 1e6
+        with open(path, "w") as file:
+            json.dump({ "traceEvents": events }, file)
@@ -0,0 +1,265 @@
+"""
+This module contains matrix product state and calculation strategy for circuits with low entanglement.
+State is stored as one tensor per qubit connected by bonds, hence memory grows with the bond dimension
+instead of 2^n, for example shallow nearest-neighbour circuits on 50-100 qubits.
+
+For example: 100 qubits with maximum bond dimension of 32.
+
+from Factory import *
+from Entities import *
+from MPS import *
+from Circuit import Circuit
+
+simulator = Circuit("MPS", "MPS", max_bond_dimension=32, truncation_threshold=1e-10)
+final_state = simulator.run(simulator.initialize(100), my_circuit)
+print("discarded weight: %s" %final_state.discarded_weight)
+
+"""
+
+from Base import *
+from Factory import *
+import numpy as np
+
+
+"""States"""
+
+
+@States.register("MPS")
+class MPSState(StateBase):
+    """
+    This class defines matrix product state with 'n' number of qubits. Tensor of qubit q has shape (left bond, 2, right bond),
+    tensors are kept in mixed canonical form around the center tensor, which holds the norm of the state.
+    Discarded weight is the sum of the squared singular values dropped by truncations, relative to the norm.
+    """
+
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self.tensors = [] #Tensors by qubit (big endian encoding)
+        self.center = 0 #Orthogonality center
+        self.discarded_weight = 0.0
+
+    @property
+    def num_qubits(self) -> int:
+        """Number of qubits"""
+        return len(self.tensors)
+
+    @property
+    def bond_dimensions(self):
+        """Dimensions of the bonds between neighbouring qubits"""
+        return [tensor.shape[2] for tensor in self.tensors[:-1]]
+
+    def set_to_ground_state(self, num_qubits: int):
+        self.tensors = [np.array([1, 0], dtype=self._dtype).reshape(1, 2, 1) for i in range(num_qubits)]
+        self.center = 0
+        self.discarded_weight = 0.0
+
+    def get_vector(self):
+        """Returns tensors of all qubits, use to_vector for state vector."""
+        return self.tensors
+
+    def update_vector(self, state):
+        """Updates the tensors with decomposition of the state vector, without truncation."""
+        num_qubits = int(np.log2(len(state)))
+        tensors = []
+        remainder = np.asarray(state, dtype=self._dtype).reshape(1, -1)
+        for qubit in range(num_qubits - 1):
+            left = remainder.shape[0]
+            u, s, vh = np.linalg.svd(remainder.reshape(left * 2, -1), full_matrices=False)
+            tensors.append(u.reshape(left, 2, -1))
+            remainder = s[:, None] * vh
+        tensors.append(remainder.reshape(-1, 2, 1))
+
+        self.tensors = tensors
+        self.center = num_qubits - 1
+        self.discarded_weight = 0.0
+
+    def get_probability_vector(self):
+        probabilities = np.absolute(self.to_vector()) ** 2
+        probabilities = probabilities / probabilities.sum() #Normalizing so that values add upto 1.
+        return probabilities
+
+    def to_vector(self):
+        """Returns state vector with big endian encoding by contracting all tensors, only for small number of qubits."""
+        psi = np.ones((1, 1), dtype=self._dtype)
+        for tensor in self.tensors:
+            psi = np.dot(psi, tensor.reshape(tensor.shape[0], -1)).reshape(-1, tensor.shape[2])
+        return psi.reshape(-1)
+
+
+"""Calculation Strategies"""
+
+
+@Calculators.register("MPS")
+class MPSCalculator(CalculatorBase):
+    """
+    This class calculates matrix product state. Single qubit operations are contracted with the tensor of the qubit,
+    operations on more qubits are applied on the merged tensors of their qubits, which are brought next to each other
+    by swaps, and split again by SVD. Singular values are truncated to the maximum bond dimension and those whose
+    relative weight is below the truncation threshold are dropped, the dropped weight is added to discarded weight.
+
+    Parameters: max_bond_dimension (default: 64) and truncation_threshold (default: 1e-12).
+    """
+
+    __swap = np.identity(4)[[0, 2, 1, 3]] #Swap operator of neighbouring qubits
+
+    #Pauli operators applied as column vector
+    __paulis = { "X": np.array([[0, 1], [1, 0]]), "Y": np.array([[0, -1j], [1j, 0]]), "Z": np.array([[1, 0], [0, -1]]) }
+
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self.__max_bond_dimension = kwargs.get('max_bond_dimension', 64)
+        self.__truncation_threshold = kwargs.get('truncation_threshold', 1e-12)
+
+    def calculate_state(self, state: StateBase, total_qubits: int, **operation):
+        if not isinstance(state, MPSState):
+            raise TypeError("Error: state is not a matrix product state.")
+
+        operator = Operators.create(operation["gate"], precision=self._precision, **operation["params"]) #Get operator
+        targets, controls = operator.qubits(**operation)
+        block = np.asarray(operator.block())
+        if self._profiler is not None:
+            self._profiler.mark("operator", block.shape)
+
+        if not controls and len(targets) == 1:
+            #Single qubit operator is contracted with the physical index, canonical form is kept
+            state.tensors[targets[0]] = np.einsum("lir,ij->ljr", state.tensors[targets[0]], block)
+            if self._profiler is not None:
+                self._profiler.mark("apply")
+            return state
+
+        #Operator on its qubits in sorted order, rows are the operated basis states
+        qubits = sorted(list(targets) + list(controls))
+        local = {qubit: i for i, qubit in enumerate(qubits)}
+        matrix = OperatorBase._apply_operator(np.identity(2**len(qubits)), len(qubits), block,
+                                              [local[target] for target in targets],
+                                              [local[control] for control in controls])
+
+        #Qubits are brought next to the first qubit by swaps, which are reverted after the operation
+        swaps = []
+        for i, qubit in enumerate(qubits[1:], 1):
+            for position in range(qubit, qubits[0] + i, -1):
+                self.__apply_block(state, position - 1, self.__swap)
+                swaps.append(position - 1)
+
+        self.__apply_block(state, qubits[0], matrix)
+
+        for position in reversed(swaps):
+            self.__apply_block(state, position, self.__swap)
+
+        if self._profiler is not None:
+            self._profiler.mark("apply")
+        return state
+
+    def measure_state(self, state: StateBase, num_shots: int, total_qubits: int, output: str = "dict"):
+        if not isinstance(state, MPSState):
+            raise TypeError("Error: state is not a matrix product state.")
+
+        #With center on first qubit, outcome of each qubit is sampled from the probabilities conditioned on previous outcomes
+        self.__move_center(state, 0)
+        bits = np.zeros((num_shots, total_qubits), dtype=bool)
+        environment = np.ones((num_shots, 1), dtype=complex) #Contracted tensors of previous outcomes for each shot
+        shots = np.arange(num_shots)
+
+        for qubit, tensor in enumerate(state.tensors):
+            amplitudes = np.einsum("nl,lsr->nsr", environment, tensor)
+            probabilities = np.sum(np.absolute(amplitudes) ** 2, axis=2)
+            bits[:, qubit] = self._random.random(num_shots) * probabilities.sum(axis=1) >= probabilities[:, 0]
+            environment = amplitudes[shots, bits[:, qubit].astype(np.int64)]
+            environment /= np.linalg.norm(environment, axis=1, keepdims=True)
+
+        if self._profiler is not None:
+            self._profiler.mark("sample")
+        measurements = self._format_bits(bits, total_qubits, output)
+        if self._profiler is not None:
+            self._profiler.mark("format")
+        return measurements
+
+    def expectation_value(self, state: StateBase, observable, total_qubits: int, qubits = None) -> float:
+        """Returns exact expectation value of Pauli observable by contracting the state with operated state qubit by qubit"""
+        if isinstance(observable, dict):
+            return sum(coefficient * self.expectation_value(state, pauli, total_qubits, qubits)
+                       for pauli, coefficient in observable.items())
+
+        paulis = self._parse_pauli(observable, total_qubits, qubits)
+        environment = np.ones((1, 1), dtype=complex) #Contracted bra and ket bonds
+        for qubit, tensor in enumerate(state.tensors):
+            operated = tensor
+            if qubit in paulis:
+                operated = np.einsum("lcr,bc->lbr", tensor, self.__paulis[paulis[qubit]])
+            environment = np.einsum("ab,asc,bsd->cd", environment, tensor.conj(), operated)
+        return float(np.real(environment[0, 0]))
+
+    def marginal_probabilities(self, state: StateBase, qubits, total_qubits: int):
+        """Returns exact probabilities of outcomes of mentioned qubits by contracting the state with itself, other qubits are traced out"""
+        qubits = self._check_qubits(qubits, total_qubits)
+        environment = np.ones((1, 1, 1), dtype=complex) #Outcomes of mentioned qubits so far, bra and ket bonds
+        for qubit, tensor in enumerate(state.tensors):
+            if qubit in qubits:
+                environment = np.einsum("mab,asc,bsd->mscd", environment, tensor.conj(), tensor)
+                environment = environment.reshape(-1, tensor.shape[2], tensor.shape[2])
+            else:
+                environment = np.einsum("mab,asc,bsd->mcd", environment, tensor.conj(), tensor)
+
+        marginal = np.real(environment[:, 0, 0]).reshape((2,) * len(qubits))
+        marginal = np.transpose(marginal, np.argsort(np.argsort(qubits))).reshape(-1) #Axes in the mentioned order
+        return marginal / marginal.sum() #Normalizing so that values add upto 1.
+
+    def __apply_block(self, state: MPSState, start: int, matrix):
+        """Applies operator matrix on neighbouring qubits from start, merged tensors are split by truncated SVD"""
+        num_qubits = int(np.log2(matrix.shape[0]))
+        self.__move_center(state, start)
+
+        merged = state.tensors[start]
+        for tensor in state.tensors[start + 1:start + num_qubits]:
+            merged = np.tensordot(merged, tensor, axes=(-1, 0))
+        left, right = merged.shape[0], merged.shape[-1]
+        merged = np.einsum("lpr,pq->lqr", merged.reshape(left, -1, right), matrix.astype(merged.dtype, copy=False)) #Precision of the state is kept
+
+        #Left tensors are isometries from the SVD, hence center moves to the last qubit
+        for qubit in range(start, start + num_qubits - 1):
+            u, s, vh = np.linalg.svd(merged.reshape(left * 2, -1), full_matrices=False)
+            kept = self.__truncate(state, s)
+            state.tensors[qubit] = u[:, :kept].reshape(left, 2, kept)
+            merged = s[:kept, None] * vh[:kept]
+            left = kept
+        state.tensors[start + num_qubits - 1] = merged.reshape(left, 2, right)
+        state.center = start + num_qubits - 1
+
+    def __truncate(self, state: MPSState, singular_values) -> int:
+        """Returns number of kept singular values, which are rescaled to the original norm, and adds discarded weight"""
+        weights = singular_values ** 2
+        total = weights.sum()
+        if total == 0:
+            return 1
+
+        #Smallest number of values whose dropped tail is within threshold, limited by maximum bond dimension
+        tails = np.cumsum(weights[::-1])[::-1] / total #Relative weight from each value to the end
+        kept = max(1, int(np.count_nonzero(tails > self.__truncation_threshold)))
+        if self.__max_bond_dimension is not None:
+            kept = min(kept, self.__max_bond_dimension)
+
+        if kept < len(singular_values):
+            discarded = weights[kept:].sum() / total
+            state.discarded_weight += discarded
+            singular_values[:kept] /= np.sqrt(1 - discarded)
+        return kept
+
+    def __move_center(self, state: MPSState, qubit: int):
+        """Moves orthogonality center to the qubit by QR decompositions"""
+        while state.center < qubit:
+            tensor = state.tensors[state.center]
+            left, right = tensor.shape[0], tensor.shape[2]
+            q, r = np.linalg.qr(tensor.reshape(left * 2, right))
+            state.tensors[state.center] = q.reshape(left, 2, -1)
+            state.tensors[state.center + 1] = np.tensordot(r, state.tensors[state.center + 1], axes=(1, 0))
+            state.center += 1
+
+        while state.center > qubit:
+            tensor = state.tensors[state.center]
+            left, right = tensor.shape[0], tensor.shape[2]
+            q, r = np.linalg.qr(tensor.reshape(left, 2 * right).T)
+            state.tensors[state.center] = q.T.reshape(-1, 2, right)
+            state.tensors[state.center - 1] = np.tensordot(state.tensors[state.center - 1], r.T, axes=(2, 0))
+            state.center -= 1
@@ -0,0 +1,259 @@
+"""
+This module contains memory-mapped state and streaming calculation strategy for circuits beyond RAM.
+Amplitudes live in a memory-mapped file and operations are applied block by block over that file,
+so peak resident memory stays bounded by the block size instead of the size of the state vector.
+
+For example: 32 qubits state in a file on a large disk.
+
+from Factory import *
+from Entities import *
+from Mapped import *
+from Circuit import Circuit
+
+simulator = Circuit("Mapped", "Streaming", block_size=2**22)
+my_qpu = simulator.initialize(32, directory="/scratch")
+
+"""
+
+from Base import *
+from Factory import *
+from Entities import NumpyCalculator
+import mmap
+import os
+import tempfile
+import numpy as np
+
+
+"""States"""
+
+
+@States.register("Mapped")
+class MappedState(StateBase):
+    """
+    This class defines classical state whose state vector is stored in a memory-mapped file.
+    Parameters: path of the file or directory for a temporary file, which is removed when the state is closed.
+    """
+
+    in_place = True
+
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self.__path = kwargs.get('path', None)
+        self.__directory = kwargs.get('directory', None)
+        self.__temporary = self.__path is None
+        self.__mapping = None #Memory map of the file
+        self.__state = np.array([])
+
+    def __del__(self):
+        """ Destructor: releases the mapping and removes temporary file """
+        self.close()
+
+    @property
+    def path(self) -> str:
+        """Path of the memory-mapped file"""
+        return self.__path
+
+    def close(self):
+        """Releases the mapping and removes temporary file"""
+        if self.__mapping is not None:
+            self.__mapping.flush()
+            self.__state = np.array([])
+            try:
+                self.__mapping.close()
+            except BufferError: #State vector is still referred, the mapping is closed when it is released
+                pass
+            self.__mapping = None
+            if self.__temporary:
+                os.remove(self.__path)
+                self.__path = None
+
+    def set_to_ground_state(self, num_qubits: int):
+        self.__allocate(2**num_qubits) #New file is filled with zeros
+        self.__state[0] = 1
+
+    def get_vector(self):
+        return self.__state
+
+    def update_vector(self, state):
+        if state is self.__state:
+            return
+        if self.__mapping is None or self.__state.size != len(state):
+            self.__allocate(len(state))
+        self.__state[:] = state
+
+    def get_probability_vector(self):
+        """Returns probabilities of all amplitudes in memory, use probability_blocks for streaming."""
+        probabilities = np.absolute(self.__state) ** 2
+        probabilities = probabilities / probabilities.sum() #Normalizing so that values add upto 1.
+        return probabilities
+
+    def probability_blocks(self, block_size: int):
+        """Yields unnormalized probabilities of consecutive blocks of amplitudes"""
+        for start in range(0, self.__state.size, block_size):
+            stop = min(start + block_size, self.__state.size)
+            probabilities = np.absolute(self.__state[start:stop]) ** 2
+            self.release(start, stop)
+            yield probabilities
+
+    def release(self, start: int, stop: int):
+        """
+        Drops the pages of amplitudes start to stop from resident memory, the file keeps the data.
+        Pages are left to the operating system where madvise is not available, e.g. on Windows.
+        """
+        if not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        itemsize = self.__state.itemsize
+        begin = -(-start * itemsize // mmap.PAGESIZE) * mmap.PAGESIZE #Only whole pages are released
+        end = stop * itemsize // mmap.PAGESIZE * mmap.PAGESIZE
+        if end > begin:
+            self.__mapping.madvise(mmap.MADV_DONTNEED, begin, end - begin)
+
+    def __allocate(self, size: int):
+        """Creates the memory-mapped file for mentioned number of amplitudes"""
+        self.close()
+        if self.__temporary:
+            descriptor, self.__path = tempfile.mkstemp(suffix=".state", dir=self.__directory)
+            os.close(descriptor)
+        with open(self.__path, "w+b") as file:
+            file.truncate(size * self._dtype.itemsize) #Extended file is filled with zeros
+            self.__mapping = mmap.mmap(file.fileno(), size * self._dtype.itemsize)
+        self.__state = np.frombuffer(self.__mapping, dtype=self._dtype)
+
+
+"""Calculation Strategies"""
+
+
+@Calculators.register("Streaming")
+class StreamingCalculator(NumpyCalculator):
+    """
+    This class applies operations block by block over the state vector, so that only one block of amplitudes
+    is resident at a time for memory-mapped states. Measurements are sampled in two streaming passes.
+
+    Parameters: block_size i.e. number of amplitudes per block, power of two (default: 2^20).
+    Operations on more than one target qubit, e.g. fused operations, are streamed by groups of amplitudes
+    which they mix, as many groups per block as fit in it. Controlled operations read and write only the amplitudes
+    whose control qubits are all |1>.
+    """
+
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self.__block_size = kwargs.get('block_size', 2**20)
+        if self.__block_size < 2 or self.__block_size & (self.__block_size - 1):
+            raise KeyError("Error: block_size %s is not a power of two." %self.__block_size)
+
+    def calculate_state(self, state: StateBase, total_qubits: int, **operation):
+        operator = self._get_operator(operation) #Get operator
+        block = operator.block()
+        if self._profiler is not None:
+            self._profiler.mark("operator", block.shape)
+        targets, controls = operator.qubits(**operation)
+
+        if len(targets) != 1:
+            state = self.__calculate_general(state, total_qubits, block, targets, controls)
+            if self._profiler is not None:
+                self._profiler.mark("apply")
+            return state
+
+        mapped = isinstance(state, MappedState)
+        vector = state.get_vector()
+        psi = vector if mapped else np.array(vector, dtype=np.result_type(vector, np.complex64))
+
+        #State vector is viewed as rows of contiguous segments of the low-order qubits. A low-order target is applied
+        #within each segment, a high-order target pairs two segments, whose row bits of the target are 0 and 1.
+        target = targets[0]
+        segment_qubits = min(int(np.log2(self.__block_size)), total_qubits)
+        if target < total_qubits - segment_qubits:
+            segment_qubits = min(segment_qubits - 1, total_qubits - 1) #Two segments per block
+        num_rows = total_qubits - segment_qubits
+        rows = psi.reshape(2**num_rows, 2**segment_qubits)
+
+        #Rows whose control bits are not all |1> are skipped, other control bits are selected within segments
+        row_mask = 0
+        segment_controls = []
+        for control in controls:
+            if control < num_rows:
+                row_mask |= 1 << (num_rows - 1 - control)
+            else:
+                segment_controls.append(control - num_rows)
+
+        if target >= num_rows:
+            kind = OperatorBase._classify(block)
+            scratch = np.empty(2**segment_qubits, dtype=psi.dtype)
+            for row in range(2**num_rows):
+                if row & row_mask != row_mask:
+                    continue
+                OperatorBase._apply_operator_in_place(rows[row], segment_qubits, block, [target - num_rows],
+                                                      segment_controls, kind, scratch)
+                if mapped:
+                    state.release(row * rows.shape[1], (row + 1) * rows.shape[1])
+        else:
+            target_bit = 1 << (num_rows - 1 - target)
+            index = [slice(None)] * segment_qubits
+            for control in segment_controls:
+                index[control] = slice(1, 2) #Slices keep views also when every qubit of the segment is a control
+            index = tuple(index) + (Ellipsis,)
+            for row in range(2**num_rows):
+                if row & target_bit or row & row_mask != row_mask:
+                    continue
+                amplitudes_0 = rows[row].reshape((2,) * segment_qubits)[index]
+                amplitudes_1 = rows[row | target_bit].reshape((2,) * segment_qubits)[index]
+                updated_0 = amplitudes_0 * block[0, 0] + amplitudes_1 * block[1, 0]
+                amplitudes_1 *= block[1, 1]
+                amplitudes_1 += amplitudes_0 * block[0, 1]
+                amplitudes_0[...] = updated_0
+                if mapped:
+                    for paired_row in (row, row | target_bit):
+                        state.release(paired_row * rows.shape[1], (paired_row + 1) * rows.shape[1])
+
+        state.update_vector(psi) #Update state
+        if self._profiler is not None:
+            self._profiler.mark("apply")
+        return state
+
+    def __calculate_general(self, state: StateBase, total_qubits: int, block, targets, controls):
+        """
+        Applies operator on multiple target qubits block by block. Amplitudes of a group differ only in the target bits
+        (big endian encoding, first target is the most significant bit of the operator) and all control bits are |1>,
+        groups are gathered as rows, multiplied by the operator and written back.
+        """
+        mapped = isinstance(state, MappedState)
+        vector = state.get_vector()
+        psi = vector if mapped else np.array(vector, dtype=np.result_type(vector, np.complex64))
+
+        #Offsets of the amplitudes of a group from the first amplitude of the group
+        combinations = np.arange(2**len(targets), dtype=np.int64)
+        offsets = np.zeros(combinations.size, dtype=np.int64)
+        for i, target in enumerate(targets):
+            offsets |= ((combinations >> (len(targets) - 1 - i)) & 1) << (total_qubits - 1 - target)
+
+        fixed_bits = sorted([(total_qubits - 1 - target, 0) for target in targets] +
+                            [(total_qubits - 1 - control, 1) for control in controls])
+        num_groups = 2**(total_qubits - len(fixed_bits))
+        groups_per_block = max(self.__block_size // combinations.size, 1)
+
+        for start in range(0, num_groups, groups_per_block):
+            #First amplitude of each group is the group index with target and control bits inserted
+            first = np.arange(start, min(start + groups_per_block, num_groups), dtype=np.int64)
+            for position, bit in fixed_bits:
+                low_bits = first & ((1 << position) - 1)
+                first = ((first >> position) << (position + 1)) | (bit << position) | low_bits
+
+            indices = first[:, np.newaxis] | offsets
+            psi[indices] = np.dot(psi[indices], block)
+
+            if mapped:
+                for offset in offsets.tolist():
+                    state.release(int(first[0]) + offset, int(first[-1]) + offset + 1)
+
+        state.update_vector(psi) #Update state
+        return state
+
+    def measure_state(self, state: StateBase, num_shots: int, total_qubits: int, output: str = "dict"):
+        if not isinstance(state, MappedState):
+            return super().measure_state(state, num_shots, total_qubits, output)
+
+        #Taking 'num_shots' shots of measurement in two streaming passes over the state
+        outcomes = self._measuring_unit.sample_blocks(lambda: state.probability_blocks(self.__block_size), num_shots)
+        return self._format_measurements(outcomes, total_qubits, output)
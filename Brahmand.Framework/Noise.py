@@ -0,0 +1,248 @@
+"""
+This module contains noise model and Monte-Carlo trajectory simulation of noisy circuits. Error channels are attached
+to gates and each trajectory runs the program on a state vector, applying after each noisy operation one randomly
+chosen Kraus operator of each channel on each qubit of the operation. Averaged over trajectories, measurements follow
+the noisy distribution without density matrices, i.e. memory of one state vector per worker process.
+
+For example: depolarizing and amplitude damping errors after U3 and CU gates, and readout errors.
+
+from Factory import *
+from Entities import *
+from Noise import NoiseModel, TrajectorySimulator
+
+if __name__ == "__main__": #Required on platforms which spawn worker processes
+    noise_model = NoiseModel(depolarizing=0.01, amplitude_damping=0.005, readout_error=0.02)
+    simulator = TrajectorySimulator(noise_model, workers=8, seed=7)
+    measurements = simulator.run(10, my_circuit, 100000, tolerance=0.002) #Stops early when counts are stable
+    print(measurements, simulator.shots, simulator.converged)
+
+"""
+
+from Base import *
+from Factory import *
+from Entities import SimulatedMeasurements
+from Compiler import InstructionTape
+from collections import deque
+from multiprocessing import Pool
+import os
+import numpy as np
+
+class NoiseModel(object):
+    """
+    This class defines error channels of gates and readout error of measurements:
+    - Depolarizing: with probability p, X, Y or Z error (p/3 each) on each qubit of the operation,
+    - AmplitudeDamping: decay of |1> to |0> with probability gamma on each qubit of the operation,
+    - readout error: probability of reading 1 for |0> and 0 for |1>, same value or a pair (p01, p10).
+    Channels of a gate are applied after each of its operations, in the order they were added. Other gates are noiseless.
+    """
+
+    channels = ("Depolarizing", "AmplitudeDamping")
+
+    def __init__(self, depolarizing: float = 0.0, amplitude_damping: float = 0.0, readout_error = 0.0, gates = ("U3", "CU")):
+        """ Constructor: attaches nonzero depolarizing and amplitude damping channels to mentioned gates """
+        self.__gate_channels = {}
+        for gate in gates:
+            if depolarizing:
+                self.add_channel(gate, "Depolarizing", depolarizing)
+            if amplitude_damping:
+                self.add_channel(gate, "AmplitudeDamping", amplitude_damping)
+
+        readout_error = tuple(readout_error) if isinstance(readout_error, (list, tuple)) else (readout_error, readout_error)
+        for probability in readout_error:
+            self.__check_probability(probability, "readout error")
+        self.readout_error = readout_error
+
+    def add_channel(self, gate: str, channel: str, probability: float):
+        """Attaches error channel to operations of the gate"""
+        if channel not in self.channels:
+            raise KeyError("Error: channel %s not found." %channel)
+        self.__check_probability(probability, channel)
+        self.__gate_channels.setdefault(gate, []).append((channel, float(probability)))
+
+    def gate_channels(self, gate: str):
+        """Returns channels and their probabilities attached to the gate"""
+        return list(self.__gate_channels.get(gate, []))
+
+    def __check_probability(self, probability: float, name: str):
+        """Checks that probability is between 0 and 1"""
+        if not 0 <= probability <= 1:
+            raise KeyError("Error: probability %s of %s is not between 0 and 1." %(probability, name))
+
+
+class TrajectorySimulator(object):
+    """
+    This class simulates noisy programs by Monte-Carlo trajectories on a pool of worker processes. Trajectories are run
+    in batches of batch_size, each batch with its own random stream spawned from the seed, and counts of the batches are
+    aggregated in order as they arrive, hence results depend on the seed but not on the number of workers.
+    Each trajectory is measured shots_per_trajectory times, more shots per trajectory are cheaper but less independent.
+
+    Parameters: workers (default: number of cpus, 1 runs in this process), seed, precision (default: "double"),
+    batch_size (default: 64) and shots_per_trajectory (default: 1).
+    Trajectories, shots, standard error and convergence of the last run are kept in trajectories, shots,
+    standard_error and converged.
+    """
+
+    def __init__(self, noise_model: NoiseModel, **kwargs):
+        """ Constructor """
+        self.__noise_model = noise_model
+        self.__workers = kwargs.get('workers', None) or os.cpu_count()
+        self.__seed = kwargs.get('seed', None)
+        self.__dtype = precision_dtype(kwargs.get('precision', "double"))
+        self.__batch_size = kwargs.get('batch_size', 64)
+        self.__shots_per_trajectory = kwargs.get('shots_per_trajectory', 1)
+        self.__pool = None
+        self.trajectories = 0
+        self.shots = 0
+        self.standard_error = None
+        self.converged = False
+
+    def __del__(self):
+        """ Destructor: terminates worker processes """
+        self.close()
+
+    def close(self):
+        """Terminates worker processes"""
+        if self.__pool is not None:
+            self.__pool.terminate()
+            self.__pool = None
+
+    def run(self, num_qubits: int, program, num_shots: int, output: str = "dict", tolerance: float = None, min_shots: int = 1000):
+        """
+        Returns noisy measurements of num_shots shots of program on the ground state with mentioned number of qubits,
+        as dictionary of bitstrings or counts of all outcomes. With tolerance, run stops early after at least min_shots
+        shots once the standard error of every outcome probability, sqrt(p (1 - p) / shots), is within tolerance.
+        """
+        if output not in ("dict", "counts"):
+            raise KeyError("Error: output %s not found." %output)
+
+        tape = InstructionTape(program, num_qubits, self.__dtype)
+        noise = [self.__noise_model.gate_channels(operation["gate"]) for operation in tape.operations]
+
+        num_trajectories = -(-num_shots // self.__shots_per_trajectory)
+        sizes = [min(self.__batch_size, num_trajectories - start) for start in range(0, num_trajectories, self.__batch_size)]
+        seeds = np.random.SeedSequence(self.__seed).spawn(len(sizes)) #Random stream of each batch
+        tasks = [(tape, noise, self.__noise_model.readout_error, self.__dtype, seed, size, self.__shots_per_trajectory)
+                 for seed, size in zip(seeds, sizes)]
+
+        counts = np.zeros(2**num_qubits, dtype=np.int64)
+        self.trajectories = 0
+        self.converged = False
+        batches = self.__map(tasks)
+        for batch_counts, size in zip(batches, sizes):
+            counts += batch_counts
+            self.trajectories += size
+            self.shots = int(counts.sum())
+
+            probabilities = counts / self.shots
+            self.standard_error = float(np.sqrt((probabilities * (1 - probabilities)).max() / self.shots))
+            if tolerance is not None and self.shots >= min_shots and self.standard_error <= tolerance:
+                self.converged = True
+                break
+        batches.close() #Tasks in flight are cancelled after early stop
+
+        if output == "counts":
+            return counts
+        return {np.binary_repr(outcome, num_qubits): int(counts[outcome]) for outcome in np.flatnonzero(counts)}
+
+    def __map(self, tasks):
+        """
+        Yields counts of the tasks in order, keeping at most two tasks per worker in flight so that early stop saves the rest.
+        Tasks still in flight when the generator is closed are cancelled by terminating the worker processes.
+        """
+        if self.__workers < 2:
+            for task in tasks:
+                yield _run_trajectories(task)
+            return
+
+        if self.__pool is None:
+            self.__pool = Pool(self.__workers)
+        pending = deque()
+        tasks = iter(tasks)
+        for task in tasks:
+            pending.append(self.__pool.apply_async(_run_trajectories, (task,)))
+            if len(pending) >= 2 * self.__workers:
+                break
+        try:
+            while pending:
+                yield pending.popleft().get()
+                task = next(tasks, None)
+                if task is not None:
+                    pending.append(self.__pool.apply_async(_run_trajectories, (task,)))
+        finally:
+            if pending:
+                self.close() #Pool is created again by the next run
+
+
+"""Worker process"""
+
+
+_paulis = [(np.array([[0, 1], [1, 0]], dtype=complex), OperatorBase.PERMUTATION), #X
+           (np.array([[0, -1j], [1j, 0]]), OperatorBase.PERMUTATION), #Y
+           (np.array([[1, 0], [0, -1]], dtype=complex), OperatorBase.DIAGONAL)] #Z
+
+
+def _apply_channel(psi, total_qubits: int, qubit: int, channel: str, probability: float, random, scratch):
+    """Applies one Kraus operator of the channel on the qubit, chosen with its probability for the state vector psi"""
+    if channel == "Depolarizing":
+        if random.random() < probability:
+            operator, kind = _paulis[random.integers(3)]
+            OperatorBase._apply_operator_in_place(psi, total_qubits, operator, [qubit], (), kind, scratch)
+        return
+
+    #Amplitude damping: decay has probability gamma * P(qubit is |1>), state is renormalized after either Kraus operator
+    amplitudes = psi.reshape(2**qubit, 2, -1) #Big endian encoding, axis 1 is the qubit
+    excited = float(np.vdot(amplitudes[:, 1], amplitudes[:, 1]).real)
+    decay = probability * excited
+    if random.random() < decay:
+        amplitudes[:, 0] = amplitudes[:, 1]
+        amplitudes[:, 1] = 0
+        psi /= np.sqrt(excited)
+    elif probability:
+        amplitudes[:, 1] *= np.sqrt(1 - probability)
+        psi /= np.sqrt(1 - decay)
+
+
+def _run_trajectories(task):
+    """Runs trajectories with their own random stream and returns counts of all outcomes of their shots"""
+    tape, noise, readout_error, dtype, seed, num_trajectories, shots_per_trajectory = task
+    total_qubits = tape.total_qubits
+    channel_seed, measurement_seed = seed.spawn(2)
+    random = np.random.default_rng(channel_seed)
+    measuring_unit = SimulatedMeasurements(seed=measurement_seed)
+
+    psi = np.zeros(2**total_qubits, dtype=dtype)
+    scratch = np.empty_like(psi)
+    targets = tape.targets.tolist()
+    control_offsets = tape.control_offsets.tolist()
+    controls = tape.controls.tolist()
+    counts = np.zeros(psi.size, dtype=np.int64)
+
+    for trajectory in range(num_trajectories):
+        psi[:] = 0
+        psi[0] = 1
+        for index, opcode in enumerate(tape.opcodes.tolist()):
+            operation_controls = controls[control_offsets[index]:control_offsets[index + 1]]
+            if opcode == InstructionTape.GENERAL:
+                operation_targets = tape.general_targets[index]
+                OperatorBase._apply_operator_in_place(psi, total_qubits, tape.general_matrices[index], operation_targets,
+                                                      operation_controls)
+            else:
+                operation_targets = [targets[index]]
+                OperatorBase._apply_operator_in_place(psi, total_qubits, tape.matrices[index], operation_targets,
+                                                      operation_controls, int(tape.kinds[index]), scratch)
+
+            for channel, probability in noise[index]:
+                for qubit in operation_targets + operation_controls:
+                    _apply_channel(psi, total_qubits, qubit, channel, probability, random, scratch)
+
+        probabilities = np.absolute(psi) ** 2
+        outcomes = measuring_unit.sample_probabilities(probabilities[np.newaxis], shots_per_trajectory)[0]
+
+        #Readout error flips each measured bit, with probability depending on the bit
+        bits = (outcomes[:, np.newaxis] >> np.arange(total_qubits - 1, -1, -1)) & 1
+        flips = random.random(bits.shape) < np.where(bits == 1, readout_error[1], readout_error[0])
+        outcomes = outcomes ^ (flips.astype(np.int64) @ (1 << np.arange(total_qubits - 1, -1, -1, dtype=np.int64)))
+
+        counts += np.bincount(outcomes, minlength=psi.size)
+
+    return counts
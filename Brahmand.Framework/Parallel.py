@@ -0,0 +1,207 @@
+"""
+This module contains shared memory state and multi-process calculation strategy for large number of qubits.
+State vector lives in shared memory and each operation is split across a pool of worker processes
+by ranges of amplitude pairs, hence operations on high-order qubits are paired correctly across ranges.
+
+For example: using 8 worker processes.
+
+from Factory import *
+from Entities import *
+from Parallel import *
+from Circuit import Circuit
+
+if __name__ == "__main__": #Required on platforms which spawn worker processes
+    simulator = Circuit("Shared", "Parallel", workers=8)
+
+"""
+
+from Base import *
+from Factory import *
+from Entities import NumpyCalculator
+from multiprocessing import Pool
+from multiprocessing import shared_memory
+import os
+import numpy as np
+
+
+"""States"""
+
+
+@States.register("Shared")
+class SharedState(StateBase):
+    """
+    This class defines classical state whose state vector is stored in shared memory,
+    so that worker processes can update the amplitudes in place.
+    """
+
+    in_place = True
+
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self.__memory = None
+        self.__state = np.array([])
+
+    def __del__(self):
+        """ Destructor: releases shared memory """
+        self.close()
+
+    @property
+    def name(self) -> str:
+        """Name of the shared memory block"""
+        return self.__memory.name
+
+    def close(self):
+        """Releases shared memory"""
+        if self.__memory is not None:
+            self.__state = np.array([])
+            self.__memory.close()
+            self.__memory.unlink()
+            self.__memory = None
+
+    def set_to_ground_state(self, num_qubits: int):
+        self.__allocate(2**num_qubits)
+        self.__state[:] = 0
+        self.__state[0] = 1
+
+    def get_vector(self):
+        return self.__state
+
+    def update_vector(self, state):
+        if state is self.__state:
+            return #Updated in place
+        if self.__memory is None or self.__state.size != len(state):
+            self.__allocate(len(state))
+        self.__state[:] = state
+
+    def get_probability_vector(self):
+        probabilities = np.absolute(self.__state) ** 2
+        probabilities = probabilities / probabilities.sum() #Normalizing so that values add upto 1.
+        return probabilities
+
+    def __allocate(self, size: int):
+        """Allocates shared memory for mentioned number of amplitudes"""
+        self.close()
+        self.__memory = shared_memory.SharedMemory(create=True, size=size * self._dtype.itemsize)
+        self.__state = np.ndarray((size,), dtype=self._dtype, buffer=self.__memory.buf)
+
+
+"""Calculation Strategies"""
+
+
+@Calculators.register("Parallel")
+class ParallelCalculator(NumpyCalculator):
+    """
+    This class calculates the state with a pool of worker processes.
+    Operations on single target qubit (with any number of control qubits) are split in ranges of amplitude pairs,
+    other operations and small states are calculated in the main process.
+
+    Parameters: workers (default: number of cpus) and threshold i.e. minimum number of amplitude pairs
+    for using worker processes (default: 2^16).
+    """
+
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self.__pool = None
+        self.__workers = kwargs.get('workers', None) or os.cpu_count()
+        self.__threshold = kwargs.get('threshold', 2**16)
+        if self.__threshold < 1:
+            raise KeyError("Error: threshold %s is less than 1." %self.__threshold)
+
+    def __del__(self):
+        """ Destructor: terminates worker processes """
+        self.close()
+
+    def close(self):
+        """Terminates worker processes"""
+        if self.__pool is not None:
+            self.__pool.terminate()
+            self.__pool = None
+
+    def calculate_state(self, state: StateBase, total_qubits: int, **operation):
+        operator = self._get_operator(operation) #Get operator
+        if self._profiler is not None:
+            self._profiler.mark("operator", operator.block().shape)
+        targets, controls = operator.qubits(**operation)
+
+        num_pairs = 2**(total_qubits - 1 - len(controls))
+        if (not isinstance(state, SharedState) or len(targets) != 1
+                or self.__workers < 2 or num_pairs < self.__threshold):
+            psi = state.get_vector()
+            if state.in_place:
+                OperatorBase._apply_operator_in_place(psi, total_qubits, operator.block(), targets, controls,
+                                                      scratch=state.get_spare_vector())
+            else:
+                psi = operator.apply(psi, total_qubits, **operation) #Operate on state
+            state.update_vector(psi) #Update state
+            if self._profiler is not None:
+                self._profiler.mark("apply")
+            return state
+
+        if self.__pool is None:
+            self.__pool = Pool(self.__workers)
+
+        #Splitting chunks of amplitude pairs equally between workers, chunks are fixed values of leading free qubits
+        num_free = total_qubits - 1 - len(controls) #Qubits which are neither target nor control
+        prefix_qubits = min(num_free, max(self.__workers - 1, 1).bit_length() + 2)
+        bounds = np.linspace(0, 2**prefix_qubits, self.__workers + 1, dtype=np.int64)
+        tasks = [(state.name, state.dtype, total_qubits, operator.block(), targets[0], list(controls),
+                  prefix_qubits, start, stop)
+                 for start, stop in zip(bounds[:-1], bounds[1:]) if start < stop]
+        self.__pool.map(_apply_pairs, tasks)
+        if self._profiler is not None:
+            self._profiler.mark("apply")
+
+        return state
+
+
+"""Worker process"""
+
+
+_attached_memory = {} #Shared memory attached by worker process, by name
+_scratch = {} #Scratch buffers of worker process, by shape and dtype
+
+
+def _apply_pairs(task):
+    """
+    Applies 2x2 operator in place on the chunks start to stop of the state vector in shared memory. State vector is viewed
+    as a tensor with one axis per qubit (big endian encoding), control axes are fixed to 1 and chunk index gives the values
+    of the first prefix_qubits free axes, hence amplitude pairs of a chunk are two strided views of the shared memory.
+    Fixed axes are sliced with length 1 rather than indexed, so that views remain writable when no free axis is left.
+    """
+    name, dtype, total_qubits, operator, target, controls, prefix_qubits, start, stop = task
+
+    if name not in _attached_memory:
+        for memory in _attached_memory.values():
+            memory.close()
+        _attached_memory.clear()
+        _attached_memory[name] = shared_memory.SharedMemory(name=name)
+    tensor = np.ndarray((2,) * total_qubits, dtype=dtype, buffer=_attached_memory[name].buf)
+
+    free_axes = [axis for axis in range(total_qubits) if axis != target and axis not in controls]
+    for chunk in range(start, stop):
+        index = [slice(None)] * total_qubits
+        for control in controls:
+            index[control] = slice(1, 2)
+        for i, axis in enumerate(free_axes[:prefix_qubits]):
+            bit = (chunk >> (prefix_qubits - 1 - i)) & 1
+            index[axis] = slice(bit, bit + 1)
+        index[target] = slice(0, 1)
+        amplitudes_0 = tensor[tuple(index)]
+        index[target] = slice(1, 2)
+        amplitudes_1 = tensor[tuple(index)]
+
+        key = (amplitudes_0.shape, dtype)
+        if key not in _scratch:
+            _scratch.clear()
+            _scratch[key] = (np.empty(amplitudes_0.shape, dtype=dtype), np.empty(amplitudes_0.shape, dtype=dtype))
+        updated_0, product = _scratch[key]
+
+        np.multiply(amplitudes_0, operator[0, 0], out=updated_0)
+        np.multiply(amplitudes_1, operator[1, 0], out=product)
+        updated_0 += product
+        np.multiply(amplitudes_0, operator[0, 1], out=product)
+        amplitudes_1 *= operator[1, 1]
+        amplitudes_1 += product
+        amplitudes_0[...] = updated_0
@@ -0,0 +1,241 @@
+"""
+This module contains asynchronous job service of the circuit. Programs are submitted to an asyncio queue and executed
+by a pool of worker threads sharing one circuit, which does not print to the console. Queued jobs with the same
+structure, i.e. same gates on same qubits with only different scalar parameters, same number of qubits and same
+measurement options, are batched into one vectorized run of all their state vectors.
+
+For example: running RX circuit for 100 angles as jobs.
+
+import asyncio
+from Factory import *
+from Entities import *
+from Service import JobService
+
+async def main():
+    async with JobService("Classical", "Tensor", workers=4, max_pending=256) as service:
+        futures = [await service.submit(1, my_rx_circuit(angle), num_shots=1000) for angle in angles]
+        results = await asyncio.gather(*futures)
+        print(results[0]["measurements"], results[0]["timing"])
+        print(service.stats())
+
+asyncio.run(main())
+
+"""
+
+from Base import *
+from Factory import *
+from Circuit import Circuit
+from Cache import LRUCache
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
+import numpy as np
+
+class Job(object):
+    """This class holds submitted program with its measurement options, future of its result and timestamps."""
+
+    __slots__ = ["num_qubits", "program", "num_shots", "output", "return_state", "future", "submitted", "started", "finished"]
+
+    def __init__(self, num_qubits: int, program, num_shots: int, output: str, return_state: bool, future):
+        """ Constructor """
+        self.num_qubits = num_qubits
+        self.program = program
+        self.num_shots = num_shots
+        self.output = output
+        self.return_state = return_state
+        self.future = future
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+
+    def structure(self):
+        """Returns key of the jobs which can be batched together: scalar parameters are left out, other parameters are kept"""
+        operations = []
+        for operation in self.program:
+            params = tuple(sorted((key, None if np.isscalar(value) else LRUCache.hashable(value))
+                                  for key, value in operation["params"].items()))
+            qubits = LRUCache.hashable({ key: value for key, value in operation.items() if key != "params" })
+            operations.append((qubits, params))
+        return (self.num_qubits, self.num_shots, self.output, tuple(operations))
+
+
+class JobService(object):
+    """
+    This class defines asynchronous job service. Jobs are taken from the queue by a dispatcher, which batches up to
+    max_batch queued jobs of same structure, optionally waiting batch_window seconds for more jobs, and runs each batch
+    on the worker pool. Submissions wait when max_pending jobs are queued and batches wait when all workers are busy,
+    which gives backpressure to the submitters.
+
+    Batches are run by sweep of the circuit when the calculator calculates batches of state vectors, e.g. Numpy and Tensor
+    calculators, otherwise each job is run by simulate. Extra parameters such as seed and precision are passed to the circuit.
+    """
+
+    def __init__(self, state_type: str = "Classical", calculator_type: str = "Tensor", workers: int = 4,
+                 max_pending: int = 1024, max_batch: int = 64, batch_window: float = 0.0, **kwargs):
+        """ Constructor """
+        kwargs.setdefault('verbose', False)
+        self.__circuit = Circuit(state_type, calculator_type, **kwargs)
+        self.__batched = hasattr(Calculators._products[calculator_type], "calculate_batch")
+        self.__workers = workers
+        self.__max_pending = max_pending
+        self.__max_batch = max_batch
+        self.__batch_window = batch_window
+        self.__queue = None
+        self.__dispatcher = None
+        self.__executor = None
+        self.__slots = None #Free workers
+        self.__tasks = set() #Running batches
+        self.__stats = { "submitted": 0, "completed": 0, "failed": 0, "batches": 0, "queue_time": 0.0, "run_time": 0.0 }
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exception_type, exception, traceback):
+        await self.close()
+
+    async def start(self):
+        """Starts the dispatcher and the worker pool"""
+        if self.__dispatcher is not None:
+            return
+        self.__queue = asyncio.Queue(self.__max_pending)
+        self.__executor = ThreadPoolExecutor(self.__workers)
+        self.__slots = asyncio.Semaphore(self.__workers)
+        self.__dispatcher = asyncio.get_running_loop().create_task(self.__dispatch())
+
+    async def close(self):
+        """Waits for all submitted jobs and stops the dispatcher and the worker pool"""
+        if self.__dispatcher is None:
+            return
+        await self.__queue.put(None) #Jobs before it are dispatched first
+        await self.__dispatcher
+        if self.__tasks:
+            await asyncio.wait(list(self.__tasks))
+        self.__executor.shutdown()
+        self.__dispatcher = None
+
+    async def submit(self, num_qubits: int, program, num_shots: int = None, output: str = "dict", return_state: bool = False):
+        """
+        Submits program on ground state of mentioned number of qubits and returns future of its result, which is a dictionary
+        with measurements (None if num_shots is not mentioned), state (vector of the final state if return_state is set)
+        and timing of the job in seconds, i.e. queue_time, run_time, total_time and batch_size.
+        Waits while the queue is full.
+        """
+        if self.__dispatcher is None:
+            await self.start()
+        if program is None:
+            raise TypeError("Error: program is of NoneType.")
+
+        job = Job(num_qubits, list(program), num_shots, output, return_state, asyncio.get_running_loop().create_future())
+        await self.__queue.put(job)
+        self.__stats["submitted"] += 1
+        return job.future
+
+    async def run(self, num_qubits: int, program, num_shots: int = None, output: str = "dict", return_state: bool = False):
+        """Submits program and returns its result when it is done"""
+        return await (await self.submit(num_qubits, program, num_shots, output, return_state))
+
+    def stats(self) -> dict:
+        """Returns counters of jobs and batches, mean batch size and mean queue and run time of completed jobs in seconds"""
+        stats = dict(self.__stats)
+        stats["pending"] = self.__queue.qsize() if self.__queue is not None else 0
+        done = max(stats["completed"], 1)
+        stats["mean_batch_size"] = (stats["completed"] + stats["failed"]) / max(stats["batches"], 1)
+        stats["mean_queue_time"] = stats.pop("queue_time") / done
+        stats["mean_run_time"] = stats.pop("run_time") / done
+        return stats
+
+    async def __dispatch(self):
+        """Takes queued jobs, groups them by structure and runs each group as a batch when a worker is free"""
+        closing = False
+        while not closing:
+            job = await self.__queue.get()
+            if job is None:
+                break
+            if self.__batch_window > 0:
+                await asyncio.sleep(self.__batch_window) #Waiting for more jobs to batch
+
+            jobs = [job]
+            while len(jobs) < self.__max_batch and not self.__queue.empty():
+                job = self.__queue.get_nowait()
+                if job is None:
+                    closing = True
+                    break
+                jobs.append(job)
+
+            groups = {}
+            for job in jobs:
+                groups.setdefault(job.structure() if self.__batched else id(job), []).append(job)
+            for group in groups.values():
+                await self.__slots.acquire()
+                task = asyncio.get_running_loop().create_task(self.__execute(group))
+                self.__tasks.add(task)
+                task.add_done_callback(self.__tasks.discard)
+
+    async def __execute(self, jobs):
+        """Runs batch of jobs on the worker pool and sets their results"""
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.__executor, self.__run_batch, jobs)
+            for job, result in zip(jobs, results):
+                timing = { "queue_time": job.started - job.submitted, "run_time": job.finished - job.started,
+                           "total_time": job.finished - job.submitted, "batch_size": len(jobs) }
+                self.__stats["completed"] += 1
+                self.__stats["queue_time"] += timing["queue_time"]
+                self.__stats["run_time"] += timing["run_time"]
+                if not job.future.done():
+                    job.future.set_result(dict(result, timing=timing))
+        except Exception as e: #Any error of the batch is raised by the futures of its jobs, instead of leaving them pending
+            self.__stats["failed"] += len(jobs)
+            for job in jobs:
+                if not job.future.done():
+                    job.future.set_exception(e)
+        finally:
+            self.__stats["batches"] += 1
+            self.__slots.release()
+
+    def __run_batch(self, jobs):
+        """Runs jobs in worker thread, jobs of same structure are run together by one sweep"""
+        started = time.perf_counter()
+        for job in jobs:
+            job.started = started
+
+        if not self.__batched:
+            results = []
+            for job in jobs:
+                result = self.__circuit.simulate(job.num_qubits, job.program, job.num_shots, job.output)
+                if result is None or result[0] is None:
+                    raise TypeError("Error: job failed.")
+                final_state, measurements = result
+                results.append({ "measurements": measurements, "state": final_state.get_vector() if job.return_state else None })
+                job.finished = time.perf_counter()
+            return results
+
+        #Scalar parameters which differ between jobs are bound by name, e.g. "3.theta" for theta of operation 3
+        template = []
+        bindings = {}
+        for index, operation in enumerate(jobs[0].program):
+            params = {}
+            for key, value in operation["params"].items():
+                values = [job.program[index]["params"][key] for job in jobs]
+                if np.isscalar(value) and any(other != value for other in values):
+                    params[key] = "%s.%s" %(index, key)
+                    bindings[params[key]] = np.array(values)
+                else:
+                    params[key] = value
+            template.append(dict(operation, params=params))
+        if not bindings:
+            bindings = { "batch": np.zeros(len(jobs)) } #Number of state vectors of the sweep
+
+        first = jobs[0]
+        result = self.__circuit.sweep(first.num_qubits, template, bindings, first.num_shots, first.output)
+        if result is None:
+            raise TypeError("Error: job failed.")
+        vectors, measurements = result
+
+        finished = time.perf_counter()
+        results = []
+        for row, job in enumerate(jobs):
+            job.finished = finished
+            results.append({ "measurements": None if measurements is None else measurements[row],
+                             "state": vectors[row].copy() if job.return_state else None })
+        return results
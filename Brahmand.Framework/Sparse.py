@@ -0,0 +1,90 @@
+"""
+This module contains calculation strategy which builds operators directly in compressed sparse row (CSR) format.
+Operators are Kronecker products with identity, hence each row of an operator has only 2^k non-zero entries
+for an operation on k target qubits, and the operators are never densified.
+
+For example: using sparse calculator with classical state.
+
+from Factory import *
+from Entities import *
+from Sparse import *
+from Circuit import Circuit
+
+simulator = Circuit("Classical", "Sparse")
+
+"""
+
+from Base import *
+from Factory import *
+from Entities import NumpyCalculator
+from scipy import sparse
+import numpy as np
+
+
+@Calculators.register("Sparse")
+class SparseCalculator(NumpyCalculator):
+    """
+    This class calculates the state with sparse operator matrices and sparse matrix-vector product.
+    It also builds reusable sparse operator of the whole circuit.
+    """
+
+    def calculate_state(self, state: StateBase, total_qubits: int, **operation):
+        operator = self._get_operator(operation) #Get operator
+        operator_matrix = self.sparse_matrix(operator, total_qubits, **operation) #Calculate sparse operator matrix
+        if self._profiler is not None:
+            self._profiler.mark("operator", operator_matrix.shape)
+
+        psi = operator_matrix.T.dot(state.get_vector()) #Operate on state, same as np.dot(state, operator_matrix)
+        state.update_vector(psi) #Update state
+        if self._profiler is not None:
+            self._profiler.mark("apply")
+
+        return state
+
+    def circuit_matrix(self, program, total_qubits: int):
+        """Returns sparse operator of the whole program, which can be reused for many initial states."""
+        circuit_matrix = sparse.identity(2**total_qubits, dtype=self._dtype, format="csr")
+        for operation in program:
+            operator = self._get_operator(operation)
+            circuit_matrix = circuit_matrix.dot(self.sparse_matrix(operator, total_qubits, **operation))
+        return circuit_matrix
+
+    def sparse_matrix(self, operator: OperatorBase, total_qubits: int, **operation):
+        """Returns operator matrix with big endian encoding in CSR format, same as operator.matrix(total_qubits, **operation)."""
+        targets, controls = operator.qubits(**operation)
+        block = operator.block()
+
+        rows = np.arange(2**total_qubits)
+
+        #Rows with all control qubits set to |1> are operated, other rows are identity
+        controlled = np.ones(rows.size, dtype=bool)
+        for control in controls:
+            controlled &= ((rows >> (total_qubits - 1 - control)) & 1) == 1
+        identity_rows = rows[~controlled]
+        rows = rows[controlled]
+
+        #Index of target qubits in the block and row with target qubits cleared
+        block_rows = np.zeros(rows.size, dtype=np.int64)
+        cleared_rows = rows.copy()
+        for target in targets:
+            shift = total_qubits - 1 - target
+            block_rows = (block_rows << 1) | ((rows >> shift) & 1)
+            cleared_rows &= ~(1 << shift)
+
+        all_rows = [identity_rows]
+        all_columns = [identity_rows]
+        all_data = [np.ones(identity_rows.size, dtype=block.dtype)]
+        for block_column in range(block.shape[1]):
+            columns = cleared_rows.copy()
+            for position, target in enumerate(targets):
+                bit = (block_column >> (len(targets) - 1 - position)) & 1
+                columns |= bit << (total_qubits - 1 - target)
+
+            data = block[block_rows, block_column]
+            non_zero = data != 0
+            all_rows.append(rows[non_zero])
+            all_columns.append(columns[non_zero])
+            all_data.append(data[non_zero])
+
+        return sparse.csr_matrix((np.concatenate(all_data), (np.concatenate(all_rows), np.concatenate(all_columns))),
+                                 shape=(2**total_qubits, 2**total_qubits))
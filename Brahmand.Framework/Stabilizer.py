@@ -0,0 +1,381 @@
+"""
+This module contains stabilizer state and calculation strategy for Clifford circuits.
+State is stored as a stabilizer tableau (Aaronson-Gottesman), hence circuits whose U3/CU operations have angles
+of multiples of pi/2 are simulated in polynomial time and memory, for example GHZ circuit on hundreds of qubits.
+
+For example: GHZ circuit on 200 qubits.
+
+from Factory import *
+from Entities import *
+from Stabilizer import *
+from Circuit import Circuit
+
+simulator = Circuit("Stabilizer", "Stabilizer")
+my_qpu = simulator.initialize(200)
+
+Circuit also routes fully Clifford programs to this engine automatically with simulate method.
+
+simulator = Circuit("Classical", "Numpy")
+final_state, measurements = simulator.simulate(200, my_ghz_circuit, 1000)
+
+"""
+
+from Base import *
+from Factory import *
+import numpy as np
+
+
+"""States"""
+
+
+@States.register("Stabilizer")
+class StabilizerState(StateBase):
+    """
+    This class defines stabilizer state with 'n' number of qubits as a tableau of n destabilizer and n stabilizer
+    generators. Generator i is the Pauli operator (-1)^r[i] * P[0] x ... x P[n-1], where P[q] is
+    I, X, Z or Y for (x[q, i], z[q, i]) = (0, 0), (1, 0), (0, 1) or (1, 1), generators n to 2n-1 are stabilizers.
+    """
+
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self.__num_qubits = 0
+        self.x = np.zeros((0, 0), dtype=bool) #X bits by qubit and generator
+        self.z = np.zeros((0, 0), dtype=bool) #Z bits by qubit and generator
+        self.r = np.zeros(0, dtype=bool) #Sign bits by generator
+
+    @property
+    def num_qubits(self) -> int:
+        """Number of qubits"""
+        return self.__num_qubits
+
+    def set_to_ground_state(self, num_qubits: int):
+        self.__num_qubits = num_qubits
+        self.x = np.zeros((num_qubits, 2 * num_qubits), dtype=bool)
+        self.z = np.zeros((num_qubits, 2 * num_qubits), dtype=bool)
+        self.r = np.zeros(2 * num_qubits, dtype=bool)
+
+        #Destabilizers are X and stabilizers are Z on each qubit
+        qubits = np.arange(num_qubits)
+        self.x[qubits, qubits] = True
+        self.z[qubits, num_qubits + qubits] = True
+
+    def get_vector(self):
+        """Returns stabilizer generators such as ['+XX', '+ZZ'] for 2 qubit bell state, use to_vector for state vector."""
+        paulis = np.array(["I", "X", "Z", "Y"])
+        n = self.__num_qubits
+        codes = self.x[:, n:].astype(np.int8) + 2 * self.z[:, n:].astype(np.int8)
+        return np.array([("-" if self.r[n + i] else "+") + "".join(paulis[codes[:, i]]) for i in range(n)])
+
+    def update_vector(self, state):
+        raise TypeError("Error: stabilizer state can be updated only by Clifford operations.")
+
+    def get_probability_vector(self):
+        return np.absolute(self.to_vector()) ** 2
+
+    def to_vector(self):
+        """Returns state vector with big endian encoding (up to global phase), only for small number of qubits."""
+        n = self.__num_qubits
+        indices = np.arange(2**n)
+
+        #Basis state in the support of the state is projected by (I + S) / 2 of each stabilizer S
+        offset = _measurement_distribution(self.x, self.z, self.r)[0]
+        psi = np.zeros(2**n, dtype=complex)
+        psi[int(np.dot(offset, 1 << np.arange(n - 1, -1, -1)))] = 1
+
+        for i in range(n, 2 * n):
+            x_mask = int(np.dot(self.x[:, i], 1 << np.arange(n - 1, -1, -1)))
+            flipped = indices ^ x_mask
+            parity = np.zeros(2**n, dtype=np.int64)
+            for qubit in np.flatnonzero(self.z[:, i]):
+                parity ^= (flipped >> (n - 1 - qubit)) & 1
+
+            #Y = iXZ, hence Z part is applied first and X part flips the amplitudes
+            sign = (-1) ** int(self.r[i]) * 1j ** int(np.count_nonzero(self.x[:, i] & self.z[:, i]))
+            psi = (psi + sign * (1 - 2 * parity) * psi[flipped]) / 2
+
+        return psi / np.linalg.norm(psi)
+
+
+"""Calculation Strategies"""
+
+
+@Calculators.register("Stabilizer")
+class StabilizerCalculator(CalculatorBase):
+    """
+    This class calculates stabilizer state by decomposing Clifford operations into H, S and CX operations
+    on the tableau, each one costs O(n). Clifford operations are:
+    - U3 operations with theta, phi and lambda of multiples of pi/2 (within tolerance),
+    - CU operations with such angles whose operator is a Pauli operator up to phase of multiple of pi/2,
+    - Matrix operations of single qubit Clifford matrices (within tolerance).
+
+    Parameters: tolerance on the angles (default: 1e-6).
+    """
+
+    #Operators of the controlled Pauli operations, applied as column vector
+    __paulis = { "I": np.identity(2), "X": np.array([[0, 1], [1, 0]]),
+                 "Y": np.array([[0, -1j], [1j, 0]]), "Z": np.array([[1, 0], [0, -1]]) }
+
+    #Controlled Pauli operations as H, S and CX operations on control "c" and target "t", e.g. CY = S.CX.S^3
+    __controlled_paulis = { "I": [], "X": [("cx", "c", "t")], "Y": [("s", "t")] * 3 + [("cx", "c", "t"), ("s", "t")],
+                            "Z": [("h", "t"), ("cx", "c", "t"), ("h", "t")] }
+
+    def __init__(self, **kwargs):
+        """ Constructor """
+        super().__init__(**kwargs)
+        self.__tolerance = kwargs.get('tolerance', 1e-6)
+        self.__decompositions = {} #Decompositions by gate, multiples of pi/2 and number of controls
+
+    def is_clifford(self, program) -> bool:
+        """Checks whether all operations of the program are Clifford operations"""
+        try:
+            return all(self.decompose(operation) is not None for operation in program)
+        except KeyError:
+            return False
+
+    def decompose(self, operation):
+        """Returns the operation as list of ("h", qubit), ("s", qubit) and ("cx", control, target), or None if it is not Clifford"""
+        if "gate" not in operation:
+            raise KeyError("Error: gate not found.")
+        if "params" not in operation:
+            raise KeyError("Error: params not found.")
+
+        gate = operation["gate"]
+        params = operation["params"]
+        if gate == "Matrix":
+            key = None
+            operator = Operators.create(gate, **params)
+        elif gate in ("U3", "CU", "MCU", "CCU"):
+            quarters = []
+            for name in ("theta", "phi", "lambda"):
+                value = params.get(name, None)
+                if value is None:
+                    raise KeyError("Error: %s not found." %name)
+                if isinstance(value, str) or np.ndim(value) != 0:
+                    return None
+                quarter = int(np.round(value / (np.pi / 2)))
+                if abs(value - quarter * np.pi / 2) > self.__tolerance:
+                    return None
+                quarters.append(quarter)
+            key = (gate, tuple(quarters))
+            operator = Operators.create(gate, **dict(zip(("theta", "phi", "lambda"), np.array(quarters) * np.pi / 2)))
+        else:
+            return None
+
+        targets, controls = operator.qubits(**operation)
+        if len(targets) != 1 or len(controls) > 1:
+            return None
+
+        if key is not None:
+            key += (len(controls),) #MCU with and without controls share angles but not decompositions
+        if key not in self.__decompositions:
+            decomposition = self.__decompose_block(np.asarray(operator.block()), len(controls))
+            if key is None:
+                return self.__assign(decomposition, targets, controls)
+            self.__decompositions[key] = decomposition
+        return self.__assign(self.__decompositions[key], targets, controls)
+
+    def calculate_state(self, state: StateBase, total_qubits: int, **operation):
+        if not isinstance(state, StabilizerState):
+            raise TypeError("Error: state is not a stabilizer state.")
+
+        instructions = self.decompose(operation)
+        if instructions is None:
+            raise KeyError("Error: operation %s is not a Clifford operation." %operation["gate"])
+
+        x, z, r = state.x, state.z, state.r
+        for instruction in instructions:
+            if instruction[0] == "h":
+                qubit = instruction[1]
+                r ^= x[qubit] & z[qubit]
+                x[qubit], z[qubit] = z[qubit].copy(), x[qubit].copy()
+            elif instruction[0] == "s":
+                qubit = instruction[1]
+                r ^= x[qubit] & z[qubit]
+                z[qubit] ^= x[qubit]
+            else:
+                control, target = instruction[1], instruction[2]
+                r ^= x[control] & z[target] & ~(x[target] ^ z[control])
+                x[target] ^= x[control]
+                z[control] ^= z[target]
+
+        if self._profiler is not None:
+            self._profiler.mark("apply")
+        return state
+
+    def measure_state(self, state: StateBase, num_shots: int, total_qubits: int, output: str = "dict"):
+        if not isinstance(state, StabilizerState):
+            raise TypeError("Error: state is not a stabilizer state.")
+
+        #Outcomes are uniformly distributed over an affine space, i.e. offset + generators.choices (mod 2)
+        offset, generators = _measurement_distribution(state.x, state.z, state.r)
+        choices = self._random.integers(0, 2, size=(num_shots, generators.shape[1]), dtype=np.int64)
+        bits = offset ^ ((choices @ generators.T.astype(np.int64)) & 1).astype(bool)
+        if self._profiler is not None:
+            self._profiler.mark("sample")
+
+        measurements = self._format_bits(bits, total_qubits, output)
+        if self._profiler is not None:
+            self._profiler.mark("format")
+        return measurements
+
+    def expectation_value(self, state: StateBase, observable, total_qubits: int, qubits = None) -> float:
+        """
+        Returns exact expectation value of Pauli observable. Pauli operator which anticommutes with any stabilizer
+        has expectation value 0, otherwise it is product of stabilizers up to sign, i.e. expectation value is 1 or -1.
+        """
+        if isinstance(observable, dict):
+            return sum(coefficient * self.expectation_value(state, pauli, total_qubits, qubits)
+                       for pauli, coefficient in observable.items())
+
+        paulis = self._parse_pauli(observable, total_qubits, qubits)
+        x = np.zeros(total_qubits, dtype=np.int64)
+        z = np.zeros(total_qubits, dtype=np.int64)
+        for qubit, pauli in paulis.items():
+            x[qubit] = pauli in "XY"
+            z[qubit] = pauli in "YZ"
+
+        #Pauli operators anticommute if their symplectic product is odd
+        n = total_qubits
+        anticommuting = (np.dot(x, state.z) + np.dot(z, state.x)) % 2 == 1
+        if anticommuting[n:].any():
+            return 0.0
+
+        rows = n + np.flatnonzero(anticommuting[:n])
+        sign = _product(state.x.T[rows], state.z.T[rows], state.r[rows].reshape(-1, 1))
+        return -1.0 if sign[0] else 1.0
+
+    def marginal_probabilities(self, state: StateBase, qubits, total_qubits: int):
+        """Returns exact probabilities of outcomes of mentioned qubits, which are uniform over an affine space"""
+        qubits = self._check_qubits(qubits, total_qubits)
+        offset, generators = _measurement_distribution(state.x, state.z, state.r)
+        weights = 1 << np.arange(len(qubits) - 1, -1, -1, dtype=np.int64)
+
+        #Outcomes are offset + all combinations of the generators (mod 2)
+        span = {0}
+        for generator in generators[qubits].T:
+            outcome = int(np.dot(generator, weights))
+            if outcome not in span:
+                span |= {outcome ^ combination for combination in span}
+
+        marginal = np.zeros(2**len(qubits))
+        marginal[[int(np.dot(offset[qubits], weights)) ^ combination for combination in span]] = 1 / len(span)
+        return marginal
+
+    def measure_qubits(self, state: StateBase, qubits, num_shots: int, total_qubits: int, output: str = "dict"):
+        """Samples outcomes of mentioned qubits only, from the affine space of outcomes"""
+        qubits = self._check_qubits(qubits, total_qubits)
+        offset, generators = _measurement_distribution(state.x, state.z, state.r)
+        choices = self._random.integers(0, 2, size=(num_shots, generators.shape[1]), dtype=np.int64)
+        bits = offset[qubits] ^ ((choices @ generators[qubits].T.astype(np.int64)) & 1).astype(bool)
+        return self._format_bits(bits, len(qubits), output)
+
+    def __decompose_block(self, block, num_controls: int):
+        """Returns H, S and CX operations of the operator on target "t" and control "c", or None if it is not Clifford"""
+        if block.shape != (2, 2):
+            return None
+        unitary = block.T #Operators are applied as row vector, i.e. psi.block
+
+        if num_controls == 0:
+            for matrix, word in _single_qubit_cliffords:
+                if abs(abs(np.trace(np.dot(matrix.conj().T, unitary))) / 2 - 1) <= self.__tolerance:
+                    return [(gate, "t") for gate in word]
+            return None
+
+        #Controlled operator is Clifford if it is Pauli operator up to phase, the phase is applied on control qubit
+        for name, pauli in self.__paulis.items():
+            overlap = np.trace(np.dot(pauli, unitary)) / 2
+            if abs(abs(overlap) - 1) <= self.__tolerance:
+                quarter = int(np.round(np.angle(overlap) / (np.pi / 2)))
+                if abs(np.angle(overlap) - quarter * np.pi / 2) > self.__tolerance:
+                    return None
+                return self.__controlled_paulis[name] + [("s", "c")] * (quarter % 4)
+        return None
+
+    def __assign(self, decomposition, targets, controls):
+        """Replaces target "t" and control "c" of decomposition by qubits"""
+        if decomposition is None:
+            return None
+        qubits = { "t": targets[0], "c": controls[0] if controls else None }
+        return [(instruction[0],) + tuple(qubits[role] for role in instruction[1:]) for instruction in decomposition]
+
+
+"""Tableau functions"""
+
+
+def _find_single_qubit_cliffords():
+    """Returns the 24 single qubit Clifford operators (up to phase) with shortest words of "h" and "s" in order of execution"""
+    gates = { "h": np.array([[1, 1], [1, -1]]) / np.sqrt(2), "s": np.array([[1, 0], [0, 1j]]) }
+    found = { }
+    queue = [(np.identity(2, dtype=complex), [])]
+    while queue:
+        matrix, word = queue.pop(0)
+        pivot = matrix.flat[np.flatnonzero(np.absolute(matrix) > 0.5)[0]]
+        key = tuple(np.round(matrix / pivot * abs(pivot), 6).flat) #Phase is removed for comparing operators
+        if key in found:
+            continue
+        found[key] = (matrix, word)
+        for name, gate in gates.items():
+            queue.append((np.dot(gate, matrix), word + [name]))
+    return list(found.values())
+
+
+_single_qubit_cliffords = _find_single_qubit_cliffords()
+
+
+def _phase(x1, z1, x2, z2):
+    """Returns whether product of Pauli generators (x1, z1) and (x2, z2) gains the sign -1, i.e. sum of g is 2 (mod 4)"""
+    x1, z1, x2, z2 = (np.asarray(bits, dtype=np.int64) for bits in (x1, z1, x2, z2))
+    g = np.where(x1 & z1, z2 - x2, np.where(x1 == 1, z2 * (2 * x2 - 1), np.where(z1 == 1, x2 * (1 - 2 * z2), 0)))
+    return g.sum(axis=-1) % 4 == 2
+
+
+def _measurement_distribution(x, z, r):
+    """
+    Returns offset and generators of the measurement outcomes of all qubits, i.e. outcome bits are
+    offset + generators.choices (mod 2) for uniformly random choices. Qubits are measured on a copy of the tableau,
+    random outcomes are new choices and signs are tracked as affine functions of the choices, i.e. r[:, 0] + r[:, 1:].choices.
+    """
+    n = x.shape[0]
+    x = x.T.copy() #Qubit bits by generator
+    z = z.T.copy()
+    signs = np.zeros((2 * n, n + 1), dtype=bool)
+    signs[:, 0] = r
+    outcomes = np.zeros((n, n + 1), dtype=bool)
+    num_choices = 0
+
+    for qubit in range(n):
+        anticommuting = np.flatnonzero(x[n:, qubit])
+        if anticommuting.size:
+            #Random outcome: generators which anticommute with Z are multiplied by the first such stabilizer p
+            p = n + anticommuting[0]
+            rows = np.flatnonzero(x[:, qubit])
+            rows = rows[rows != p]
+            signs[rows] ^= signs[p]
+            signs[rows, 0] ^= _phase(x[p], z[p], x[rows], z[rows])
+            x[rows] ^= x[p]
+            z[rows] ^= z[p]
+
+            x[p - n], z[p - n], signs[p - n] = x[p], z[p], signs[p]
+            x[p], z[p], signs[p] = False, False, False
+            z[p, qubit] = True
+            num_choices += 1
+            signs[p, num_choices] = True
+            outcomes[qubit] = signs[p]
+        else:
+            #Determined outcome: product of stabilizers whose destabilizers anticommute with Z
+            rows = n + np.flatnonzero(x[:n, qubit])
+            outcomes[qubit] = _product(x[rows], z[rows], signs[rows])
+
+    return outcomes[:, 0], outcomes[:, 1:num_choices + 1]
+
+
+def _product(x, z, signs):
+    """Returns sign of the product of Pauli generators in order, signs of shape (generators, choices) are affine as above"""
+    x_products = np.logical_xor.accumulate(x, axis=0) #Products after each multiplication
+    z_products = np.logical_xor.accumulate(z, axis=0)
+    x_products = np.vstack([np.zeros((1, x.shape[1]), dtype=bool), x_products[:-1]])
+    z_products = np.vstack([np.zeros((1, z.shape[1]), dtype=bool), z_products[:-1]])
+    sign = np.logical_xor.reduce(signs, axis=0)
+    sign[0] ^= np.logical_xor.reduce(_phase(x, z, x_products, z_products))
+    return sign
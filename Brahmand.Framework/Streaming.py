@@ -0,0 +1,119 @@
+"""
+This module contains streaming of programs from JSON lines files and checkpoints of long runs.
+Programs with millions of operations are read one operation per line while they are executed, and the state vector
+with the number of executed operations is saved periodically, so that a crashed or pre-empted run resumes from
+the last checkpoint instead of starting over.
+
+For example: 30 qubits program with checkpoints every 100000 operations or 10 minutes.
+
+from Factory import *
+from Entities import *
+from Streaming import JsonLinesProgram, Checkpoint
+from Circuit import Circuit
+
+simulator = Circuit("Classical", "Tensor")
+checkpoint = Checkpoint("/tmp/my_circuit.checkpoint.npz", every_operations=100000, every_seconds=600)
+final_state = simulator.run(simulator.initialize(30), JsonLinesProgram("my_circuit.jsonl"), checkpoint=checkpoint)
+
+Running the same lines again after a crash restores the state and skips the executed operations.
+Each line of the file is one operation such as
+{ "gate": "U3", "params": { "theta": 1.5708, "phi": 0, "lambda": -3.1415 }, "target": 0 }
+
+"""
+
+from Base import *
+import json
+import os
+import tempfile
+import time
+import numpy as np
+
+class JsonLinesProgram(object):
+    """
+    This class defines a program stored in JSON lines file, one operation per line, which is read lazily
+    each time it is iterated. Blank lines are ignored.
+    """
+
+    def __init__(self, path: str):
+        """ Constructor """
+        self.path = path
+
+    def __iter__(self):
+        return self.operations()
+
+    def operations(self, start: int = 0):
+        """Yields operations from the mentioned offset, skipped lines are not parsed"""
+        index = 0
+        with open(self.path) as file:
+            for number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                if index >= start:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        raise KeyError("Error: operation on line %s of %s is not valid JSON." %(number, self.path))
+                index += 1
+
+
+class Checkpoint(object):
+    """
+    This class defines a checkpoint file of a run, which holds the state vector and the number of executed operations
+    (offset). It is saved every_operations operations and/or every_seconds seconds, by writing a temporary file
+    and renaming it, so the previous checkpoint is kept until the new one is complete.
+    """
+
+    def __init__(self, path: str, every_operations: int = None, every_seconds: float = None):
+        """ Constructor """
+        if every_operations is None and every_seconds is None:
+            raise KeyError("Error: every_operations or every_seconds not found.")
+        if every_operations is not None and (not isinstance(every_operations, (int, np.integer)) or every_operations < 1):
+            raise KeyError("Error: every_operations %s is not a positive integer." %every_operations)
+        if every_seconds is not None and not every_seconds > 0:
+            raise KeyError("Error: every_seconds %s is not positive." %every_seconds)
+        self.path = path
+        self.every_operations = every_operations
+        self.every_seconds = every_seconds
+        self.saves = 0
+        self.__saved_at = time.monotonic()
+
+    @property
+    def exists(self) -> bool:
+        """True if the checkpoint file exists"""
+        return os.path.exists(self.path)
+
+    def restore(self, state: StateBase, total_qubits: int) -> int:
+        """Restores the state vector of the checkpoint and returns its offset, or 0 if there is no checkpoint"""
+        self.__saved_at = time.monotonic()
+        if not self.exists:
+            return 0
+        with np.load(self.path) as checkpoint:
+            if int(checkpoint["total_qubits"]) != total_qubits:
+                raise TypeError("Error: checkpoint is saved for %s qubits." %int(checkpoint["total_qubits"]))
+            state.update_vector(checkpoint["vector"])
+            return int(checkpoint["offset"])
+
+    def is_due(self, operations: int) -> bool:
+        """Checks whether checkpoint is due after mentioned number of operations since the last save"""
+        if self.every_operations is not None and operations >= self.every_operations:
+            return True
+        return self.every_seconds is not None and time.monotonic() - self.__saved_at >= self.every_seconds
+
+    def save(self, state: StateBase, total_qubits: int, offset: int):
+        """Saves the state vector and the offset"""
+        vector = state.get_vector()
+        if not isinstance(vector, np.ndarray):
+            raise TypeError("Error: checkpoint of %s is not supported." %type(state).__name__)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        descriptor, temporary = tempfile.mkstemp(suffix=".tmp", dir=directory)
+        with os.fdopen(descriptor, "wb") as file:
+            np.savez(file, vector=vector, offset=offset, total_qubits=total_qubits)
+        os.replace(temporary, self.path)
+        self.saves += 1
+        self.__saved_at = time.monotonic()
+
+    def clear(self):
+        """Removes the checkpoint file"""
+        if self.exists:
+            os.remove(self.path)
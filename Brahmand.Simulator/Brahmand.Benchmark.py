@@ -0,0 +1,62 @@
+"""
+This module benchmarks calculation strategies of the simulation circuit using the benchmark suite.
+Results are saved to JSON files, which can be compared with results of a later run for catching regressions:
+
+python Benchmark.py compare brahmand_benchmark.json new_brahmand_benchmark.json
+
+"""
+
+from Benchmark import *
+
+import os
+
+
+if __name__ == "__main__":
+
+    """Benchmark 1"""
+
+    print("Benchmark 1: All calculators")
+
+    suite = BenchmarkSuite(qubits=range(2, 13), depths=(1, 4), max_dense_qubits=10)
+    BenchmarkSuite.save(suite.run(), "brahmand_benchmark.json")
+
+
+    """Benchmark 2"""
+
+    print("\n\nBenchmark 2: Sparse calculator against Numpy calculator on GHZ circuit")
+
+    suite = BenchmarkSuite(calculators=["Numpy", "Sparse"], qubits=range(2, 13), depths=(1,), repeats=1,
+                           max_dense_qubits=12, benchmarks=["circuit"], circuit_names=["ghz"])
+    BenchmarkSuite.save(suite.run(), "brahmand_benchmark_sparse.json")
+
+
+    """Benchmark 3"""
+
+    print("\n\nBenchmark 3: Scaling of Parallel calculator with number of workers on 22 qubits (%s cpus)" % os.cpu_count())
+
+    suite = BenchmarkSuite(calculators=[("Parallel", { "workers": workers }) for workers in [1, 2, 4, 8, 16, 32]],
+                           qubits=[22], depths=(1,), repeats=1, benchmarks=["circuit"], circuit_names=["random"])
+    results = suite.run()
+    BenchmarkSuite.save(results, "brahmand_benchmark_parallel.json")
+
+    print("%7s %12s %12s" % ("workers", "time (s)", "speedup"))
+    for workers, result in zip([1, 2, 4, 8, 16, 32], results):
+        print("%7d %12.5f %12.2f" % (workers, result["wall_time"], results[0]["wall_time"] / result["wall_time"]))
+
+
+    """Benchmark 4"""
+
+    print("\n\nBenchmark 4: Diagonal and permutation fast paths of Tensor calculator on Clifford circuit")
+
+    results = []
+    for specialize in [False, True]:
+        OperatorBase.specialize = specialize
+        suite = BenchmarkSuite(calculators=["Tensor"], qubits=[16, 20], depths=(10,), repeats=1,
+                               benchmarks=["circuit"], circuit_names=["clifford"], verbose=False)
+        results.append(suite.run())
+    OperatorBase.specialize = True
+
+    print("%7s %14s %16s %12s" % ("qubits", "general (s)", "specialized (s)", "speedup"))
+    for general, specialized in zip(*results):
+        print("%7d %14.5f %16.5f %12.2f" % (general["qubits"], general["wall_time"], specialized["wall_time"],
+                                            general["wall_time"] / specialized["wall_time"]))
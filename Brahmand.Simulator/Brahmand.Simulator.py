@@ -4,10 +4,23 @@ This module tests the simulation circuit.
 
 from Factory import *
 from Entities import *
+from Mapped import *
+from Stabilizer import *
+from MPS import *
+from Dictionary import *
+from Blocked import *
+from Service import JobService
+from Cache import DiskCache
+from Noise import NoiseModel, TrajectorySimulator
+from Streaming import JsonLinesProgram, Checkpoint
 from Circuit import Circuit
-
-from datetime import timedelta
-import datetime
+from Instrumentation import Collector
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import tempfile
+import shutil
+import json
+import os
 
 simulator = Circuit("Classical", "Numpy")
 
@@ -49,10 +62,6 @@ simulator.measure(final_state, 1000)
 
 print("\n\nProgram 3: Circuit for swapping q0 with q2")
 
-datetimeFormat = '%Y-%m-%d %H:%M:%S.%f'
-start_time = datetime.datetime.now().strftime(datetimeFormat)
-
-
 my_qpu = simulator.initialize(8)
 my_swap_circuit = [
     #initial state |00000000>
@@ -66,7 +75,335 @@ my_swap_circuit = [
 final_state = simulator.run(my_qpu, my_swap_circuit)
 simulator.measure(final_state, 1000)
 
+"""Program 4"""
+
+print("\n\nProgram 4: Cross-checking Tensor calculator against Numpy calculator")
+
+tensor_simulator = Circuit("Classical", "Tensor")
+
+for num_qubits, program in [(3, my_h_circuit), (4, my_cx_circuit), (8, my_swap_circuit)]:
+    numpy_state = simulator.run(simulator.initialize(num_qubits), program)
+    tensor_state = tensor_simulator.run(tensor_simulator.initialize(num_qubits), program)
+    print("match: %s" % np.allclose(numpy_state.get_vector(), tensor_state.get_vector()))
+
+
+"""Program 5"""
+
+print("\n\nProgram 5: Cross-checking fused programs against original programs")
+
+for num_qubits, program in [(3, my_h_circuit), (4, my_cx_circuit), (8, my_swap_circuit)]:
+    fused_program = tensor_simulator.compile(program)
+    original_state = tensor_simulator.run(tensor_simulator.initialize(num_qubits), program)
+    fused_state = tensor_simulator.run(tensor_simulator.initialize(num_qubits), fused_program)
+    print("match: %s" % np.allclose(original_state.get_vector(), fused_state.get_vector()))
+
+
+"""Program 6"""
+
+print("\n\nProgram 6: Sweeping rotation angle of RX gate followed by CX gate")
+
+my_rx_circuit = [
+    { "gate": "U3", "params": { "theta": "angle", "phi": -1.5708, "lambda": 1.5708 }, "target": 0 }, #rx gate
+    { "gate": "CU", "params": { "theta": 3.1415, "phi": 1.5708, "lambda": -3.1415 }, "control": 0, "target": 1 } #cx gate
+    ]
+
+final_states, measurements = tensor_simulator.sweep(2, my_rx_circuit, { "angle": np.linspace(0, 3.1415, 5) }, 1000)
+
+for angle, measurement in zip(np.linspace(0, 3.1415, 5), measurements):
+    print("angle: %.4f results: %s" % (angle, measurement))
+
+
+"""Program 7"""
+
+print("\n\nProgram 7: Cross-checking memory-mapped state with Streaming calculator against Numpy calculator")
+
+streaming_simulator = Circuit("Mapped", "Streaming", block_size=4)
+
+for num_qubits, program in [(3, my_h_circuit), (4, my_cx_circuit), (8, my_swap_circuit)]:
+    numpy_state = simulator.run(simulator.initialize(num_qubits), program)
+    mapped_state = streaming_simulator.run(streaming_simulator.initialize(num_qubits), program)
+    print("match: %s" % np.allclose(numpy_state.get_vector(), mapped_state.get_vector()))
+    streaming_simulator.measure(mapped_state, 1000)
+    mapped_state.close()
+
+
+"""Program 8"""
+
+print("\n\nProgram 8: Profiling swap circuit")
+
+profiled_simulator = Circuit("Classical", "Numpy")
+collector = profiled_simulator.instrument(Collector(trace_memory=True))
+
+final_state = profiled_simulator.run(profiled_simulator.initialize(8), my_swap_circuit)
+profiled_simulator.measure(final_state, 1000)
+
+for gate, gate_report in collector.report().items():
+    print("%s: count: %s time: %.6f s phases: %s bytes allocated: %s" %
+          (gate, gate_report["count"], gate_report["time"], gate_report["phases"], gate_report["bytes_allocated"]))
+
+
+"""Program 9"""
+
+print("\n\nProgram 9: Testing CCX or Toffoli gate and multi-controlled X gate")
+
+my_toffoli_circuit = [
+    { "gate": "U3", "params": { "theta": 3.1415, "phi": 1.5708, "lambda": -3.1415 }, "target": 0 }, #x gate
+    { "gate": "U3", "params": { "theta": 3.1415, "phi": 1.5708, "lambda": -3.1415 }, "target": 1 }, #x gate
+    { "gate": "CCU", "params": { "theta": 3.1415, "phi": 1.5708, "lambda": -3.1415 }, "controls": [0, 1], "target": 2 }, #ccx gate
+    { "gate": "MCU", "params": { "theta": 3.1415, "phi": 1.5708, "lambda": -3.1415 }, "controls": [0, 1, 2], "target": 3 } #mcx gate
+    ]
+
+numpy_state = simulator.run(simulator.initialize(4), my_toffoli_circuit)
+tensor_state = tensor_simulator.run(tensor_simulator.initialize(4), my_toffoli_circuit)
+print("match: %s" % np.allclose(numpy_state.get_vector(), tensor_state.get_vector()))
+tensor_simulator.measure(tensor_state, 1000)
+
+
+"""Program 10"""
+
+print("\n\nProgram 10: Routing Clifford circuits to stabilizer engine")
+
+my_bell_circuit = [
+    { "gate": "U3", "params": { "theta": 1.5708, "phi": 0, "lambda": 3.1416 }, "target": 0 }, #h gate
+    { "gate": "CU", "params": { "theta": 3.1416, "phi": 0, "lambda": 3.1416 }, "control": 0, "target": 1 }, #cx gate
+    { "gate": "U3", "params": { "theta": 0, "phi": 0, "lambda": 1.5708 }, "target": 1 } #s gate
+    ]
+
+clifford_simulator = Circuit("Classical", "Tensor", clifford_tolerance=1e-3)
+stabilizer_state, measurements = clifford_simulator.simulate(2, my_bell_circuit, 1000)
+tensor_state = tensor_simulator.run(tensor_simulator.initialize(2), my_bell_circuit)
+print("match: %s" % np.isclose(abs(np.vdot(stabilizer_state.to_vector(), tensor_state.get_vector())), 1, atol=1e-3))
+
+my_ghz_circuit = [{ "gate": "U3", "params": { "theta": 1.5708, "phi": 0, "lambda": 3.1416 }, "target": 0 }] #h gate
+my_ghz_circuit += [{ "gate": "CU", "params": { "theta": 3.1416, "phi": 0, "lambda": 3.1416 }, "control": i, "target": i + 1 } #cx gate
+                   for i in range(199)]
+
+stabilizer_state, measurements = clifford_simulator.simulate(200, my_ghz_circuit)
+measurements = clifford_simulator.measure(stabilizer_state, 1000, "outcomes")
+print("match: %s" % all(outcome in ("0" * 200, "1" * 200) for outcome in measurements))
+
+my_mcu_circuit = [
+    { "gate": "MCU", "params": { "theta": 3.1416, "phi": 0, "lambda": 3.1416 }, "controls": [], "target": 1 }, #x gate
+    { "gate": "MCU", "params": { "theta": 3.1416, "phi": 0, "lambda": 3.1416 }, "controls": [0], "target": 1 } #cx gate
+    ]
+
+stabilizer_state, measurements = clifford_simulator.simulate(2, my_mcu_circuit)
+tensor_state = tensor_simulator.run(tensor_simulator.initialize(2), my_mcu_circuit)
+print("match: %s" % np.isclose(abs(np.vdot(stabilizer_state.to_vector(), tensor_state.get_vector())), 1, atol=1e-3))
+
+
+"""Program 11"""
+
+print("\n\nProgram 11: Cross-checking matrix product state against Numpy calculator and running 60 qubits")
+
+mps_simulator = Circuit("MPS", "MPS", max_bond_dimension=16, truncation_threshold=1e-10)
+
+for num_qubits, program in [(3, my_h_circuit), (4, my_cx_circuit), (8, my_swap_circuit), (4, my_toffoli_circuit)]:
+    numpy_state = simulator.run(simulator.initialize(num_qubits), program)
+    mps_state = mps_simulator.run(mps_simulator.initialize(num_qubits), program)
+    print("match: %s" % np.allclose(numpy_state.get_vector(), mps_state.to_vector()))
+
+my_chain_circuit = []
+for layer in range(4):
+    my_chain_circuit += [{ "gate": "U3", "params": { "theta": 0.4 + 0.1 * layer, "phi": 0, "lambda": 0 }, "target": i } #ry gate
+                         for i in range(60)]
+    my_chain_circuit += [{ "gate": "CU", "params": { "theta": 3.1415, "phi": 0, "lambda": 3.1415 }, "control": i, "target": i + 1 } #cx gate
+                         for i in range(layer % 2, 59, 2)]
+
+mps_state = mps_simulator.run(mps_simulator.initialize(60), my_chain_circuit)
+print("bond dimensions: %s" % mps_state.bond_dimensions)
+print("discarded weight: %s" % mps_state.discarded_weight)
+print("results: %s" % len(mps_simulator.measure(mps_state, 1000, "outcomes")))
+
+
+"""Program 12"""
+
+print("\n\nProgram 12: Exact expectation values and marginal probabilities of bell state")
+
+tensor_state = tensor_simulator.run(tensor_simulator.initialize(2), my_bell_circuit)
+print("match: %s" % np.isclose(tensor_simulator.expectation(tensor_state, { "ZZ": 0.5, "XY": 0.5 }), 1, atol=1e-3))
+print("match: %s" % np.allclose(tensor_simulator.marginal(tensor_state, [1]), [0.5, 0.5], atol=1e-3))
+tensor_simulator.measure_qubits(tensor_state, [1], 1000)
+
+stabilizer_state, measurements = clifford_simulator.simulate(200, my_ghz_circuit)
+print("match: %s" % (clifford_simulator.expectation(stabilizer_state, "ZZ", [0, 199]) == 1))
+clifford_simulator.measure_qubits(stabilizer_state, [0, 100, 199], 1000)
+
+
+"""Program 13"""
+
+print("\n\nProgram 13: Cross-checking dictionary state against Numpy calculator and running swap circuit on 48 qubits")
+
+dictionary_simulator = Circuit("Dictionary", "Dictionary")
+
+for num_qubits, program in [(3, my_h_circuit), (4, my_cx_circuit), (8, my_swap_circuit), (4, my_toffoli_circuit)]:
+    numpy_state = simulator.run(simulator.initialize(num_qubits), program)
+    dictionary_state = dictionary_simulator.run(dictionary_simulator.initialize(num_qubits), program)
+    print("match: %s" % np.allclose(numpy_state.get_vector(), dictionary_state.to_vector()))
+
+dictionary_state = dictionary_simulator.run(dictionary_simulator.initialize(48), my_swap_circuit)
+dictionary_simulator.measure(dictionary_state, 1000)
+
+
+"""Program 14"""
+
+print("\n\nProgram 14: Running swap circuit on many initial states with cached unitary of the circuit")
+
+initial_states = []
+for index in range(256):
+    initial_state = States.create("Classical")
+    initial_state.update_vector(np.identity(256)[index])
+    initial_states.append(initial_state)
+
+tensor_simulator.initialize(8)
+swap_unitary = tensor_simulator.unitary(my_swap_circuit)
+unitary_states = tensor_simulator.run_many(initial_states, my_swap_circuit, "unitary")
+print("match: %s" % np.allclose([state.get_vector() for state in unitary_states], swap_unitary.matrix))
+print("cache: %s" % Circuit.unitary_cache_info())
+
+
+"""Program 15"""
+
+print("\n\nProgram 15: Bounding fidelity loss of single precision on quantum Fourier transform and random circuit")
+
+my_qft_circuit = []
+for i in range(12):
+    my_qft_circuit.append({ "gate": "U3", "params": { "theta": 1.5708, "phi": 0, "lambda": 3.1415 }, "target": i }) #h gate
+    my_qft_circuit += [{ "gate": "CU", "params": { "theta": 0, "phi": 0, "lambda": np.pi / 2**(j - i) }, "control": j, "target": i } #controlled phase gate
+                       for j in range(i + 1, 12)]
+
+random_generator = np.random.default_rng(15)
+my_random_circuit = []
+for layer in range(40):
+    my_random_circuit += [{ "gate": "U3", "params": dict(zip(["theta", "phi", "lambda"], random_generator.uniform(0, 2 * np.pi, 3))), "target": i }
+                          for i in range(12)]
+    my_random_circuit += [{ "gate": "CU", "params": { "theta": np.pi, "phi": 0, "lambda": np.pi }, "control": i, "target": (i + 1 + layer % 3) % 12 } #cx gate
+                          for i in range(12)]
+
+single_simulator = Circuit("Classical", "Tensor", precision="single")
+for program in [my_qft_circuit, my_random_circuit]:
+    double_state = tensor_simulator.run(tensor_simulator.initialize(12), program)
+    single_state = single_simulator.run(single_simulator.initialize(12), program)
+    single_vector = single_state.get_vector().astype(complex)
+    fidelity = abs(np.vdot(double_state.get_vector(), single_vector))**2 / np.vdot(single_vector, single_vector).real
+    print("precision: %s, fidelity loss: %.2e" % (single_state.get_vector().dtype, 1 - fidelity))
+    print("match: %s" % (single_state.get_vector().dtype == np.complex64 and 1 - fidelity < 1e-5))
+
+
+"""Program 16"""
+
+print("\n\nProgram 16: Running many small circuits concurrently from a thread pool with one circuit")
+
+def run_random_circuit(seed):
+    num_qubits = 3 + seed % 4
+    program = [{ "gate": "U3", "params": { "theta": 0.3 * seed, "phi": 0.2, "lambda": 0.1 * seed }, "target": i } for i in range(num_qubits)]
+    program += [{ "gate": "CU", "params": { "theta": 0.7, "phi": 0.5, "lambda": 0.3 }, "control": i, "target": (i + 1) % num_qubits }
+                for i in range(num_qubits)]
+    final_state, measurements = tensor_simulator.simulate(num_qubits, program * 10)
+    return final_state.get_vector()
+
+with ThreadPoolExecutor(8) as executor:
+    concurrent_vectors = list(executor.map(run_random_circuit, range(64)))
+print("match: %s" % all(np.allclose(vector, run_random_circuit(seed)) for seed, vector in enumerate(concurrent_vectors)))
+
+
+"""Program 17"""
+
+print("\n\nProgram 17: Cross-checking blocked calculator against Tensor calculator on deep random circuit")
+
+blocked_simulator = Circuit("Classical", "Blocked", fused_qubits=6)
+blocked_calculator = Calculators.create("Blocked", fused_qubits=6)
+for program in [my_qft_circuit, my_random_circuit]:
+    tensor_state = tensor_simulator.run(tensor_simulator.initialize(12), program)
+    blocked_state = blocked_simulator.run(blocked_simulator.initialize(12), program)
+    print("match: %s" % np.allclose(tensor_state.get_vector(), blocked_state.get_vector()))
+
+    blocked_state.set_to_ground_state(12)
+    blocked_calculator.calculate_program(blocked_state, 12, program)
+    print("passes over state vector: %s for %s operations" % (blocked_calculator.passes, len(program)))
+
+
+"""Program 18"""
+
+print("\n\nProgram 18: Submitting RX circuits for many angles to asynchronous job service")
+
+def rx_circuit(angle):
+    return [{ "gate": "U3", "params": { "theta": angle, "phi": -1.5708, "lambda": 1.5708 }, "target": 0 }, #rx gate
+            { "gate": "CU", "params": { "theta": 3.1415, "phi": 1.5708, "lambda": -3.1415 }, "control": 0, "target": 1 }]
+
+async def submit_rx_jobs(angles):
+    async with JobService("Classical", "Tensor", workers=2, max_pending=16, batch_window=0.01) as service:
+        futures = [await service.submit(2, rx_circuit(angle), num_shots=1000, return_state=True) for angle in angles]
+        results = await asyncio.gather(*futures)
+        return results, service.stats()
+
+service_angles = np.linspace(0, 3.1415, 64)
+service_results, service_stats = asyncio.run(submit_rx_jobs(service_angles))
+final_states, measurements = tensor_simulator.sweep(2, my_rx_circuit, { "angle": service_angles })
+print("match: %s" % np.allclose([result["state"] for result in service_results], final_states))
+print("batches: %s mean batch size: %.1f mean queue time: %.6f s" % (service_stats["batches"], service_stats["mean_batch_size"],
+                                                                     service_stats["mean_queue_time"]))
+
+
+"""Program 19"""
+
+print("\n\nProgram 19: Loading final state and seeded measurements of random circuit from persistent result cache")
+
+cache_directory = tempfile.mkdtemp()
+for run in range(2):
+    cached_simulator = Circuit("Classical", "Tensor", seed=7, verbose=False, result_cache=DiskCache(cache_directory, 64 * 1024**2))
+    cached_state, cached_measurements = cached_simulator.simulate(12, my_random_circuit, 1000)
+    if run == 0:
+        first_measurements = cached_measurements
+tensor_state = tensor_simulator.run(tensor_simulator.initialize(12), my_random_circuit)
+print("match: %s" % (np.allclose(cached_state.get_vector(), tensor_state.get_vector()) and cached_measurements == first_measurements))
+print("memory-mapped: %s" % isinstance(cached_state.get_vector(), np.memmap))
+shutil.rmtree(cache_directory)
+
+
+"""Program 20"""
+
+print("\n\nProgram 20: Simulating noisy idle qubit by Monte-Carlo trajectories on worker processes")
+
+my_idle_circuit = [{ "gate": "U3", "params": { "theta": 0, "phi": 0, "lambda": 0 }, "target": 0 }] #identity gate
+
+#P(1) = 2/3 depolarizing * (1 - readout error) + (1 - 2/3 depolarizing) * readout error
+noise_model = NoiseModel(depolarizing=0.3, readout_error=0.1)
+noisy_measurements = []
+for workers in [1, 2]:
+    noisy_simulator = TrajectorySimulator(noise_model, workers=workers, seed=5)
+    noisy_measurements.append(noisy_simulator.run(1, my_idle_circuit, 20000))
+    noisy_simulator.close()
+print("match: %s" % (noisy_measurements[0] == noisy_measurements[1] and abs(noisy_measurements[0]["1"] / 20000 - 0.26) < 0.015))
+
+noisy_simulator = TrajectorySimulator(noise_model, workers=2, seed=5)
+noisy_simulator.run(1, my_idle_circuit, 200000, tolerance=0.005)
+print("shots: %s of 200000 converged: %s standard error: %.4f" % (noisy_simulator.shots, noisy_simulator.converged,
+                                                                   noisy_simulator.standard_error))
+noisy_simulator.close()
+
+
+"""Program 21"""
+
+print("\n\nProgram 21: Streaming deep random circuit from JSON lines file and resuming it from checkpoint after interruption")
+
+stream_directory = tempfile.mkdtemp()
+program_path = os.path.join(stream_directory, "my_deep_circuit.jsonl")
+my_deep_circuit = my_random_circuit * 20
+with open(program_path, "w") as program_file:
+    for operation in my_deep_circuit:
+        program_file.write(json.dumps(operation) + "\n")
+
+def interrupted_circuit(num_operations):
+    for index, operation in enumerate(JsonLinesProgram(program_path)):
+        if index == num_operations:
+            raise KeyError("Error: run is interrupted after %s operations." %num_operations)
+        yield operation
 
-end_time = datetime.datetime.now().strftime(datetimeFormat)
-diff = datetime.datetime.strptime(end_time, datetimeFormat) - datetime.datetime.strptime(start_time, datetimeFormat)
-print("Time taken:", diff)
\ No newline at end of file
+checkpoint = Checkpoint(os.path.join(stream_directory, "my_deep_circuit.npz"), every_operations=len(my_deep_circuit) // 4)
+tensor_simulator.run(tensor_simulator.initialize(12), interrupted_circuit(len(my_deep_circuit) * 2 // 3), checkpoint=checkpoint)
+resumed_state = tensor_simulator.run(tensor_simulator.initialize(12), JsonLinesProgram(program_path), checkpoint=checkpoint)
+tensor_state = tensor_simulator.run(tensor_simulator.initialize(12), my_deep_circuit)
+print("match: %s" % np.allclose(resumed_state.get_vector(), tensor_state.get_vector()))
+print("checkpoints saved: %s checkpoint removed: %s" % (checkpoint.saves, not checkpoint.exists))
+shutil.rmtree(stream_directory)